@@ -1,7 +1,12 @@
 import os
+import time
+from datetime import datetime
 
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import before_task_publish, task_postrun, task_prerun
+
+from config.metrics import register_collector, registry
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
@@ -16,4 +21,99 @@ app.conf.beat_schedule = {
         'task': 'lms.tasks.deactivate_inactive_users',
         'schedule': crontab(hour=0, minute=0),
     },
+    'process-pending-stripe-events': {
+        'task': 'lms.tasks.process_pending_stripe_events',
+        'schedule': crontab(minute='*/5'),
+    },
+    'reconcile-pending-payments': {
+        'task': 'lms.tasks.reconcile_pending_payments',
+        'schedule': crontab(minute='*/30'),
+    },
+    'update-revenue-rollups': {
+        'task': 'lms.tasks.update_revenue_rollups',
+        'schedule': crontab(minute='*/10'),
+    },
 }
+
+
+def get_task_labels(task):
+    delivery_info = task.request.delivery_info or {}
+
+    return {'task': task.name, 'queue': delivery_info.get('routing_key') or app.conf.task_default_queue}
+
+
+@before_task_publish.connect
+def record_task_published(sender=None, headers=None, routing_key=None, **kwargs):
+    """
+    Отмечает в заголовках сообщения время постановки задачи и учитывает ее в счетчике поставленных задач.
+    """
+
+    if headers is not None:
+        headers['published_at'] = time.time()
+
+    registry.inc('celery_task_published_total', {'task': sender, 'queue': routing_key or app.conf.task_default_queue})
+    registry.flush()
+
+
+@task_prerun.connect
+def record_task_started(task_id=None, task=None, **kwargs):
+    """
+    Учитывает время ожидания задачи в очереди: от постановки (или от ETA для отложенных задач) до начала выполнения.
+    """
+
+    task.request.metrics_started = time.perf_counter()
+    published_at = getattr(task.request, 'published_at', None) or (task.request.headers or {}).get('published_at')
+
+    if published_at is None:
+        return
+
+    eta = task.request.eta
+    ready_at = max(published_at, datetime.fromisoformat(eta).timestamp()) if eta else published_at
+    registry.observe('celery_task_queue_wait_seconds', get_task_labels(task), max(time.time() - ready_at, 0.0))
+
+
+@task_postrun.connect
+def record_task_finished(task_id=None, task=None, state=None, **kwargs):
+    """
+    Учитывает время выполнения задачи и ее результат (SUCCESS, FAILURE, RETRY).
+    """
+
+    labels = get_task_labels(task)
+    started = getattr(task.request, 'metrics_started', None)
+
+    if started is not None:
+        registry.observe('celery_task_runtime_seconds', labels, time.perf_counter() - started)
+
+    registry.inc('celery_tasks_total', {**labels, 'state': state or 'UNKNOWN'})
+    registry.flush()
+
+
+def get_queue_names():
+    from django.conf import settings
+
+    return sorted({app.conf.task_default_queue, *(route['queue'] for route in settings.CELERY_TASK_ROUTES.values())})
+
+
+@register_collector
+def collect_queue_lengths():
+    """
+    Возвращает количество сообщений в очередях брокера (очередь по умолчанию и очереди из CELERY_TASK_ROUTES).
+
+    Очередь, которая еще не создана в брокере (ни один воркер ее не слушал), считается пустой.
+    """
+
+    lengths = {}
+
+    with app.connection_for_read() as connection:
+        connection.ensure_connection(max_retries=1)
+
+        for queue in get_queue_names():
+            try:
+                with connection.channel() as channel:
+                    length = channel.queue_declare(queue, passive=True).message_count
+            except connection.channel_errors:
+                length = 0
+
+            lengths[('celery_queue_length', (('queue', queue),))] = length
+
+    return lengths
@@ -0,0 +1,268 @@
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+METRICS_INDEX_KEY = 'metrics:processes'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0)
+
+METRICS = {
+    'http_requests_total': ('counter', 'Количество запросов', None),
+    'http_request_duration_seconds': ('histogram', 'Время обработки запроса', LATENCY_BUCKETS),
+    'http_db_queries_total': ('counter', 'Количество SQL-запросов', None),
+    'http_db_duration_seconds_total': ('counter', 'Суммарное время SQL-запросов', None),
+    'http_db_queries_per_request': ('histogram', 'Количество SQL-запросов на запрос', QUERY_BUCKETS),
+    'http_serialize_duration_seconds': ('histogram', 'Время сериализации и отрисовки ответа', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Размер тела ответа (кроме потоковых ответов)', SIZE_BUCKETS),
+    'celery_task_published_total': ('counter', 'Количество поставленных задач', None),
+    'celery_task_queue_wait_seconds': ('histogram', 'Время от постановки (или ETA) до начала выполнения задачи',
+                                       TASK_BUCKETS),
+    'celery_task_runtime_seconds': ('histogram', 'Время выполнения задачи', TASK_BUCKETS),
+    'celery_tasks_total': ('counter', 'Количество выполненных задач по результатам', None),
+    'celery_queue_length': ('gauge', 'Количество сообщений в очереди брокера', None),
+}
+
+current_timings = ContextVar('current_timings', default=None)
+collectors = []
+
+
+class RequestTimings:
+    """
+    Счетчики времени одного запроса: SQL-запросы (через execute_wrapper) и сериализация.
+    """
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_count += 1
+
+
+class MetricsRegistry:
+    """
+    Метрики текущего процесса с периодической выгрузкой в общий кэш (Redis).
+
+    Каждый процесс (воркер gunicorn, воркер Celery) накапливает счетчики и гистограммы в памяти и не чаще раза в
+    METRICS_FLUSH_INTERVAL секунд сохраняет их снимок в кэше под собственным ключом. Ключи процессов перечислены
+    в METRICS_INDEX_KEY, поэтому эндпоинт метрик любого процесса суммирует данные всех процессов. После fork
+    метрики процесса-родителя сбрасываются.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.key = f'metrics:process:{socket.gethostname()}:{self.pid}'
+        self.values = {}
+        self.last_flush = time.monotonic()
+
+    def _get_values(self):
+        if self.pid != os.getpid():
+            self.reset()
+
+        return self.values
+
+    def inc(self, name, labels, value=1):
+        """
+        Увеличивает счетчик name с метками labels (dict).
+        """
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            values = self._get_values()
+            values[key] = values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        """
+        Добавляет наблюдение value в гистограмму name с метками labels (dict).
+        """
+
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            values = self._get_values()
+            histogram = values.get(key)
+
+            if histogram is None:
+                histogram = values[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in self._get_values().items()}
+
+    def flush(self, force=False):
+        """
+        Сохраняет снимок метрик процесса в кэше, если с прошлого сохранения прошло METRICS_FLUSH_INTERVAL секунд.
+
+        Ошибки кэша не прерывают обработку запроса: метрики будут сохранены при следующей попытке.
+        """
+
+        now = time.monotonic()
+
+        if not force and now - self.last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+
+        self.last_flush = now
+
+        try:
+            cache.set(self.key, self.snapshot(), settings.METRICS_PROCESS_TIMEOUT)
+            keys = cache.get(METRICS_INDEX_KEY) or set()
+
+            if self.key not in keys:
+                cache.set(METRICS_INDEX_KEY, keys | {self.key}, None)
+        except Exception:
+            logger.warning('Не удалось сохранить метрики процесса', exc_info=True)
+
+
+registry = MetricsRegistry()
+
+
+def register_collector(collector):
+    """
+    Регистрирует функцию, вычисляющую метрики в момент сбора (например, длину очередей брокера).
+
+    Функция возвращает словарь значений по ключам (имя метрики, метки) и вызывается эндпоинтом метрик; ее
+    значения не суммируются по процессам.
+    """
+
+    collectors.append(collector)
+
+    return collector
+
+
+def merge(total, values):
+    for key, value in values.items():
+        if key not in total:
+            total[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            total[key] = [left + right for left, right in zip(total[key], value)]
+        else:
+            total[key] += value
+
+
+def collect():
+    """
+    Возвращает метрики, просуммированные по всем процессам.
+
+    Снимок текущего процесса сохраняется перед сбором, а ключи процессов, снимки которых истекли, удаляются из
+    списка процессов.
+
+    Возвращает:
+    - dict: Значения по ключам (имя метрики, метки).
+    """
+
+    registry.flush(force=True)
+    keys = cache.get(METRICS_INDEX_KEY) or set()
+    snapshots = cache.get_many(keys)
+
+    if snapshots.keys() != keys:
+        cache.set(METRICS_INDEX_KEY, set(snapshots), None)
+
+    total = {}
+
+    for snapshot in snapshots.values():
+        merge(total, snapshot)
+
+    for collector in collectors:
+        try:
+            total.update(collector())
+        except Exception:
+            logger.warning('Не удалось собрать метрики %s', collector.__name__, exc_info=True)
+
+    return total
+
+
+def histogram_quantile(name, histogram, quantile):
+    """
+    Возвращает оценку квантиля гистограммы: верхнюю границу интервала, в который он попадает (inf - за последней
+    границей), или None для пустой гистограммы.
+    """
+
+    count = histogram[-1]
+
+    if not count:
+        return None
+
+    cumulative = 0
+
+    for bound, bucket_count in zip((*METRICS[name][2], float('inf')), histogram):
+        cumulative += bucket_count
+
+        if cumulative >= quantile * count:
+            return bound
+
+    return float('inf')
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+
+    if not pairs:
+        return ''
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def render(values):
+    """
+    Возвращает метрики в текстовом формате Prometheus (version 0.0.4).
+    """
+
+    lines = []
+
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+
+        if not series:
+            continue
+
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+        for labels, value in series:
+            if metric_type != 'histogram':
+                lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+
+            cumulative = 0
+
+            for bucket, count in zip((*buckets, '+Inf'), value):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, le=bucket)} {cumulative}')
+
+            lines.append(f'{name}_sum{format_labels(labels)} {value[-2]}')
+            lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+
+    return '\n'.join(lines) + '\n'
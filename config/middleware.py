@@ -0,0 +1,80 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from config.metrics import RequestTimings, current_timings, registry
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики запросов по представлениям и добавляет в ответ заголовок Server-Timing.
+
+    Для каждого представления (имени маршрута, например 'lms:course-list') учитываются количество запросов по
+    методам и статусам, гистограммы времени обработки, числа SQL-запросов, времени сериализации и размера ответа,
+    а также суммарные количество и время SQL-запросов. Метрики публикуются эндпоинтом /metrics/ (см.
+    config.metrics).
+
+    Заголовок Server-Timing содержит время SQL-запросов (db), сериализации и отрисовки ответа (serialize) и общее
+    время обработки (total) в миллисекундах. Время сериализации учитывают представления с ServerTimingMixin
+    (lms.mixins), время отрисовки - process_template_response. Для потоковых ответов учитывается время до начала
+    передачи тела.
+
+    Middleware должен стоять первым в MIDDLEWARE, чтобы общее время включало остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timings))
+
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+
+        total = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        labels = {'view': match.view_name if match else '<unresolved>', 'method': request.method}
+
+        registry.inc('http_requests_total', {**labels, 'status': str(response.status_code)})
+        registry.observe('http_request_duration_seconds', labels, total)
+        registry.inc('http_db_queries_total', labels, timings.db_count)
+        registry.inc('http_db_duration_seconds_total', labels, timings.db_time)
+        registry.observe('http_db_queries_per_request', labels, timings.db_count)
+        registry.observe('http_serialize_duration_seconds', labels, timings.serialize_time)
+
+        if not response.streaming:
+            registry.observe('http_response_size_bytes', labels, len(response.content))
+
+        response['Server-Timing'] = (
+            f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_count} queries", '
+            f'serialize;dur={timings.serialize_time * 1000:.1f}, total;dur={total * 1000:.1f}'
+        )
+        registry.flush()
+
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        Учитывает отрисовку ответа (например, JSON-рендерер DRF) во времени сериализации.
+        """
+
+        timings = current_timings.get()
+
+        if timings is not None:
+            started = time.perf_counter()
+
+            def add_render_time(rendered):
+                timings.serialize_time += time.perf_counter() - started
+
+            response.add_post_render_callback(add_render_time)
+
+        return response
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
     'django_filters',
@@ -54,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -168,14 +170,38 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('CACHE_LOCATION', default='redis://redis:6379/1'),
+    }
+}
+
 STRIPE_SECRET_KEY = env("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = env("STRIPE_PUBLISHABLE_KEY")
+STRIPE_WEBHOOK_SECRET = env('STRIPE_WEBHOOK_SECRET', default='')
+STRIPE_API_BASE = env('STRIPE_API_BASE', default=None)
+STRIPE_TIMEOUT = env.float('STRIPE_TIMEOUT', default=10.0)
+STRIPE_MAX_RETRIES = env.int('STRIPE_MAX_RETRIES', default=2)
+STRIPE_POOL_SIZE = env.int('STRIPE_POOL_SIZE', default=10)
+STRIPE_CIRCUIT_FAILURE_THRESHOLD = env.int('STRIPE_CIRCUIT_FAILURE_THRESHOLD', default=5)
+STRIPE_CIRCUIT_RESET_TIMEOUT = env.float('STRIPE_CIRCUIT_RESET_TIMEOUT', default=30.0)
+
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=[])
+METRICS_FLUSH_INTERVAL = env.float('METRICS_FLUSH_INTERVAL', default=5.0)
+METRICS_PROCESS_TIMEOUT = env.int('METRICS_PROCESS_TIMEOUT', default=24 * 60 * 60)
 
 CELERY_BROKER_URL = env("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND')
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+CELERY_TASK_ROUTES = {
+    'lms.tasks.process_stripe_event': {'queue': 'stripe'},
+    'lms.tasks.process_pending_stripe_events': {'queue': 'stripe'},
+    'lms.tasks.reconcile_pending_payments': {'queue': 'stripe'},
+}
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
 EMAIL_HOST = env('EMAIL_HOST')
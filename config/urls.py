@@ -20,6 +20,8 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from config.views import metrics
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Online training API",
@@ -37,6 +39,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('lms.urls')),
     path('api/users/', include('users.urls')),
+    path('metrics/', metrics, name='metrics'),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from config.metrics import collect, render
+
+
+def metrics(request):
+    """
+    Возвращает метрики всех процессов в текстовом формате Prometheus.
+
+    Если задан METRICS_TOKEN, запрос должен содержать заголовок Authorization: Bearer <METRICS_TOKEN>. Без токена
+    метрики доступны только персоналу (is_staff) и адресам из METRICS_ALLOWED_IPS, остальные запросы отклоняются.
+    """
+
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}')
+    else:
+        allowed = request.user.is_staff or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+    if not allowed:
+        return HttpResponse(status=403)
+
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from lms.services.benchmark_service import (BENCHMARK_ITERATIONS, BENCHMARK_WARMUP, compare_reports,
+                                            run_benchmarks)
+
+
+class Command(BaseCommand):
+    help = ('Измеряет задержку, количество запросов к базе данных и пиковую память каждого маршрута API на данных '
+            'текущей базы (заполните ее командой seed_data) и сохраняет отчет в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=BENCHMARK_ITERATIONS,
+                            help='Количество измеряемых запросов каждого сценария')
+        parser.add_argument('--warmup', type=int, default=BENCHMARK_WARMUP, help='Количество прогревочных запросов')
+        parser.add_argument('--only', nargs='+', help='Имена сценариев, которые нужно выполнить')
+        parser.add_argument('--output', '-o', help='Файл отчета JSON')
+        parser.add_argument('--compare', help='Отчет предыдущего запуска для сравнения')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('Нужна хотя бы одна итерация')
+
+        try:
+            setup_test_environment()
+        except RuntimeError:
+            pass
+
+        report = run_benchmarks(options['iterations'], options['warmup'], options['only'])
+
+        if report is None:
+            raise CommandError('Нет данных для бенчмарка, заполните базу командой seed_data')
+
+        for name, metrics in report['endpoints'].items():
+            latency = metrics['latency_ms']
+            self.stdout.write(
+                f'{name:<24} {metrics["method"]:<6} {",".join(map(str, metrics["status"])):<8} '
+                f'p50 {latency["p50"]:>8.2f} мс  p90 {latency["p90"]:>8.2f} мс  p99 {latency["p99"]:>8.2f} мс  '
+                f'запросов {metrics["queries"]:>3}  память {metrics["peak_memory_kb"]:>8.1f} КиБ'
+            )
+
+        if report['uncovered_routes']:
+            self.stdout.write(self.style.WARNING(f'Маршруты без сценария: {", ".join(report["uncovered_routes"])}'))
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+
+            for row in compare_reports(previous, report):
+                line = (f'{row["name"]:<24} p50 {row["p50"][0]:>8.2f} -> {row["p50"][1]:>8.2f} мс '
+                        f'({row["change"]:+.1f}%)  запросов {row["queries"][0]} -> {row["queries"][1]}')
+                worse = row['change'] > 10 or row['queries'][1] > row['queries'][0]
+                self.stdout.write(self.style.WARNING(line) if worse else line)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2, sort_keys=True)
+                file.write('\n')
+
+            self.stdout.write(self.style.SUCCESS(f'Отчет сохранен в {options["output"]}'))
@@ -0,0 +1,118 @@
+import time
+
+from django.core.management import BaseCommand
+
+from config.metrics import collect, histogram_quantile
+
+HISTOGRAMS = {'runtime': 'celery_task_runtime_seconds', 'wait': 'celery_task_queue_wait_seconds'}
+SORT_KEYS = {
+    'runtime': lambda row: row['runtime_p95'] or 0,
+    'wait': lambda row: row['wait_p95'] or 0,
+    'backlog': lambda row: row['backlog'],
+}
+
+
+def get_task_rows(values):
+    """
+    Сводит метрики задач Celery в строки по паре (задача, очередь).
+
+    Возвращает:
+    - list[dict]: Поставлено, выполнено по результатам, не выполнено (backlog), среднее и p95 время ожидания и
+      выполнения задачи.
+    """
+
+    rows = {}
+
+    def get_row(labels):
+        labels = dict(labels)
+        key = (labels['task'], labels['queue'])
+
+        return rows.setdefault(key, {
+            'task': key[0], 'queue': key[1], 'published': 0, 'finished': 0, 'states': {},
+        })
+
+    for (name, labels), value in values.items():
+        if name == 'celery_task_published_total':
+            get_row(labels)['published'] += value
+        elif name == 'celery_tasks_total':
+            row = get_row(labels)
+            state = dict(labels)['state']
+            row['states'][state] = row['states'].get(state, 0) + value
+            row['finished'] += value
+        elif name in HISTOGRAMS.values():
+            get_row(labels)[name] = value
+
+    for row in rows.values():
+        row['backlog'] = max(row['published'] - row['finished'], 0)
+
+        for metric, name in HISTOGRAMS.items():
+            histogram = row.pop(name, None)
+            row[f'{metric}_avg'] = histogram[-2] / histogram[-1] if histogram and histogram[-1] else None
+            row[f'{metric}_p95'] = histogram_quantile(name, histogram, 0.95) if histogram else None
+
+    return list(rows.values())
+
+
+def format_seconds(value):
+    if value is None:
+        return '-'
+    if value == float('inf'):
+        return 'inf'
+
+    return f'{value:.2f}'
+
+
+class Command(BaseCommand):
+    help = ('Показывает сводку задач Celery по метрикам всех процессов: самые медленные и самые отстающие задачи, '
+            'пропускную способность и длину очередей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0, help='Период обновления в секундах')
+        parser.add_argument('--iterations', type=int, default=0,
+                            help='Количество обновлений (0 - до прерывания)')
+        parser.add_argument('--sort', choices=list(SORT_KEYS), default='runtime', help='Сортировка задач')
+        parser.add_argument('--limit', type=int, default=20, help='Количество задач в сводке')
+
+    def handle(self, *args, **options):
+        previous = {}
+        iteration = 0
+
+        try:
+            while True:
+                started = time.monotonic()
+                values = collect()
+                rows = sorted(get_task_rows(values), key=SORT_KEYS[options['sort']], reverse=True)
+
+                if self.stdout.isatty():
+                    self.stdout.write('\033[2J\033[H', ending='')
+
+                self.write_summary(values, rows[:options['limit']], previous, options['interval'])
+                previous = {(row['task'], row['queue']): row['finished'] for row in rows}
+                iteration += 1
+
+                if options['iterations'] and iteration >= options['iterations']:
+                    break
+
+                time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            pass
+
+    def write_summary(self, values, rows, previous, interval):
+        queues = sorted((dict(labels)['queue'], value) for (name, labels), value in values.items()
+                        if name == 'celery_queue_length')
+        self.stdout.write('Очереди: ' + ('  '.join(f'{queue}={length}' for queue, length in queues) or '-'))
+        self.stdout.write(
+            f'{"Задача":<44} {"Очередь":<10} {"Ожидает":>8} {"В сек":>7} {"Успех":>8} {"Ошибки":>7} {"Повторы":>8} '
+            f'{"Ожид.ср":>8} {"Ожид.95":>8} {"Вып.ср":>8} {"Вып.95":>8}'
+        )
+
+        for row in rows:
+            key = (row['task'], row['queue'])
+            rate = f'{(row["finished"] - previous[key]) / interval:.2f}' if key in previous else '-'
+            self.stdout.write(
+                f'{row["task"][:44]:<44} {row["queue"][:10]:<10} {row["backlog"]:>8} {rate:>7} '
+                f'{row["states"].get("SUCCESS", 0):>8} {row["states"].get("FAILURE", 0):>7} '
+                f'{row["states"].get("RETRY", 0):>8} {format_seconds(row["wait_avg"]):>8} '
+                f'{format_seconds(row["wait_p95"]):>8} {format_seconds(row["runtime_avg"]):>8} '
+                f'{format_seconds(row["runtime_p95"]):>8}'
+            )
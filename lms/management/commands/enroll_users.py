@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from lms.models import Course, Subscription
+from lms.services.cache_service import invalidate_subscriptions_many
+
+
+class Command(BaseCommand):
+    help = 'Подписывает на курс пользователей из файла (по одному email или id в строке)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int, help='Идентификатор курса')
+        parser.add_argument('--file', default='-', help='Файл со списком пользователей, "-" - стандартный ввод')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки вставки')
+
+    def handle(self, *args, **options):
+        if not Course.objects.filter(pk=options['course_id']).exists():
+            raise CommandError(f'Курс с pk={options["course_id"]} не найден')
+
+        source = sys.stdin if options['file'] == '-' else open(options['file'], encoding='utf-8')
+
+        with source:
+            values = [line.strip() for line in source if line.strip()]
+
+        user_ids = [int(value) for value in values if value.isdigit()]
+        emails = [value for value in values if not value.isdigit()]
+
+        started = time.monotonic()
+        created, subscribed_user_ids = Subscription.objects.bulk_subscribe(
+            options['course_id'], user_ids=user_ids, emails=emails, batch_size=options['batch_size'],
+        )
+
+        invalidate_subscriptions_many(subscribed_user_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Найдено пользователей: {len(subscribed_user_ids)} из {len(values)}, создано подписок: {created} '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from lms.services.search_service import SEARCH_MODELS, reindex_search_vectors
+
+
+class Command(BaseCommand):
+    help = ('Заполняет поисковые векторы курсов и уроков (после миграции 0012_search_vector или изменения '
+            'конфигурации поиска)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=list(SEARCH_MODELS), nargs='+', help='Типы записей, по умолчанию все')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки обновления')
+        parser.add_argument('--missing', action='store_true', help='Обновлять только записи без поискового вектора')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным')
+
+        for kind in options['type'] or SEARCH_MODELS:
+            started = time.monotonic()
+            updated = 0
+
+            for updated in reindex_search_vectors(SEARCH_MODELS[kind], options['batch_size'], options['missing']):
+                self.stderr.write(f'{kind}: {updated}', ending='\r')
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{kind}: обновлено записей: {updated} за {time.monotonic() - started:.2f} с'
+            ))
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from lms.services.stripe_stub import StripeStubServer
+
+
+class Command(BaseCommand):
+    help = 'Запускает локальную заглушку Stripe API (адрес указывается в STRIPE_API_BASE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес для прослушивания')
+        parser.add_argument('--port', type=int, default=12111, help='Порт для прослушивания')
+        parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа в секундах')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Доля ответов с ошибкой 500 (0..1)')
+
+    def handle(self, *args, **options):
+        server = StripeStubServer((options['host'], options['port']), latency=options['latency'],
+                                  failure_rate=options['failure_rate'], verbose=options['verbosity'] > 1)
+
+        self.stdout.write(self.style.SUCCESS(f'Заглушка Stripe запущена: STRIPE_API_BASE={server.url}'))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
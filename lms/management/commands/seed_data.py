@@ -0,0 +1,38 @@
+from django.core.management import BaseCommand, CommandError
+
+from lms.services.seed_service import SEED_BATCH_SIZE, flush_seed_data, get_seed_users, seed_data
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу данных детерминированными тестовыми данными заданного объема'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей')
+        parser.add_argument('--courses', type=int, default=50, help='Количество курсов')
+        parser.add_argument('--lessons-per-course', type=int, default=10, help='Количество уроков в курсе')
+        parser.add_argument('--subscriptions-per-user', type=int, default=3, help='Количество подписок пользователя')
+        parser.add_argument('--payments', type=int, default=10000, help='Количество платежей')
+        parser.add_argument('--moderators', type=int, default=1, help='Количество модераторов')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+        parser.add_argument('--batch-size', type=int, default=SEED_BATCH_SIZE, help='Размер пачки вставки')
+        parser.add_argument('--flush', action='store_true', help='Удалить ранее созданные тестовые данные')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['courses'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и один курс')
+
+        if options['flush']:
+            flush_seed_data()
+        elif get_seed_users().exists():
+            raise CommandError('Тестовые данные уже созданы, используйте --flush для пересоздания')
+
+        counts = seed_data(
+            users=options['users'], courses=options['courses'], lessons_per_course=options['lessons_per_course'],
+            subscriptions_per_user=options['subscriptions_per_user'], payments=options['payments'],
+            moderators=options['moderators'], seed=options['seed'], batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {counts["users"]}, курсов: {counts["courses"]}, уроков: {counts["lessons"]}, '
+            f'подписок: {counts["subscriptions"]}, платежей: {counts["payments"]} за {counts["duration"]:.2f} с'
+        ))
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:31
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('lms', '0007_course_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='course',
+            index=models.Index(fields=['updated_at', 'id'], name='course_updated_at_id_idx'),
+        ),
+    ]
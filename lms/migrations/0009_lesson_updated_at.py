@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0008_course_updated_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True, verbose_name='время изменения'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Дубликаты удаляются одним запросом (остается запись с наименьшим id), затем уникальный индекс строится без
+# блокировки записи (CONCURRENTLY) и только после этого подключается как ограничение, что требует лишь короткой
+# блокировки таблицы без ее повторного просмотра.
+REMOVE_DUPLICATES_SQL = '''
+    DELETE FROM lms_subscription AS duplicate
+    USING lms_subscription AS original
+    WHERE duplicate.user_id = original.user_id
+      AND duplicate.course_id = original.course_id
+      AND duplicate.id > original.id
+'''
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('lms', '0009_lesson_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(REMOVE_DUPLICATES_SQL, migrations.RunSQL.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=[
+                        'DROP INDEX CONCURRENTLY IF EXISTS unique_subscription_user_course',
+                        'CREATE UNIQUE INDEX CONCURRENTLY unique_subscription_user_course '
+                        'ON lms_subscription (user_id, course_id)',
+                        'ALTER TABLE lms_subscription ADD CONSTRAINT unique_subscription_user_course '
+                        'UNIQUE USING INDEX unique_subscription_user_course',
+                    ],
+                    reverse_sql='ALTER TABLE lms_subscription DROP CONSTRAINT unique_subscription_user_course',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='subscription',
+                    constraint=models.UniqueConstraint(fields=('user', 'course'),
+                                                       name='unique_subscription_user_course'),
+                ),
+            ],
+        ),
+    ]
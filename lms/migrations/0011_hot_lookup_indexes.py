@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:43
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('lms', '0010_subscription_unique_user_course'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='course',
+            index=models.Index(fields=['owner', 'updated_at'], name='course_owner_updated_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='subscription',
+            index=models.Index(fields=['course', 'id'], name='subscription_course_id_idx'),
+        ),
+    ]
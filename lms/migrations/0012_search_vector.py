@@ -0,0 +1,75 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:31
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations
+
+SEARCH_TABLES = ('lms_course', 'lms_lesson')
+
+
+def create_search_triggers(apps, schema_editor):
+    """
+    Создает триггер, вычисляющий search_vector курсов и уроков при вставке и изменении названия или описания.
+
+    Выражение должно совпадать с lms.services.search_service.get_search_vector, которым заполняет существующие
+    записи команда reindex_search.
+    """
+
+    schema_editor.execute("""
+        CREATE OR REPLACE FUNCTION lms_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('russian'::regconfig, COALESCE(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('russian'::regconfig, COALESCE(NEW.description, '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f"""
+            CREATE TRIGGER {table}_search_vector_update
+            BEFORE INSERT OR UPDATE OF title, description, search_vector ON {table}
+            FOR EACH ROW EXECUTE FUNCTION lms_search_vector_update()
+        """)
+
+
+def drop_search_triggers(apps, schema_editor):
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table}')
+
+    schema_editor.execute('DROP FUNCTION IF EXISTS lms_search_vector_update()')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('lms', '0011_hot_lookup_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='search_vector',
+            field=SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+        AddIndexConcurrently(
+            model_name='course',
+            index=GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='lesson',
+            index=GinIndex(fields=['search_vector'], name='lesson_search_vector_idx'),
+        ),
+    ]
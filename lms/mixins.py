@@ -0,0 +1,195 @@
+import json
+import time
+from hashlib import md5, sha256
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from config.metrics import current_timings
+
+
+class ServerTimingMixin:
+    """
+    Миксин представления DRF, учитывающий время сериализации в метриках запроса (см. config.middleware).
+
+    Учитывается время обработчика представления после проверок доступа (initial) до finalize_response за вычетом
+    SQL-запросов: в обработчиках DRF это построение сериализаторов, их data и пагинация. Миксин должен стоять
+    первым в списке базовых классов.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        timings = current_timings.get()
+
+        if timings is not None:
+            self._handler_started = (time.perf_counter(), timings.db_time)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        timings = current_timings.get()
+        started = getattr(self, '_handler_started', None)
+
+        if timings is not None and started is not None:
+            elapsed = time.perf_counter() - started[0] - (timings.db_time - started[1])
+            timings.serialize_time += max(elapsed, 0.0)
+
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ConditionalRequestMixin:
+    """
+    Миксин представления, добавляющий заголовки ETag и Last-Modified и обработку условных запросов.
+
+    GET с совпадающим If-None-Match (или не изменившимся с If-Modified-Since) получает ответ 304 до сериализации.
+    PUT/PATCH с устаревшим If-Match получает ответ 412, что дает оптимистичную блокировку при одновременном
+    редактировании.
+
+    Методы, переопределяемые в представлении:
+        get_etag_parts(instance): Значения, от которых зависит представление объекта.
+        get_last_modified(instance): Время последнего изменения объекта или None.
+    """
+
+    def get_etag_parts(self, instance):
+        raise NotImplementedError
+
+    def get_last_modified(self, instance):
+        return None
+
+    def get_etag(self, instance):
+        """
+        Возвращает ETag объекта в кавычках, вычисленный из get_etag_parts.
+        """
+
+        value = ':'.join(str(part) for part in self.get_etag_parts(instance))
+
+        return quote_etag(md5(value.encode(), usedforsecurity=False).hexdigest())
+
+    def get_object(self):
+        """
+        Запоминает объект, чтобы проверка предусловий и обновление не загружали его дважды.
+        """
+
+        if not hasattr(self, '_conditional_object'):
+            self._conditional_object = super().get_object()
+
+        return self._conditional_object
+
+    def check_preconditions(self, request, instance):
+        """
+        Проверяет заголовки условного запроса.
+
+        Возвращаемое значение:
+            HttpResponse | None: Ответ 304 или 412, если запрос не нужно выполнять, иначе None.
+        """
+
+        last_modified = self.get_last_modified(instance)
+
+        return get_conditional_response(
+            request,
+            etag=self.get_etag(instance),
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+
+    def set_validators(self, response, instance):
+        """
+        Добавляет в ответ заголовки ETag и Last-Modified.
+        """
+
+        if 200 <= response.status_code < 300:
+            response['ETag'] = self.get_etag(instance)
+            response['Cache-Control'] = 'private, no-cache'
+            last_modified = self.get_last_modified(instance)
+
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+
+        return response
+
+    def update(self, request, *args, **kwargs):
+        """
+        Обновляет объект, если выполнены предусловия If-Match / If-Unmodified-Since.
+        """
+
+        response = self.check_preconditions(request, self.get_object())
+
+        if response is not None:
+            return response
+
+        response = super().update(request, *args, **kwargs)
+
+        return self.set_validators(response, self.get_object())
+
+
+class IdempotencyKeyMixin:
+    """
+    Миксин представления, поддерживающий заголовок Idempotency-Key для небезопасных запросов.
+
+    Успешный ответ на запрос с ключом сохраняется в кэше (Redis) и возвращается на повторы с тем же ключом без
+    повторного выполнения запроса. Повтор, пришедший во время выполнения первого запроса, получает ответ 409, а
+    повтор ключа с другим телом или адресом - ответ 422. Ключи различаются для разных пользователей.
+
+    Атрибуты:
+        idempotency_timeout (int): Время хранения ответа в секундах.
+        idempotency_lock_timeout (int): Максимальное время выполнения запроса, в течение которого повторы ждут.
+    """
+
+    idempotency_header = 'Idempotency-Key'
+    idempotency_timeout = 24 * 60 * 60
+    idempotency_lock_timeout = 30
+    idempotency_key = None
+
+    def get_idempotency_cache_key(self, request, key):
+        return f'lms:idempotency:{type(self).__name__}:{request.user.pk}:{sha256(key.encode()).hexdigest()}'
+
+    @staticmethod
+    def get_request_fingerprint(request):
+        body = json.dumps(request.data, sort_keys=True, default=str)
+
+        return sha256(f'{request.method}:{request.path}:{body}'.encode()).hexdigest()
+
+    def idempotent_response(self, request, handler, *args, **kwargs):
+        """
+        Выполняет handler(request, *args, **kwargs) не более одного раза для каждого ключа идемпотентности.
+
+        Возвращаемое значение:
+            Response: Ответ handler или сохраненный ответ на первый запрос с тем же ключом.
+        """
+
+        key = request.headers.get(self.idempotency_header)
+
+        if not key:
+            return handler(request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response({'error': f'{self.idempotency_header} is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = self.get_idempotency_cache_key(request, key)
+        fingerprint = self.get_request_fingerprint(request)
+        stored = cache.get(cache_key)
+
+        if stored is None:
+            lock_key = f'{cache_key}:lock'
+
+            if not cache.add(lock_key, fingerprint, self.idempotency_lock_timeout):
+                return Response({'error': 'A request with this idempotency key is in progress'},
+                                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+
+            try:
+                self.idempotency_key = key
+                response = handler(request, *args, **kwargs)
+
+                if 200 <= response.status_code < 300:
+                    cache.set(cache_key, {'fingerprint': fingerprint, 'status': response.status_code,
+                                          'data': response.data}, self.idempotency_timeout)
+            finally:
+                cache.delete(lock_key)
+
+            return response
+
+        if stored['fingerprint'] != fingerprint:
+            return Response({'error': f'{self.idempotency_header} was used with a different request'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
@@ -1,8 +1,22 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models
 
 from users.models.user_model import CustomUser
 
 
+class SearchVectorManager(models.Manager):
+    """
+    Менеджер моделей с поисковым вектором: поле search_vector не загружается вместе с объектами.
+
+    Вектор нужен только в условиях поиска (lms.services.search_service) и по размеру сопоставим с описанием, поэтому
+    загружать его в каждом запросе списка или детального просмотра незачем.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
 class Course(models.Model):
     """
     Модель Курса.
@@ -16,6 +30,9 @@ class Course(models.Model):
         - stripe_product_id (CharField): Идентификатор продукта в Stripe (может быть пустым).
         - stripe_price_id (CharField): Идентификатор цены в Stripe (может быть пустым).
         - updated_at (DateTimeField): Время изменения записи (обновляется автоматически).
+        - search_vector (SearchVectorField): Поисковый вектор наименования (вес A) и описания (вес B) в конфигурации
+          russian. Заполняется триггером базы данных при вставке и изменении (см. миграцию 0012_search_vector),
+          существующие записи заполняются командой reindex_search.
 
     Методы:
         - str: Возвращает строковое представление курса.
@@ -29,6 +46,9 @@ class Course(models.Model):
     stripe_product_id = models.CharField(max_length=255, blank=True, null=True)
     stripe_price_id = models.CharField(max_length=255, blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, blank=True, null=True, verbose_name='время изменения')
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchVectorManager()
 
     def __str__(self):
         """
@@ -43,6 +63,11 @@ class Course(models.Model):
     class Meta:
         verbose_name = 'курс'
         verbose_name_plural = 'курсы'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='course_updated_at_id_idx'),
+            models.Index(fields=['owner', 'updated_at'], name='course_owner_updated_at_idx'),
+            GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+        ]
 
 
 class Lesson(models.Model):
@@ -56,6 +81,8 @@ class Lesson(models.Model):
         preview (ImageField): Изображение для урока (может быть пустым).
         video_url (URLField): URL-адрес видео.
         owner (ForeignKey): Владелец урока, ссылка на пользователя.
+        updated_at (DateTimeField): Время изменения записи (обновляется автоматически).
+        search_vector (SearchVectorField): Поисковый вектор названия и описания урока, как у курса.
 
     Методы:
         str: Возвращает строковое представление урока.
@@ -67,6 +94,10 @@ class Lesson(models.Model):
     preview = models.ImageField(upload_to='lesson_previews/', blank=True, null=True, verbose_name='изображение')
     video_url = models.URLField(verbose_name='видео')
     owner = models.ForeignKey(CustomUser, related_name='lessons', on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True, blank=True, null=True, verbose_name='время изменения')
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchVectorManager()
 
     def __str__(self):
         """
@@ -81,6 +112,105 @@ class Lesson(models.Model):
     class Meta:
         verbose_name = 'урок'
         verbose_name_plural = 'уроки'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='lesson_search_vector_idx'),
+        ]
+
+
+class SubscriptionManager(models.Manager):
+    """
+    Менеджер подписок с атомарным переключением и массовой подпиской.
+
+    Методы:
+        toggle(user_id, course_id): Переключает подписку пользователя на курс одним SQL-запросом.
+        bulk_subscribe(course_id, user_ids, emails, batch_size): Подписывает на курс множество пользователей.
+    """
+
+    def toggle(self, user_id, course_id):
+        """
+        Переключает подписку пользователя на курс.
+
+        Удаление существующей подписки и вставка новой выполняются одним запросом (CTE с DELETE и
+        INSERT ... ON CONFLICT DO NOTHING), поэтому одновременные запросы не создают дубликатов, а каждое
+        переключение стоит одного обращения к базе данных.
+
+        Аргументы:
+            user_id (int): Идентификатор пользователя.
+            course_id (int): Идентификатор курса.
+
+        Возвращаемое значение:
+            bool | None: True - подписка добавлена, False - удалена, None - курс не найден.
+        """
+
+        sql = f"""
+            WITH deleted AS (
+                DELETE FROM {self.model._meta.db_table}
+                WHERE user_id = %(user_id)s AND course_id = %(course_id)s
+                RETURNING id
+            ), inserted AS (
+                INSERT INTO {self.model._meta.db_table} (user_id, course_id)
+                SELECT %(user_id)s, id FROM {Course._meta.db_table}
+                WHERE id = %(course_id)s AND NOT EXISTS (SELECT 1 FROM deleted)
+                ON CONFLICT (user_id, course_id) DO NOTHING
+                RETURNING id
+            )
+            SELECT
+                EXISTS (SELECT 1 FROM deleted),
+                EXISTS (SELECT 1 FROM {Course._meta.db_table} WHERE id = %(course_id)s)
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'user_id': user_id, 'course_id': course_id})
+            deleted, course_exists = cursor.fetchone()
+
+        if not course_exists:
+            return None
+
+        return not deleted
+
+    def bulk_subscribe(self, course_id, user_ids=(), emails=(), batch_size=1000):
+        """
+        Подписывает на курс пользователей, заданных идентификаторами и/или адресами электронной почты.
+
+        Пользователи обрабатываются пачками по batch_size. Каждая пачка вставляется одним запросом INSERT ... SELECT
+        с ON CONFLICT DO NOTHING: существующие подписки и несуществующие пользователи пропускаются.
+
+        Аргументы:
+            course_id (int): Идентификатор курса.
+            user_ids (Iterable[int]): Идентификаторы пользователей.
+            emails (Iterable[str]): Адреса электронной почты пользователей.
+            batch_size (int): Размер пачки.
+
+        Возвращаемое значение:
+            tuple: Количество созданных подписок и список идентификаторов найденных пользователей.
+        """
+
+        user_ids, emails = list(user_ids), list(emails)
+        created = 0
+        subscribed_user_ids = []
+
+        for start in range(0, max(len(user_ids), len(emails)), batch_size):
+            ids_batch = user_ids[start:start + batch_size]
+            emails_batch = emails[start:start + batch_size]
+            batch_user_ids = list(
+                CustomUser.objects.filter(models.Q(pk__in=ids_batch) | models.Q(email__in=emails_batch))
+                .values_list('pk', flat=True)
+            )
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {self.model._meta.db_table} (user_id, course_id)
+                    SELECT user_id, %s FROM unnest(%s::bigint[]) AS user_id
+                    ON CONFLICT (user_id, course_id) DO NOTHING
+                    """,
+                    [course_id, batch_user_ids],
+                )
+                created += cursor.rowcount
+
+            subscribed_user_ids.extend(batch_user_ids)
+
+        return created, subscribed_user_ids
 
 
 class Subscription(models.Model):
@@ -97,6 +227,8 @@ class Subscription(models.Model):
         Ссылка на модель Course, представляющая курс, на который пользователь подписан. При удалении курса все связанные
         подписки также удаляются (on_delete=models.CASCADE).
 
+    Пара (user, course) уникальна.
+
     Методы:
     -------
     __str__():
@@ -106,6 +238,8 @@ class Subscription(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="user")
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="courses")
 
+    objects = SubscriptionManager()
+
     def __str__(self):
         """
         Возвращает строковое представление объекта подписки.
@@ -119,3 +253,9 @@ class Subscription(models.Model):
     class Meta:
         verbose_name = 'подписка'
         verbose_name_plural = 'подписки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_subscription_user_course'),
+        ]
+        indexes = [
+            models.Index(fields=['course', 'id'], name='subscription_course_id_idx'),
+        ]
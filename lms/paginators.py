@@ -1,7 +1,279 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class LessonsAndCoursesPageNumberPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+def estimate_count(queryset):
+    """
+    Возвращает приблизительное количество строк запроса по статистике планировщика PostgreSQL.
+
+    Вместо COUNT(*) выполняется EXPLAIN, из плана берется оценка числа строк.
+
+    Аргументы:
+        queryset (QuerySet): Запрос, количество строк которого нужно оценить.
+
+    Возвращаемое значение:
+        int: Оценка количества строк.
+    """
+
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация по составному ключу сортировки.
+
+    В отличие от постраничной пагинации не выполняет COUNT(*) и OFFSET: следующая страница выбирается условием
+    "строки после последней строки предыдущей страницы", поэтому стоимость запроса не зависит от глубины и
+    вставка новых строк не сдвигает уже выданные страницы. Последнее поле сортировки должно быть уникальным
+    (обычно id), значения NULL считаются наименьшими.
+
+    Атрибуты:
+        ordering (tuple): Поля сортировки, префикс '-' означает убывание.
+        page_size (int): Размер страницы по умолчанию.
+        page_size_query_param (str): Параметр запроса для размера страницы.
+        max_page_size (int): Максимальный размер страницы.
+        cursor_query_param (str): Параметр запроса с курсором.
+        count_query_param (str): Параметр запроса, включающий в ответ количество ('exact' или 'approx').
+    """
+
+    ordering = ('-id',)
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.fields = [
+            (queryset.model._meta.get_field(name.lstrip('-')), name.startswith('-')) for name in self.ordering
+        ]
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        self.count = self.get_count(queryset, request)
+
+        ordering = [(field, descending != reverse) for field, descending in self.fields]
+        queryset = queryset.order_by(*self.get_order_by(ordering))
+
+        if position is not None:
+            queryset = queryset.filter(self.get_after_condition(ordering, position))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'approx':
+            return estimate_count(queryset)
+
+        return None
+
+    @staticmethod
+    def get_order_by(ordering):
+        """
+        Возвращает выражения сортировки, в которых NULL всегда считается наименьшим значением.
+
+        Для полей NOT NULL порядок NULL не указывается, чтобы сортировка совпадала с обычным B-tree индексом,
+        просматриваемым в прямом или обратном направлении.
+        """
+
+        return [
+            (F(field.name).desc(nulls_last=field.null or None) if descending
+             else F(field.name).asc(nulls_first=field.null or None))
+            for field, descending in ordering
+        ]
+
+    @staticmethod
+    def get_after_condition(ordering, position):
+        """
+        Строит условие выбора строк, следующих за position при заданной сортировке.
+
+        Для ключа (a, b) условие имеет вид (a после va) OR (a = va AND b после vb).
+        """
+
+        condition = Q(pk__in=[])
+        equal = Q()
+
+        for (field, descending), value in zip(ordering, position):
+            name = field.name
+
+            if value is None:
+                after = None if descending else Q(**{f'{name}__isnull': False})
+                same = Q(**{f'{name}__isnull': True})
+            elif descending:
+                after = Q(**{f'{name}__lt': value})
+                if field.null:
+                    after |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            else:
+                after = Q(**{f'{name}__gt': value})
+                same = Q(**{name: value})
+
+            if after is not None:
+                condition |= equal & after
+
+            equal &= same
+
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if not encoded:
+            return None, False
+
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            values = data['p']
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [
+                None if value is None else field.to_python(value) for (field, _), value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, KeyError, UnicodeError) as error:
+            raise NotFound('Некорректный курсор.') from error
+
+        return position, bool(data.get('r'))
+
+    def encode_cursor(self, instance, reverse):
+        values = [
+            None if getattr(instance, field.attname) is None else field.value_to_string(instance)
+            for field, _ in self.fields
+        ]
+        data = json.dumps({'p': values, 'r': int(reverse)}, separators=(',', ':'))
+
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   urlsafe_b64encode(data.encode('utf-8')).decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        content = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+        if self.count is not None:
+            content['count'] = self.count
+
+        return Response(content)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetPaginationMixin:
+    """
+    Миксин представления, позволяющий клиенту выбрать курсорную пагинацию для отдельного запроса.
+
+    Курсорная пагинация включается параметром pagination=cursor или наличием параметра cursor, в остальных случаях
+    используется pagination_class представления. Представления больших таблиц могут использовать только курсорную
+    пагинацию (cursor_pagination_only).
+
+    Атрибуты:
+        cursor_ordering (tuple): Поля сортировки для KeysetPagination, последнее поле должно быть уникальным.
+        cursor_pagination_only (bool): Всегда использовать курсорную пагинацию.
+    """
+
+    cursor_ordering = ('-id',)
+    cursor_pagination_class = KeysetPagination
+    cursor_pagination_only = False
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+
+            if request is not None and (self.cursor_pagination_only or self.use_cursor_pagination(request)):
+                self._paginator = self.cursor_pagination_class(ordering=self.get_cursor_ordering())
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+
+        return self._paginator
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    @staticmethod
+    def use_cursor_pagination(request):
+        params = getattr(request, 'query_params', request.GET)
+
+        return params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params
@@ -1,13 +1,15 @@
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
 
 from lms.models import Course, Lesson, Subscription
+from lms.services.search_service import SEARCH_LIMIT, SEARCH_MAX_LIMIT, SEARCH_MODELS
 from lms.validators import LinkValidator
 
-from lms.tasks import send_update_email
+from lms.tasks import notify_course_subscribers
 
 User = get_user_model()
 
@@ -19,8 +21,8 @@ class LessonSerializer(serializers.ModelSerializer):
     Класс Meta:
         model : Model
             Модель, используемая для сериализации (Lesson).
-        fields : str
-            Поля модели, которые будут включены в сериализацию ('all' означает, что все поля будут включены).
+        exclude : list
+            Поля модели, которые не будут включены в сериализацию (поисковый вектор), остальные поля включаются.
         validators : list
             Список валидаторов, которые будут применяться к сериализованным данным. В данном случае используется
             LinkValidator для проверки поля 'video_url'.
@@ -28,7 +30,7 @@ class LessonSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Lesson
-        fields = '__all__'
+        exclude = ['search_vector']
         validators = [LinkValidator(field='video_url')]
 
     def update(self, instance, validated_data):
@@ -36,7 +38,7 @@ class LessonSerializer(serializers.ModelSerializer):
         Обновляет экземпляр Lesson с использованием данных validated_data.
 
         При обновлении также проверяется, обновлялся ли связанный курс более 4 часов назад.
-        Если да, то подписчики курса получают уведомление по электронной почте об обновлении урока.
+        Если да, то после фиксации транзакции ставится задача рассылки уведомления подписчикам курса.
 
         Параметры:
         instance : Lesson
@@ -50,14 +52,11 @@ class LessonSerializer(serializers.ModelSerializer):
 
         now = timezone.now()
         four_hours_ago = now - timedelta(hours=4)
-        updated_course = Course.objects.filter(pk=instance.course_id, updated_at__lte=four_hours_ago).last()
+        course_is_stale = Course.objects.filter(pk=instance.course_id, updated_at__lte=four_hours_ago).exists()
 
-        if updated_course:
-            subscribers = Subscription.objects.filter(course=updated_course)
-            subscribed_users = [subscription.user for subscription in subscribers]
-
-            for user in subscribed_users:
-                send_update_email.delay(user.email, instance.title)
+        if course_is_stale:
+            course_id, title = instance.course_id, instance.title
+            transaction.on_commit(lambda: notify_course_subscribers.delay(course_id, title))
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -84,9 +83,8 @@ class CourseSerializer(serializers.ModelSerializer):
     ----------
     model : Model
         Модель, используемая для сериализации (Course).
-    fields : list[str] или str
-        Поля модели, которые будут включены в сериализацию.
-        При значении 'all' включаются все поля модели.
+    exclude : list[str]
+        Поля модели, которые не будут включены в сериализацию (поисковый вектор), остальные поля включаются.
 
     Методы
     -------
@@ -140,7 +138,33 @@ class CourseSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Course
-        fields = '__all__'
+        exclude = ['search_vector']
+
+    def __init__(self, *args, fields=None, expand=None, lessons_source=None, **kwargs):
+        """
+        Позволяет ограничить набор полей и отключить вложенные уроки.
+
+        Параметры
+        ----------
+        fields : Iterable[str], optional
+            Поля верхнего уровня, которые нужно оставить. None - все поля.
+        expand : Iterable[str], optional
+            Раскрываемые вложенные поля. Если передано и не содержит 'lessons', уроки не сериализуются.
+            None - уроки включаются всегда.
+        lessons_source : str, optional
+            Атрибут курса со списком уроков, например загруженный через Prefetch(to_attr=...) с ограничением числа.
+        """
+
+        super().__init__(*args, **kwargs)
+
+        if expand is not None and 'lessons' not in expand:
+            self.fields.pop('lessons')
+        elif lessons_source is not None:
+            self.fields['lessons'] = LessonSerializer(many=True, read_only=True, source=lessons_source)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields) - {'lessons'}:
+                self.fields.pop(name)
 
     def get_is_subscribed(self, obj):
         """
@@ -155,8 +179,13 @@ class CourseSerializer(serializers.ModelSerializer):
         -------
         bool
             True, если пользователь подписан на курс, иначе False.
+
+        Если курс получен из CourseViewSet, используется аннотация is_subscribed без дополнительного запроса.
         """
 
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         user = self.context['request'].user
 
         return Subscription.objects.filter(user=user, course=obj).exists()
@@ -175,15 +204,21 @@ class CourseSerializer(serializers.ModelSerializer):
         -------
         int
             Количество уроков для данного курса.
+
+        Если курс получен из CourseViewSet, используется аннотация lesson_count без дополнительного запроса.
         """
 
+        if hasattr(instance, 'lesson_count'):
+            return instance.lesson_count
+
         return instance.lessons.count()
 
     def update(self, instance, validated_data):
         """
         Обновляет экземпляр курса с использованием данных validated_data.
 
-        При обновлении также уведомляет всех подписчиков курса по электронной почте о произошедших изменениях.
+        При обновлении также уведомляет всех подписчиков курса по электронной почте о произошедших изменениях:
+        после фиксации транзакции ставится одна задача рассылки, которая сама разбивает подписчиков на пачки.
 
         Параметры
         ----------
@@ -198,11 +233,8 @@ class CourseSerializer(serializers.ModelSerializer):
             Обновленный экземпляр курса.
         """
 
-        subscribers = Subscription.objects.filter(course=instance)
-        subscribed_users = [subscription.user for subscription in subscribers]
-
-        for user in subscribed_users:
-            send_update_email.delay(user.email, instance.title)
+        course_id, title = instance.pk, instance.title
+        transaction.on_commit(lambda: notify_course_subscribers.delay(course_id, title))
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -210,3 +242,51 @@ class CourseSerializer(serializers.ModelSerializer):
         instance.save()
 
         return instance
+
+
+class BulkEnrollmentSerializer(serializers.Serializer):
+    """
+    Сериализатор запроса массовой подписки пользователей на курс.
+
+    Атрибуты
+    ----------
+    user_ids : ListField
+        Идентификаторы пользователей.
+    emails : ListField
+        Адреса электронной почты пользователей.
+    """
+
+    max_users = 10000
+
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False,
+                                     max_length=max_users)
+    emails = serializers.ListField(child=serializers.EmailField(), required=False, max_length=max_users)
+
+    def validate(self, attrs):
+        """
+        Проверяет, что передан хотя бы один пользователь.
+        """
+
+        if not attrs.get('user_ids') and not attrs.get('emails'):
+            raise serializers.ValidationError('Укажите user_ids или emails.')
+
+        return attrs
+
+
+class CatalogSearchQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров поиска по курсам и урокам.
+
+    Атрибуты
+    ----------
+    q : CharField
+        Строка поиска (синтаксис websearch_to_tsquery: кавычки, OR, исключение через '-').
+    type : MultipleChoiceField
+        Типы записей: course, lesson (по умолчанию все).
+    limit : IntegerField
+        Количество результатов.
+    """
+
+    q = serializers.CharField(max_length=200)
+    type = serializers.MultipleChoiceField(choices=list(SEARCH_MODELS), required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=SEARCH_MAX_LIMIT, default=SEARCH_LIMIT)
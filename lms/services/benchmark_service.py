@@ -0,0 +1,351 @@
+import hashlib
+import hmac
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from unittest import mock
+
+import django
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from lms.models import Course, Lesson, Subscription
+from lms.services.seed_service import SEED_PASSWORD
+from lms.services.stripe_service import StripeService
+from lms.services.stripe_stub import StripeStubServer
+from users.models.payment_model import Payment
+from users.models.user_model import CustomUser
+from users.services.role_service import MODERATORS_GROUP
+
+BENCHMARK_ITERATIONS = 20
+BENCHMARK_WARMUP = 2
+BENCHMARK_URLCONFS = {'lms': 'lms.urls', 'users': 'users.urls'}
+BENCHMARK_ENROLL_SIZE = 100
+BENCHMARK_WEBHOOK_SECRET = 'whsec_benchmark'
+BENCHMARK_PERCENTILES = (50, 90, 99)
+
+
+def get_route_names():
+    """
+    Возвращает имена всех маршрутов lms.urls и users.urls в виде 'приложение:имя'.
+    """
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                yield pattern.name
+
+    return {f'{app}:{name}' for app, urlconf in BENCHMARK_URLCONFS.items()
+            for name in walk(get_resolver(urlconf).url_patterns)}
+
+
+def get_benchmark_context():
+    """
+    Выбирает из базы данных пользователей и объекты, на которых выполняются запросы бенчмарка.
+
+    Возвращает:
+    - dict | None: Модератор, владелец курса, покупатель, курс, урок и платежи или None, если данных нет
+      (база не заполнена командой seed_data).
+    """
+
+    moderator = CustomUser.objects.filter(groups__name=MODERATORS_GROUP).order_by('pk').first()
+    course = Course.objects.select_related('owner').filter(lessons__isnull=False).order_by('pk').first()
+    payment = (Payment.objects.select_related('user').filter(stripe_payment_id__isnull=False)
+               .exclude(user=moderator).order_by('pk').first())
+
+    if moderator is None or course is None or payment is None:
+        return None
+
+    return {
+        'moderator': moderator,
+        'owner': course.owner,
+        'customer': payment.user,
+        'course': course,
+        'lesson': Lesson.objects.filter(course=course).order_by('pk').first(),
+        'payment': payment,
+        'enroll_emails': list(
+            CustomUser.objects.order_by('pk').values_list('email', flat=True)[:BENCHMARK_ENROLL_SIZE]
+        ),
+    }
+
+
+def sign_webhook(payload, secret):
+    """
+    Возвращает заголовок Stripe-Signature для тела вебхука.
+    """
+
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+
+    return f't={timestamp},v1={signature}'
+
+
+def get_scenarios(context):
+    """
+    Возвращает сценарии бенчмарка: по одному или несколько запросов на каждый маршрут lms.urls и users.urls.
+
+    Сценарий - словарь с ключами name, route ('приложение:имя' маршрута), method, path, user, data и headers.
+    """
+
+    course, lesson, payment = context['course'], context['lesson'], context['payment']
+    moderator, owner, customer = context['moderator'], context['owner'], context['customer']
+    webhook_payload = json.dumps({
+        'id': 'evt_benchmark', 'type': 'checkout.session.completed', 'created': int(time.time()),
+        'data': {'object': {'id': payment.stripe_payment_id, 'payment_status': 'paid'}},
+    })
+    refresh = str(RefreshToken.for_user(customer))
+
+    def scenario(name, route, method, path, user=None, data=None, headers=None):
+        return {'name': name, 'route': route, 'method': method, 'path': path, 'user': user, 'data': data,
+                'headers': headers or {}}
+
+    return [
+        scenario('lms-root', 'lms:api-root', 'get', '/api/', customer),
+        scenario('course-list', 'lms:course-list', 'get', '/api/courses/', customer),
+        scenario('course-list-owned', 'lms:course-list', 'get', '/api/courses/', owner),
+        scenario('course-detail', 'lms:course-detail', 'get', f'/api/courses/{course.pk}/', owner),
+        scenario('course-update', 'lms:course-detail', 'patch', f'/api/courses/{course.pk}/', owner,
+                 {'title': course.title}),
+        scenario('course-create', 'lms:course-list', 'post', '/api/courses/', owner,
+                 {'title': 'Бенчмарк', 'description': 'Курс бенчмарка', 'price': 1000, 'owner': owner.pk}),
+        scenario('course-enroll', 'lms:course-enroll', 'post', f'/api/courses/{course.pk}/enroll/', owner,
+                 {'emails': context['enroll_emails']}),
+        scenario('lesson-list', 'lms:lesson-list-create', 'get', '/api/lessons/', moderator),
+        scenario('lesson-create', 'lms:lesson-list-create', 'post', '/api/lessons/', owner,
+                 {'course': course.pk, 'title': 'Бенчмарк', 'description': 'Урок бенчмарка',
+                  'video_url': 'https://www.youtube.com/watch?v=benchmark', 'owner': owner.pk}),
+        scenario('lesson-detail', 'lms:lesson-detail', 'get', f'/api/lessons/{lesson.pk}/', owner),
+        scenario('search', 'lms:search', 'get', '/api/search/?q=курс', moderator),
+        scenario('subscribe', 'lms:subscribe', 'post', '/api/subscribe/', customer, {'course_id': course.pk}),
+        scenario('create-payment', 'lms:create-payment', 'post', f'/api/create-payment/{course.pk}/', customer),
+        scenario('payment-success', 'lms:payment-success', 'get', '/api/success/'),
+        scenario('payment-cancel', 'lms:payment-cancel', 'get', '/api/cancel/'),
+        scenario('check-session-status', 'lms:check-session-status', 'get',
+                 f'/api/check-session-status/{payment.stripe_payment_id}/', payment.user),
+        scenario('stripe-webhook', 'lms:stripe-webhook', 'post', '/api/stripe/webhook/', data=webhook_payload,
+                 headers={'HTTP_STRIPE_SIGNATURE': sign_webhook(webhook_payload, BENCHMARK_WEBHOOK_SECRET)}),
+        scenario('users-root', 'users:api-root', 'get', '/api/users/', customer),
+        scenario('payment-list', 'users:payment-list', 'get', '/api/users/payments/', customer),
+        scenario('payment-list-moderator', 'users:payment-list', 'get', '/api/users/payments/', moderator),
+        scenario('payment-detail', 'users:payment-detail', 'get', f'/api/users/payments/{payment.pk}/',
+                 payment.user),
+        scenario('payment-analytics', 'users:payment-analytics', 'get', '/api/users/payments/analytics/',
+                 moderator),
+        scenario('payment-export', 'users:payment-export', 'get', '/api/users/payments/export/', customer),
+        scenario('user-profile', 'users:user-profile', 'get', f'/api/users/profile/{customer.pk}/', customer),
+        scenario('user-payments', 'users:user-payments', 'get', f'/api/users/profile/{customer.pk}/payments/',
+                 moderator),
+        scenario('token-obtain', 'users:token_obtain_pair', 'post', '/api/users/token/',
+                 data={'email': customer.email, 'password': SEED_PASSWORD}),
+        scenario('token-refresh', 'users:token_refresh', 'post', '/api/users/token/refresh/',
+                 data={'refresh': refresh}),
+        scenario('register', 'users:create_user', 'post', '/api/users/register/',
+                 data={'email': 'benchmark@example.com', 'password': SEED_PASSWORD, 'phone': '+79000000000',
+                       'city': 'Москва'}),
+        scenario('user-list', 'users:list_users', 'get', '/api/users/users/', moderator),
+        scenario('user-search', 'users:list_users', 'get', '/api/users/users/?search=seed', moderator),
+    ]
+
+
+def get_client(user):
+    """
+    Возвращает клиент, аутентифицированный как user: токен JWT для API и сессия для представлений Django.
+    """
+
+    client = APIClient()
+
+    if user is not None:
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        client.force_login(user)
+
+    return client
+
+
+def perform(client, scenario):
+    """
+    Выполняет запрос сценария в транзакции, которая затем откатывается, поэтому база данных не меняется.
+
+    Возвращает:
+    - Response: Ответ (тело потокового ответа прочитано целиком).
+    """
+
+    with transaction.atomic():
+        request = getattr(client, scenario['method'])
+        data = scenario['data']
+
+        if isinstance(data, str):
+            response = request(scenario['path'], data, content_type='application/json', **scenario['headers'])
+        else:
+            response = request(scenario['path'], data, format='json', **scenario['headers'])
+
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+        transaction.set_rollback(True)
+
+    return response
+
+
+def percentile(values, percent):
+    """
+    Возвращает перцентиль отсортированного списка значений (метод ближайшего ранга).
+    """
+
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def run_scenario(scenario, iterations=BENCHMARK_ITERATIONS, warmup=BENCHMARK_WARMUP):
+    """
+    Выполняет сценарий и возвращает его метрики.
+
+    Задержка измеряется за iterations запросов после warmup прогревочных. Количество запросов к базе данных и
+    пиковый прирост памяти (tracemalloc) измеряются отдельным запросом, чтобы трассировка не искажала задержку.
+
+    Возвращает:
+    - dict: Статусы ответов, задержка (мс: min, p50, p90, p99, max, mean), количество запросов к базе данных
+      и пиковая память в КиБ.
+    """
+
+    client = get_client(scenario['user'])
+    statuses = set()
+
+    for _ in range(warmup):
+        perform(client, scenario)
+
+    latencies = []
+
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = perform(client, scenario)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses.add(response.status_code)
+
+    latencies.sort()
+
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        try:
+            perform(client, scenario)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'route': scenario['route'],
+        'method': scenario['method'].upper(),
+        'path': scenario['path'],
+        'status': sorted(statuses),
+        'iterations': iterations,
+        'latency_ms': {
+            'min': round(latencies[0], 3),
+            **{f'p{percent}': round(percentile(latencies, percent), 3) for percent in BENCHMARK_PERCENTILES},
+            'max': round(latencies[-1], 3),
+            'mean': round(statistics.fmean(latencies), 3),
+        },
+        'queries': len(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(iterations=BENCHMARK_ITERATIONS, warmup=BENCHMARK_WARMUP, only=None):
+    """
+    Выполняет сценарии бенчмарка на данных текущей базы и возвращает отчет.
+
+    Запросы выполняются тестовым клиентом Django в откатываемых транзакциях. Создание платежа обращается к
+    локальной заглушке Stripe (StripeStubServer), вебхук подписывается тестовым секретом.
+
+    Аргументы:
+    - iterations (int): Количество измеряемых запросов каждого сценария.
+    - warmup (int): Количество прогревочных запросов.
+    - only (Iterable[str] | None): Имена сценариев, которые нужно выполнить. None - все сценарии.
+
+    Возвращает:
+    - dict | None: Отчет (meta, endpoints, uncovered_routes) или None, если база не заполнена.
+    """
+
+    context = get_benchmark_context()
+
+    if context is None:
+        return None
+
+    scenarios = get_scenarios(context)
+    stub = StripeStubServer()
+    stripe_service = StripeService('sk_test_benchmark', api_base=stub.start())
+
+    try:
+        with mock.patch.multiple('lms.services.stripe_service', _service=stripe_service, _service_pid=os.getpid()), \
+                mock.patch('lms.views.settings.STRIPE_WEBHOOK_SECRET', BENCHMARK_WEBHOOK_SECRET):
+            endpoints = {
+                scenario['name']: run_scenario(scenario, iterations, warmup)
+                for scenario in scenarios if only is None or scenario['name'] in only
+            }
+    finally:
+        stub.stop()
+
+    return {
+        'meta': {
+            'commit': get_git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': iterations,
+            'warmup': warmup,
+            'dataset': {
+                'users': CustomUser.objects.count(),
+                'courses': Course.objects.count(),
+                'lessons': Lesson.objects.count(),
+                'subscriptions': Subscription.objects.count(),
+                'payments': Payment.objects.count(),
+            },
+        },
+        'endpoints': endpoints,
+        'uncovered_routes': sorted(get_route_names() - {scenario['route'] for scenario in scenarios}),
+    }
+
+
+def compare_reports(previous, current):
+    """
+    Сравнивает два отчета бенчмарка по общим сценариям.
+
+    Возвращает:
+    - list[dict]: Для каждого сценария - p50 и p90 (мс) и количество запросов в обоих отчетах и изменение p50 в
+      процентах.
+    """
+
+    rows = []
+
+    for name in sorted(previous['endpoints'].keys() & current['endpoints'].keys()):
+        before, after = previous['endpoints'][name], current['endpoints'][name]
+        p50_before, p50_after = before['latency_ms']['p50'], after['latency_ms']['p50']
+
+        rows.append({
+            'name': name,
+            'p50': (p50_before, p50_after),
+            'p90': (before['latency_ms']['p90'], after['latency_ms']['p90']),
+            'queries': (before['queries'], after['queries']),
+            'change': (p50_after - p50_before) / p50_before * 100 if p50_before else 0.0,
+        })
+
+    return rows
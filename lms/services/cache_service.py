@@ -0,0 +1,288 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+REPRESENTATION_CACHE_TIMEOUT = 24 * 60 * 60
+LOCAL_CACHE_SIZE = 1024
+LOCAL_CACHE_TTL = 60
+INVALIDATION_CHANNEL = 'lms:representation:invalidate'
+SUBSCRIPTIONS_INVALIDATION_BATCH = 1000
+
+
+class LocalLRUCache:
+    """
+    Потокобезопасный LRU-кэш в памяти процесса с ограниченным временем жизни записей.
+
+    Атрибуты:
+    - max_size (int): Максимальное количество записей.
+    - ttl (int): Время жизни записи в секундах. Ограничивает устаревание, если сообщение об инвалидации потеряно.
+    """
+
+    def __init__(self, max_size=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None:
+                return None
+
+            expires_at, value = item
+
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalLRUCache()
+
+_subscriber_lock = threading.Lock()
+_subscriber_pid = None
+_publisher_lock = threading.Lock()
+_publisher = None
+_publisher_pid = None
+
+
+def _get_redis_url():
+    """
+    Возвращает адрес Redis, если кэш по умолчанию работает через Redis, иначе None.
+    """
+
+    config = settings.CACHES.get('default', {})
+
+    if config.get('BACKEND') != 'django.core.cache.backends.redis.RedisCache':
+        return None
+
+    location = config.get('LOCATION')
+
+    return location[0] if isinstance(location, (list, tuple)) else location
+
+
+def _listen_for_invalidations(redis_url):
+    """
+    Слушает канал Redis pub/sub и удаляет из локального кэша объекты, измененные в других процессах.
+    """
+
+    import redis
+
+    while True:
+        try:
+            pubsub = redis.Redis.from_url(redis_url).pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+
+            for message in pubsub.listen():
+                local_cache.delete(message['data'].decode())
+        except Exception:
+            logger.exception('Подписка на инвалидацию кэша представлений прервана, переподключение')
+            local_cache.clear()
+            time.sleep(1)
+
+
+def _ensure_subscriber():
+    """
+    Запускает в текущем процессе фоновый поток подписки на инвалидации (один раз на процесс, в том числе после fork).
+    """
+
+    global _subscriber_pid
+
+    if _subscriber_pid == os.getpid():
+        return
+
+    with _subscriber_lock:
+        if _subscriber_pid == os.getpid():
+            return
+
+        _subscriber_pid = os.getpid()
+        redis_url = _get_redis_url()
+
+        if redis_url is not None:
+            local_cache.clear()
+            threading.Thread(target=_listen_for_invalidations, args=(redis_url,), daemon=True,
+                             name='representation-cache-invalidation').start()
+
+
+def _get_publisher(redis_url):
+    """
+    Возвращает клиент Redis для рассылки инвалидаций, общий для всего процесса (после fork создается заново).
+    """
+
+    global _publisher, _publisher_pid
+
+    if _publisher_pid != os.getpid():
+        import redis
+
+        with _publisher_lock:
+            if _publisher_pid != os.getpid():
+                _publisher = redis.Redis.from_url(redis_url)
+                _publisher_pid = os.getpid()
+
+    return _publisher
+
+
+def _publish_invalidation(key):
+    redis_url = _get_redis_url()
+
+    if redis_url is None:
+        return
+
+    import redis
+
+    try:
+        _get_publisher(redis_url).publish(INVALIDATION_CHANNEL, key)
+    except redis.RedisError:
+        logger.exception('Не удалось разослать инвалидацию кэша представлений для %s', key)
+
+
+def get_object_key(kind, pk):
+    return f'lms:representation:{kind}:{pk}'
+
+
+def get_version_key(kind, pk):
+    return f'lms:representation-version:{kind}:{pk}'
+
+
+def get_representation(kind, pk, build):
+    """
+    Возвращает сериализованное представление объекта из двухуровневого кэша.
+
+    Сначала проверяется LRU-кэш процесса, затем Redis (ключ включает версию объекта), и только при промахе
+    представление строится функцией build и сохраняется в оба уровня.
+
+    Аргументы:
+    - kind (str): Тип объекта ('course' или 'lesson').
+    - pk (int): Идентификатор объекта.
+    - build (Callable[[], dict]): Функция, строящая представление из базы данных.
+
+    Возвращает:
+    - dict: Представление объекта. Возвращается копия, которую можно изменять.
+    """
+
+    _ensure_subscriber()
+
+    object_key = get_object_key(kind, pk)
+    data = local_cache.get(object_key)
+
+    if data is None:
+        version = cache.get_or_set(get_version_key(kind, pk), 1, None)
+        versioned_key = f'{object_key}:v{version}'
+        data = cache.get(versioned_key)
+
+        if data is None:
+            data = build()
+            cache.set(versioned_key, data, REPRESENTATION_CACHE_TIMEOUT)
+
+        local_cache.set(object_key, data)
+
+    return dict(data)
+
+
+def invalidate_representation(kind, pk):
+    """
+    Инвалидирует представление объекта во всех процессах.
+
+    Версия объекта в Redis увеличивается, так что старые записи больше не читаются, запись удаляется из локального
+    кэша и рассылается сообщение остальным процессам через Redis pub/sub.
+
+    Аргументы:
+    - kind (str): Тип объекта ('course' или 'lesson').
+    - pk (int): Идентификатор объекта.
+    """
+
+    version_key = get_version_key(kind, pk)
+
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, 2, None)
+
+    object_key = get_object_key(kind, pk)
+    local_cache.delete(object_key)
+    _publish_invalidation(object_key)
+
+
+def get_subscriptions_key(user_id):
+    return f'lms:subscriptions:{user_id}'
+
+
+def get_subscribed_course_ids(user):
+    """
+    Возвращает множество идентификаторов курсов, на которые подписан пользователь.
+
+    Используется для наложения персонального поля is_subscribed поверх общего кэшированного представления курса.
+
+    Аргументы:
+    - user (CustomUser): Пользователь.
+
+    Возвращает:
+    - frozenset: Идентификаторы курсов.
+    """
+
+    from lms.models import Subscription
+
+    key = get_subscriptions_key(user.pk)
+    course_ids = cache.get(key)
+
+    if course_ids is None:
+        course_ids = frozenset(Subscription.objects.filter(user=user).values_list('course_id', flat=True))
+        cache.set(key, course_ids, REPRESENTATION_CACHE_TIMEOUT)
+
+    return course_ids
+
+
+def invalidate_subscriptions(user_id):
+    """
+    Удаляет из кэша подписки пользователя.
+
+    Аргументы:
+    - user_id (int): Идентификатор пользователя.
+    """
+
+    cache.delete(get_subscriptions_key(user_id))
+
+
+def invalidate_subscriptions_many(user_ids):
+    """
+    Удаляет из кэша подписки нескольких пользователей (например, после массовой подписки на курс).
+
+    Ключи удаляются командой delete_many пачками по SUBSCRIPTIONS_INVALIDATION_BATCH, то есть одним обращением к
+    Redis на пачку, а не на каждого пользователя.
+
+    Аргументы:
+    - user_ids (Iterable[int]): Идентификаторы пользователей.
+    """
+
+    keys = [get_subscriptions_key(user_id) for user_id in user_ids]
+
+    for start in range(0, len(keys), SUBSCRIPTIONS_INVALIDATION_BATCH):
+        cache.delete_many(keys[start:start + SUBSCRIPTIONS_INVALIDATION_BATCH])
@@ -0,0 +1,288 @@
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+import stripe
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from lms.services.stripe_service import (StripeUnavailableError, expire_checkout_session, list_checkout_sessions,
+                                         retrieve_checkout_session)
+from users.models.payment_model import Payment
+from users.models.stripe_event_model import StripeEvent
+from users.services.revenue_service import schedule_rollup_update
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT_SESSION_EVENTS = {
+    'checkout.session.completed': None,
+    'checkout.session.async_payment_succeeded': 'paid',
+    'checkout.session.async_payment_failed': 'failed',
+    'checkout.session.expired': 'expired',
+}
+FINAL_STATUSES = ('paid', 'no_payment_required', 'failed', 'expired')
+PENDING_STATUS = Q(stripe_status__isnull=True) | ~Q(stripe_status__in=FINAL_STATUSES)
+SESSION_LIST_PAGE_SIZE = 100
+SESSION_CREATED_SKEW = 5 * 60
+OPEN_SESSION_EXPIRY_MARGIN = 10 * 60
+
+
+def record_stripe_event(payload):
+    """
+    Сохраняет событие Stripe в журнал, если оно еще не было получено.
+
+    Аргументы:
+    - payload (dict): Тело события вебхука.
+
+    Возвращает:
+    - StripeEvent | None: Новая запись журнала или None, если событие уже было получено ранее.
+    """
+
+    data_object = payload.get('data', {}).get('object', {})
+
+    try:
+        with transaction.atomic():
+            return StripeEvent.objects.create(
+                event_id=payload['id'],
+                type=payload['type'],
+                object_id=data_object.get('id', ''),
+                payload=payload,
+                created=datetime.fromtimestamp(payload['created'], tz=dt_timezone.utc),
+            )
+    except IntegrityError:
+        return None
+
+
+def get_event_status(event_type, data_object):
+    """
+    Возвращает статус платежа, в который переводит событие сессии Checkout, или None для прочих событий.
+    """
+
+    if event_type not in CHECKOUT_SESSION_EVENTS:
+        return None
+
+    return CHECKOUT_SESSION_EVENTS[event_type] or data_object.get('payment_status')
+
+
+def apply_stripe_event(stripe_event):
+    """
+    Применяет событие сессии Checkout к платежу и отмечает событие обработанным.
+
+    Статус платежа меняется одним условным UPDATE: платеж в конечном статусе (оплачен, отклонен, истек) не
+    изменяется, поэтому повторная или запоздавшая доставка события не откатывает статус назад. Оплаченному
+    платежу в том же запросе проставляется время зачисления и ставится обновление сводки выручки.
+
+    Аргументы:
+    - stripe_event (StripeEvent): Событие из журнала.
+
+    Возвращает:
+    - int: Количество обновленных платежей.
+    """
+
+    data_object = stripe_event.payload.get('data', {}).get('object', {})
+    payment_status = get_event_status(stripe_event.type, data_object)
+    updated = 0
+
+    with transaction.atomic():
+        if payment_status and stripe_event.object_id:
+            changes = {'stripe_status': payment_status}
+
+            if payment_status in Payment.PAID_STATUSES:
+                changes['settled_at'] = Now()
+
+            updated = Payment.objects.filter(
+                PENDING_STATUS, stripe_payment_id=stripe_event.object_id,
+            ).exclude(stripe_status=payment_status).update(**changes)
+
+            if updated and 'settled_at' in changes:
+                schedule_rollup_update()
+
+        StripeEvent.objects.filter(pk=stripe_event.pk, processed_at__isnull=True).update(processed_at=timezone.now())
+
+    return updated
+
+
+def get_session_payment_status(session):
+    """
+    Возвращает статус платежа по сессии Checkout: 'expired' для истекшей сессии, иначе payment_status сессии.
+    """
+
+    return 'expired' if session.status == 'expired' else session.payment_status
+
+
+def _retrieve_or_none(session_id):
+    try:
+        return retrieve_checkout_session(session_id)
+    except stripe.InvalidRequestError:
+        return None
+
+
+def fetch_checkout_sessions(payments, concurrency=4):
+    """
+    Получает из Stripe сессии Checkout пачки платежей с минимальным количеством запросов.
+
+    Сначала сессии выбираются постранично списком за интервал создания платежей пачки (до 100 сессий за
+    запрос). Число страниц ограничено так, чтобы список не стоил дороже получения сессий по одной; сессии, не
+    найденные в списке, запрашиваются по одной в пуле из concurrency потоков.
+
+    Аргументы:
+    - payments (Iterable[Payment]): Платежи с заполненными stripe_payment_id и payment_date.
+    - concurrency (int): Максимальное количество одновременных запросов.
+
+    Возвращает:
+    - dict: Сессии по идентификаторам; None, если сессия в Stripe не найдена.
+    """
+
+    payments = list(payments)
+    wanted = {payment.stripe_payment_id for payment in payments}
+    sessions = {}
+
+    if not wanted:
+        return sessions
+
+    created = [int(payment.payment_date.timestamp()) for payment in payments]
+    starting_after = None
+
+    for _ in range(math.ceil(len(wanted) / SESSION_LIST_PAGE_SIZE) + 1):
+        page = list_checkout_sessions(created_gte=min(created) - SESSION_CREATED_SKEW,
+                                      created_lte=max(created) + SESSION_CREATED_SKEW,
+                                      starting_after=starting_after, limit=SESSION_LIST_PAGE_SIZE)
+        sessions.update((session.id, session) for session in page.data if session.id in wanted)
+
+        if not page.has_more or not page.data or len(sessions) == len(wanted):
+            break
+
+        starting_after = page.data[-1].id
+
+    missing = sorted(wanted - sessions.keys())
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            sessions.update(zip(missing, executor.map(_retrieve_or_none, missing)))
+
+    return sessions
+
+
+def _expire_or_none(session_id):
+    try:
+        return expire_checkout_session(session_id)
+    except stripe.InvalidRequestError:
+        return None
+    except StripeUnavailableError as error:
+        logger.warning('Не удалось завершить сессию Stripe %s (%s), она будет обработана при следующей сверке',
+                       session_id, error)
+        return None
+
+
+def expire_checkout_sessions(session_ids, concurrency=4):
+    """
+    Завершает в Stripe открытые сессии Checkout в пуле из concurrency потоков.
+
+    Сессии, которые Stripe отказался завершить или которые не удалось завершить из-за недоступности Stripe,
+    пропускаются и обрабатываются при следующей сверке.
+
+    Аргументы:
+    - session_ids (Iterable[str]): Идентификаторы сессий.
+    - concurrency (int): Максимальное количество одновременных запросов.
+
+    Возвращает:
+    - dict: Завершенные сессии по идентификаторам; None, если сессию завершить не удалось.
+    """
+
+    session_ids = list(session_ids)
+
+    if not session_ids:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return dict(zip(session_ids, executor.map(_expire_or_none, session_ids)))
+
+
+def apply_payment_statuses(payments):
+    """
+    Сохраняет новые статусы платежей одним bulk_update.
+
+    Строки блокируются на время обновления, и платежи, которые за это время перешли в конечный статус (например,
+    по вебхуку), пропускаются. Оплаченным платежам проставляется время зачисления.
+
+    Аргументы:
+    - payments (list[Payment]): Платежи с измененным stripe_status.
+
+    Возвращает:
+    - list[Payment]: Обновленные платежи (без пропущенных).
+    """
+
+    if not payments:
+        return []
+
+    with transaction.atomic():
+        pending_ids = set(
+            Payment.objects.select_for_update().filter(PENDING_STATUS, pk__in=[payment.pk for payment in payments])
+            .values_list('pk', flat=True)
+        )
+        payments = [payment for payment in payments if payment.pk in pending_ids]
+        settled = [payment for payment in payments if payment.is_settled and payment.settled_at is None]
+
+        for payment in settled:
+            payment.settled_at = timezone.now()
+
+        Payment.objects.bulk_update(payments, ['stripe_status', 'settled_at'])
+
+        if settled:
+            schedule_rollup_update()
+
+    return payments
+
+
+def get_checkout_session_cache_key(user_id, course_id):
+    return f'lms:checkout-session:{user_id}:{course_id}'
+
+
+def get_open_checkout_session(user_id, course):
+    """
+    Возвращает открытую сессию Checkout пользователя для курса, если ее еще можно оплатить.
+
+    Сессия берется из кэша (запись живет до истечения сессии в Stripe) и используется, только если цена курса не
+    изменилась, а платеж по ней не перешел в конечный статус. Обращения к Stripe не выполняются.
+
+    Аргументы:
+    - user_id (int): Идентификатор пользователя.
+    - course (Course): Курс с загруженным stripe_price_id.
+
+    Возвращает:
+    - dict | None: Идентификатор ('id') и адрес ('url') сессии или None.
+    """
+
+    key = get_checkout_session_cache_key(user_id, course.pk)
+    session = cache.get(key)
+
+    if session is None or session['price_id'] != course.stripe_price_id:
+        return None
+
+    if not Payment.objects.filter(PENDING_STATUS, stripe_payment_id=session['id']).exists():
+        cache.delete(key)
+        return None
+
+    return session
+
+
+def remember_checkout_session(user_id, course, session):
+    """
+    Запоминает открытую сессию Checkout пользователя для курса до ее истечения в Stripe.
+
+    Аргументы:
+    - user_id (int): Идентификатор пользователя.
+    - course (Course): Курс с загруженным stripe_price_id.
+    - session (stripe.checkout.Session): Созданная сессия.
+    """
+
+    timeout = int(session.expires_at - time.time()) - OPEN_SESSION_EXPIRY_MARGIN
+
+    if timeout > 0:
+        cache.set(get_checkout_session_cache_key(user_id, course.pk),
+                  {'id': session.id, 'url': session.url, 'price_id': course.stripe_price_id}, timeout)
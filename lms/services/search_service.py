@@ -0,0 +1,167 @@
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db.models import F, Value
+from django.utils.html import escape
+
+from lms.models import Course, Lesson
+from users.services.role_service import is_moderator
+
+SEARCH_CONFIG = 'russian'
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MODELS = {'course': Course, 'lesson': Lesson}
+SEARCH_RANK_NORMALIZATION = 32
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_STOP = '\ue001'
+HEADLINE_OPTIONS = {
+    'start_sel': HIGHLIGHT_START,
+    'stop_sel': HIGHLIGHT_STOP,
+    'max_words': 35,
+    'min_words': 15,
+    'max_fragments': 2,
+}
+
+
+def get_search_vector():
+    """
+    Возвращает выражение поискового вектора курса или урока: название с весом A и описание с весом B.
+
+    Выражение совпадает с триггером lms_search_vector_update (см. lms.migrations.0012_search_vector).
+    """
+
+    return (SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG))
+
+
+def get_search_queryset(model, user):
+    """
+    Возвращает записи, в которых ищет пользователь: модераторы ищут по всем курсам и урокам, остальные
+    пользователи - по своим (как в CourseViewSet.get_queryset и LessonListCreateAPIView.get_queryset).
+    """
+
+    if is_moderator(user):
+        return model.objects.all()
+
+    return model.objects.filter(owner=user)
+
+
+def search_catalog(user, text, types=None, limit=SEARCH_LIMIT):
+    """
+    Ищет курсы и уроки по названию и описанию и возвращает результаты по убыванию релевантности.
+
+    Строка разбирается как запрос websearch_to_tsquery (поддерживаются кавычки, OR и исключение через '-') в
+    конфигурации russian, поэтому слова находятся в любой словоформе. Совпадения выбираются по индексам GIN
+    поискового вектора одним запросом UNION ALL по курсам и урокам с сортировкой по ts_rank, а фрагменты с
+    подсветкой (ts_headline) вычисляются отдельным запросом только для выданных записей.
+
+    Фрагменты возвращаются как HTML: текст экранируется, совпадения выделяются тегами <mark> (см. render_highlight).
+
+    Аргументы:
+    - user (CustomUser): Пользователь, результаты ограничиваются доступными ему записями.
+    - text (str): Строка поиска.
+    - types (Iterable[str], optional): Типы записей ('course', 'lesson'), по умолчанию все.
+    - limit (int): Количество результатов.
+
+    Возвращает:
+    - list[dict]: Результаты с полями type, id, title, rank, title_highlight, description_highlight и course (для
+      уроков).
+    """
+
+    types = list(types or SEARCH_MODELS)
+
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    ranked = [
+        get_search_queryset(SEARCH_MODELS[kind], user).filter(search_vector=query).annotate(
+            kind=Value(kind),
+            rank=SearchRank(F('search_vector'), query, normalization=Value(SEARCH_RANK_NORMALIZATION)),
+        ).values('id', 'kind', 'rank')
+        for kind in types
+    ]
+    matches = list(ranked[0].union(*ranked[1:], all=True).order_by('-rank', 'kind', 'id')[:limit])
+
+    documents = {}
+
+    for kind in types:
+        ids = [match['id'] for match in matches if match['kind'] == kind]
+
+        if not ids:
+            continue
+
+        rows = SEARCH_MODELS[kind].objects.filter(pk__in=ids).annotate(
+            title_highlight=SearchHeadline('title', query, config=SEARCH_CONFIG, highlight_all=True,
+                                           start_sel=HEADLINE_OPTIONS['start_sel'],
+                                           stop_sel=HEADLINE_OPTIONS['stop_sel']),
+            description_highlight=SearchHeadline('description', query, config=SEARCH_CONFIG, **HEADLINE_OPTIONS),
+        ).values(*get_result_fields(kind), 'title_highlight', 'description_highlight')
+
+        for row in rows:
+            documents[kind, row['id']] = row
+
+    return [get_result(match['kind'], documents[match['kind'], match['id']], match['rank']) for match in matches]
+
+
+def get_result_fields(kind):
+    return ('id', 'title', 'course_id') if kind == 'lesson' else ('id', 'title')
+
+
+def render_highlight(headline):
+    """
+    Превращает фрагмент ts_headline в безопасный HTML.
+
+    ts_headline не экранирует текст, поэтому совпадения размечаются символами из области частного использования
+    Unicode (HIGHLIGHT_START и HIGHLIGHT_STOP), фрагмент экранируется целиком, и только затем разметка заменяется
+    тегами <mark>.
+    """
+
+    return escape(headline).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+
+
+def get_result(kind, row, rank):
+    result = {
+        'type': kind,
+        'id': row['id'],
+        'title': row['title'],
+        'rank': rank,
+        'title_highlight': render_highlight(row['title_highlight']),
+        'description_highlight': render_highlight(row['description_highlight']),
+    }
+
+    if kind == 'lesson':
+        result['course'] = row['course_id']
+
+    return result
+
+
+def reindex_search_vectors(model, batch_size=1000, missing_only=False):
+    """
+    Заполняет поисковый вектор записей модели пачками по возрастанию id.
+
+    Каждая пачка обновляется отдельным запросом в своей транзакции, поэтому блокировки строк держатся недолго, а
+    прерванное заполнение можно продолжить с параметром missing_only.
+
+    Аргументы:
+    - model (Model): Course или Lesson.
+    - batch_size (int): Размер пачки.
+    - missing_only (bool): Обновлять только записи без поискового вектора.
+
+    Возвращает:
+    - Iterator[int]: Количество обновленных записей после каждой пачки.
+    """
+
+    queryset = model.objects.order_by('id')
+
+    if missing_only:
+        queryset = queryset.filter(search_vector__isnull=True)
+
+    last_id = 0
+    updated = 0
+
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+
+        if not ids:
+            return
+
+        updated += model.objects.filter(id__in=ids).update(search_vector=get_search_vector())
+        last_id = ids[-1]
+
+        yield updated
@@ -0,0 +1,160 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import transaction
+
+from lms.models import Course, Lesson, Subscription
+from users.models.payment_model import Payment
+from users.models.user_model import CustomUser
+from users.services.import_service import PaymentLoader
+from users.services.revenue_service import update_rollups
+from users.services.role_service import MODERATORS_GROUP
+
+SEED_EMAIL_DOMAIN = 'seed.example.com'
+SEED_PASSWORD = 'password'
+SEED_BASE_DATE = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+SEED_PERIOD_DAYS = 365
+SEED_BATCH_SIZE = 5000
+SEED_CITIES = ('Москва', 'Санкт-Петербург', 'Новосибирск', 'Екатеринбург', 'Казань', 'Нижний Новгород',
+               'Самара', 'Омск', 'Ростов-на-Дону', 'Уфа')
+SEED_STRIPE_STATUSES = ('paid', 'paid', 'paid', 'unpaid', 'expired', 'failed')
+
+
+def get_seed_users():
+    """
+    Возвращает пользователей, созданных генератором тестовых данных.
+    """
+
+    return CustomUser.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}')
+
+
+def bulk_create(model, objects, batch_size):
+    """
+    Вставляет объекты из итератора пачками, не загружая их в память целиком.
+
+    Возвращает:
+    - int: Количество вставленных объектов.
+    """
+
+    objects = iter(objects)
+    created = 0
+
+    while batch := list(islice(objects, batch_size)):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+
+    return created
+
+
+def flush_seed_data():
+    """
+    Удаляет тестовые данные: пользователей генератора вместе с их курсами, уроками, подписками и платежами.
+    """
+
+    users = get_seed_users()
+
+    with transaction.atomic():
+        Payment.objects.filter(user__in=users).delete()
+        Subscription.objects.filter(user__in=users).delete()
+        Lesson.objects.filter(course__owner__in=users).delete()
+        Course.objects.filter(owner__in=users).delete()
+        users.delete()
+
+
+def seed_data(users=1000, courses=50, lessons_per_course=10, subscriptions_per_user=3, payments=10000,
+              moderators=1, seed=0, batch_size=SEED_BATCH_SIZE):
+    """
+    Заполняет базу данных тестовыми данными заданного объема.
+
+    Данные детерминированы: при одинаковых параметрах и seed создаются одни и те же пользователи, курсы, уроки,
+    подписки и платежи с теми же датами и суммами. Пользователи получают адреса userN@seed.example.com и пароль
+    SEED_PASSWORD, первые moderators из них добавляются в группу модераторов. Строки вставляются пачками
+    (bulk_create, платежи - командой COPY через PaymentLoader), после чего обновляется сводка выручки.
+
+    Аргументы:
+    - users, courses, lessons_per_course, subscriptions_per_user, payments (int): Объем данных.
+    - moderators (int): Количество модераторов среди пользователей.
+    - seed (int): Начальное значение генератора случайных чисел.
+    - batch_size (int): Размер пачки вставки.
+
+    Возвращает:
+    - dict: Количество созданных объектов каждого вида и длительность.
+    """
+
+    started = time.monotonic()
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD, salt=f'seed{seed}')
+
+    def random_date():
+        return SEED_BASE_DATE - timedelta(seconds=rng.randrange(SEED_PERIOD_DAYS * 24 * 60 * 60))
+
+    bulk_create(CustomUser, (
+        CustomUser(email=f'user{number}@{SEED_EMAIL_DOMAIN}', password=password,
+                   first_name=f'User{number}', city=rng.choice(SEED_CITIES),
+                   phone=f'+79{rng.randrange(10 ** 9):09d}', date_joined=random_date())
+        for number in range(users)
+    ), batch_size)
+    user_ids = list(get_seed_users().order_by('pk').values_list('pk', flat=True))
+
+    group, _ = Group.objects.get_or_create(name=MODERATORS_GROUP)
+    group.user_set.add(*user_ids[:moderators])
+
+    bulk_create(Course, (
+        Course(title=f'Курс {number}', description=f'Описание курса {number}', owner_id=rng.choice(user_ids),
+               price=rng.randrange(10, 500) * 100, stripe_product_id=f'prod_seed_{number}',
+               stripe_price_id=f'price_seed_{number}')
+        for number in range(courses)
+    ), batch_size)
+    course_list = list(Course.objects.filter(owner__in=user_ids).order_by('pk').values('pk', 'owner_id', 'price'))
+    course_ids = [course['pk'] for course in course_list]
+
+    bulk_create(Lesson, (
+        Lesson(course_id=course['pk'], owner_id=course['owner_id'], title=f'Урок {number} курса {course["pk"]}',
+               description=f'Описание урока {number}', video_url=f'https://www.youtube.com/watch?v=seed{number}')
+        for course in course_list for number in range(lessons_per_course)
+    ), batch_size)
+
+    bulk_create(Subscription, (
+        Subscription(user_id=user_id, course_id=course_id)
+        for user_id in user_ids
+        for course_id in rng.sample(course_ids, min(subscriptions_per_user, len(course_ids)))
+    ), batch_size)
+
+    loader = PaymentLoader(batch_size=batch_size)
+
+    def payment_rows():
+        for number in range(payments):
+            course = rng.choice(course_list)
+            payment_date = random_date()
+
+            if rng.random() < 0.3:
+                method, session_id, stripe_status = 'CASH', None, None
+            else:
+                method, session_id, stripe_status = 'TRANSFER', f'cs_seed_{number}', rng.choice(SEED_STRIPE_STATUSES)
+
+            settled = method == 'CASH' or stripe_status in Payment.PAID_STATUSES
+
+            yield (rng.choice(user_ids), payment_date, course['pk'], None, Decimal(course['price']) / 100, method,
+                   session_id, stripe_status, payment_date if settled else None, False)
+
+    rows = payment_rows()
+
+    while batch := list(islice(rows, batch_size)):
+        with transaction.atomic():
+            loader.insert(batch)
+
+    update_rollups()
+
+    return {
+        'users': len(user_ids),
+        'courses': len(course_ids),
+        'lessons': Lesson.objects.filter(course__in=course_ids).count(),
+        'subscriptions': Subscription.objects.filter(user__in=user_ids).count(),
+        'payments': Payment.objects.filter(user__in=user_ids).count(),
+        'duration': time.monotonic() - started,
+    }
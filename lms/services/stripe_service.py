@@ -1,29 +1,300 @@
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+import requests
 import stripe
 
 from config import settings
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
+
 
-def create_product(name, description):
+class StripeUnavailableError(stripe.StripeError):
+    """
+    Stripe временно недоступен: автомат защиты разомкнут или исчерпаны повторные попытки.
+    """
+
+
+class CircuitBreaker:
+    """
+    Автомат защиты (circuit breaker) для обращений к внешнему сервису.
+
+    После failure_threshold подряд неудачных вызовов автомат размыкается, и следующие вызовы в течение
+    reset_timeout секунд сразу завершаются ошибкой, не занимая воркер ожиданием ответа. Затем пропускается один
+    пробный вызов: при успехе автомат замыкается, при ошибке снова размыкается.
+
+    Атрибуты:
+    - failure_threshold (int): Количество неудач подряд до размыкания.
+    - reset_timeout (float): Время в секундах до пробного вызова.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self):
+        """
+        Возвращает True, если вызов можно выполнить.
+        """
+
+        with self._lock:
+            state = self._state()
+
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_progress = False
+
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class TimeoutRequestsClient(stripe.RequestsClient):
+    """
+    HTTP-клиент Stripe на постоянной сессии requests с пулом соединений и таймаутом, задаваемым на вызов.
+    """
+
+    def __init__(self, timeout, pool_size, **kwargs):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self._local = threading.local()
+        super().__init__(timeout=timeout, session=session, **kwargs)
+
+    @property
+    def _timeout(self):
+        return getattr(self._local, 'timeout', None) or self._default_timeout
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self._default_timeout = value
+
+    def set_call_timeout(self, timeout):
+        self._local.timeout = timeout
+
+
+class StripeService:
+    """
+    Клиент Stripe с пулом соединений, таймаутами, ограниченными повторами и автоматом защиты.
+
+    Повторяются только временные ошибки (сетевые, 429 и 5xx) с экспоненциальной задержкой со случайным
+    разбросом. Создающим запросам назначается ключ идемпотентности, общий для всех попыток, поэтому повтор после
+    таймаута не создает дубликат объекта.
+
+    Атрибуты:
+    - client (stripe.StripeClient): Клиент Stripe.
+    - timeout (float): Таймаут вызова по умолчанию в секундах.
+    - max_retries (int): Максимальное количество повторов.
+    - backoff (float): Базовая задержка перед повтором в секундах.
+    - breaker (CircuitBreaker): Автомат защиты.
+    - request_count (int): Количество выполненных запросов к Stripe, включая повторы.
+    """
+
+    def __init__(self, api_key, api_base=None, timeout=10.0, max_retries=2, backoff=0.2, pool_size=10,
+                 breaker=None):
+        self.http_client = TimeoutRequestsClient(timeout=timeout, pool_size=pool_size)
+        self.client = stripe.StripeClient(
+            api_key,
+            base_addresses={'api': api_base} if api_base else {},
+            max_network_retries=0,
+            http_client=self.http_client,
+        )
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    @staticmethod
+    def is_retriable(error):
+        if isinstance(error, (stripe.APIConnectionError, stripe.RateLimitError)):
+            return True
+
+        return isinstance(error, stripe.APIError) and (error.http_status is None or error.http_status >= 500)
+
+    def call(self, method, params=None, idempotency_key=None, timeout=None):
+        """
+        Выполняет метод клиента Stripe с повторами и автоматом защиты.
+
+        Аргументы:
+        - method (Callable): Метод сервиса StripeClient, например self.client.products.create.
+        - params (dict): Параметры запроса.
+        - idempotency_key (str): Ключ идемпотентности, общий для всех попыток.
+        - timeout (float): Таймаут одной попытки в секундах.
+
+        Возвращает:
+        - stripe.StripeObject: Ответ Stripe.
+
+        Исключения:
+        - StripeUnavailableError: Автомат защиты разомкнут или временные ошибки продолжались после всех повторов.
+        - stripe.StripeError: Прочие ошибки Stripe (например, некорректный запрос) без повторов.
+        """
+
+        if not self.breaker.allow_request():
+            raise StripeUnavailableError('Stripe временно недоступен (автомат защиты разомкнут)')
+
+        options = {'idempotency_key': idempotency_key} if idempotency_key else {}
+        self.http_client.set_call_timeout(timeout or self.timeout)
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                with self._count_lock:
+                    self.request_count += 1
+
+                try:
+                    result = method(params or {}, options)
+                except stripe.StripeError as error:
+                    if not self.is_retriable(error):
+                        self.breaker.record_success()
+                        raise
+
+                    if attempt == self.max_retries:
+                        self.breaker.record_failure()
+                        raise StripeUnavailableError(f'Stripe недоступен: {error}') from error
+
+                    delay = random.uniform(0, self.backoff * 2 ** attempt)
+                    logger.warning('Ошибка Stripe (%s), повтор %s через %.2f с', error, attempt + 1, delay)
+                    time.sleep(delay)
+                except BaseException:
+                    # Любая другая ошибка (requests, ошибка в коде, прерывание) тоже завершает пробный вызов
+                    # полуоткрытого автомата, иначе он навсегда отклонял бы все последующие вызовы.
+                    self.breaker.record_failure()
+                    raise
+                else:
+                    self.breaker.record_success()
+                    return result
+        finally:
+            self.http_client.set_call_timeout(None)
+
+    def create_product(self, name, description, idempotency_key=None):
+        return self.call(self.client.products.create, {'name': name, 'description': description},
+                         idempotency_key=idempotency_key or str(uuid.uuid4()), timeout=30)
+
+    def create_price(self, product_id, unit_amount, currency='usd', idempotency_key=None):
+        return self.call(self.client.prices.create,
+                         {'product': product_id, 'unit_amount': unit_amount, 'currency': currency},
+                         idempotency_key=idempotency_key or str(uuid.uuid4()), timeout=30)
+
+    def create_checkout_session(self, price_id, success_url, cancel_url, idempotency_key=None):
+        params = {
+            'payment_method_types': ['card'],
+            'line_items': [{'price': price_id, 'quantity': 1}],
+            'mode': 'payment',
+            'success_url': success_url,
+            'cancel_url': cancel_url,
+        }
+
+        return self.call(self.client.checkout.sessions.create, params,
+                         idempotency_key=idempotency_key or str(uuid.uuid4()))
+
+    def retrieve_checkout_session(self, session_id):
+        return self.call(lambda params, options: self.client.checkout.sessions.retrieve(session_id, params, options))
+
+    def list_checkout_sessions(self, created_gte=None, created_lte=None, starting_after=None, limit=100):
+        params = {'limit': limit}
+        created = {key: value for key, value in (('gte', created_gte), ('lte', created_lte)) if value is not None}
+
+        if created:
+            params['created'] = created
+        if starting_after:
+            params['starting_after'] = starting_after
+
+        return self.call(self.client.checkout.sessions.list, params)
+
+    def expire_checkout_session(self, session_id):
+        return self.call(lambda params, options: self.client.checkout.sessions.expire(session_id, params, options),
+                         idempotency_key=f'expire-{session_id}')
+
+
+_service = None
+_service_pid = None
+_service_lock = threading.Lock()
+
+
+def get_stripe_service():
+    """
+    Возвращает клиент Stripe текущего процесса, создавая его при первом обращении (в том числе после fork).
+
+    Возвращает:
+    - StripeService: Клиент, настроенный параметрами STRIPE_* из settings.
+    """
+
+    global _service, _service_pid
+
+    if _service_pid != os.getpid():
+        with _service_lock:
+            if _service_pid != os.getpid():
+                _service = StripeService(
+                    settings.STRIPE_SECRET_KEY,
+                    api_base=settings.STRIPE_API_BASE,
+                    timeout=settings.STRIPE_TIMEOUT,
+                    max_retries=settings.STRIPE_MAX_RETRIES,
+                    pool_size=settings.STRIPE_POOL_SIZE,
+                    breaker=CircuitBreaker(settings.STRIPE_CIRCUIT_FAILURE_THRESHOLD,
+                                           settings.STRIPE_CIRCUIT_RESET_TIMEOUT),
+                )
+                _service_pid = os.getpid()
+
+    return _service
+
+
+def create_product(name, description, idempotency_key=None):
     """
     Создает новый продукт в Stripe.
 
     Аргументы:
     - name (str): Название продукта.
     - description (str): Описание продукта.
+    - idempotency_key (str): Ключ идемпотентности: повторный запрос с тем же ключом вернет тот же продукт.
 
     Возвращает:
     - stripe.Product: Объект созданного продукта.
     """
 
-    product = stripe.Product.create(
-        name=name,
-        description=description,
-    )
+    return get_stripe_service().create_product(name, description, idempotency_key=idempotency_key)
 
-    return product
 
-def create_price(product_id, unit_amount, currency="usd"):
+def create_price(product_id, unit_amount, currency="usd", idempotency_key=None):
     """
     Создает новую цену для продукта в Stripe.
 
@@ -31,20 +302,16 @@ def create_price(product_id, unit_amount, currency="usd"):
     - product_id (str): Идентификатор продукта.
     - unit_amount (int): Цена в минимальных единицах валюты (например, центы для USD).
     - currency (str): Код валюты (по умолчанию "usd").
+    - idempotency_key (str): Ключ идемпотентности: повторный запрос с тем же ключом вернет ту же цену.
 
     Возвращает:
     - stripe.Price: Объект созданной цены.
     """
 
-    price = stripe.Price.create(
-        product=product_id,
-        unit_amount=unit_amount,
-        currency=currency,
-    )
+    return get_stripe_service().create_price(product_id, unit_amount, currency, idempotency_key=idempotency_key)
 
-    return price
 
-def create_checkout_session(price_id, success_url, cancel_url):
+def create_checkout_session(price_id, success_url, cancel_url, idempotency_key=None):
     """
     Создает новую сессию Checkout в Stripe.
 
@@ -52,22 +319,56 @@ def create_checkout_session(price_id, success_url, cancel_url):
     - price_id (str): Идентификатор цены.
     - success_url (str): URL, на который будет перенаправлен пользователь при успешной оплате.
     - cancel_url (str): URL, на который будет перенаправлен пользователь при отмене оплаты.
+    - idempotency_key (str): Ключ идемпотентности: повторный запрос с тем же ключом вернет ту же сессию.
 
     Возвращает:
     - stripe.checkout.Session: Объект созданной сессии Checkout.
     """
 
-    session = stripe.checkout.Session.create(
-        payment_method_types=['card'],
-        line_items=[
-            {
-                'price': price_id,
-                'quantity': 1,
-            },
-        ],
-        mode='payment',
-        success_url=success_url,
-        cancel_url=cancel_url,
-    )
-
-    return session
\ No newline at end of file
+    return get_stripe_service().create_checkout_session(price_id, success_url, cancel_url,
+                                                        idempotency_key=idempotency_key)
+
+
+def retrieve_checkout_session(session_id):
+    """
+    Получает сессию Checkout из Stripe.
+
+    Аргументы:
+    - session_id (str): Идентификатор сессии.
+
+    Возвращает:
+    - stripe.checkout.Session: Объект сессии Checkout.
+    """
+
+    return get_stripe_service().retrieve_checkout_session(session_id)
+
+
+def list_checkout_sessions(created_gte=None, created_lte=None, starting_after=None, limit=100):
+    """
+    Получает страницу сессий Checkout из Stripe, отсортированных по убыванию времени создания.
+
+    Аргументы:
+    - created_gte (int): Нижняя граница времени создания (Unix time).
+    - created_lte (int): Верхняя граница времени создания (Unix time).
+    - starting_after (str): Идентификатор последней сессии предыдущей страницы.
+    - limit (int): Размер страницы (не более 100).
+
+    Возвращает:
+    - stripe.ListObject: Страница сессий (data, has_more).
+    """
+
+    return get_stripe_service().list_checkout_sessions(created_gte, created_lte, starting_after, limit)
+
+
+def expire_checkout_session(session_id):
+    """
+    Завершает в Stripe открытую сессию Checkout, после чего оплатить ее нельзя.
+
+    Аргументы:
+    - session_id (str): Идентификатор сессии.
+
+    Возвращает:
+    - stripe.checkout.Session: Объект сессии Checkout.
+    """
+
+    return get_stripe_service().expire_checkout_session(session_id)
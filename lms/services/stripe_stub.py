@@ -0,0 +1,234 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class StripeStubHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик запросов локальной заглушки Stripe API.
+
+    Поддерживаются запросы, которые выполняет проект: создание продуктов и цен, создание, получение и список
+    сессий Checkout. Соединения поддерживаются открытыми (HTTP/1.1 keep-alive), как у настоящего Stripe.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.handle_api_request('GET')
+
+    def do_POST(self):
+        self.handle_api_request('POST')
+
+    def handle_api_request(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        params = dict(parse_qsl(body if method == 'POST' else url.query, keep_blank_values=True))
+
+        status, data = self.server.dispatch(method, url.path, params, self.headers.get('Idempotency-Key'))
+        content = json.dumps(data).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Request-Id', f'req_{uuid.uuid4().hex[:14]}')
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class StripeStubServer(ThreadingHTTPServer):
+    """
+    Локальная заглушка Stripe API для тестов и нагрузочного тестирования клиента без доступа к сети.
+
+    Объекты хранятся в памяти процесса. Задержка и доля ошибок 500 настраиваются, что позволяет проверять таймауты,
+    повторы и автомат защиты клиента. Запросы с одинаковым Idempotency-Key возвращают сохраненный ответ.
+
+    Атрибуты:
+    - latency (float): Задержка ответа в секундах.
+    - failure_rate (float): Доля запросов, на которые возвращается ошибка 500 (от 0 до 1).
+    - request_count (int): Количество обработанных запросов.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, failure_rate=0.0, verbose=False):
+        super().__init__(address, StripeStubHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.verbose = verbose
+        self.request_count = 0
+        self.objects = {}
+        self.idempotent_responses = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Запускает сервер в фоновом потоке и возвращает его адрес для STRIPE_API_BASE.
+        """
+
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True, name='stripe-stub')
+        self._thread.start()
+
+        return self.url
+
+    def handle_error(self, request, client_address):
+        # Клиент закрыл соединение по таймауту, не дождавшись ответа.
+        pass
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def dispatch(self, method, path, params, idempotency_key=None):
+        """
+        Возвращает статус и тело ответа на запрос к API.
+        """
+
+        with self._lock:
+            self.request_count += 1
+
+            if idempotency_key and (method, idempotency_key) in self.idempotent_responses:
+                return self.idempotent_responses[method, idempotency_key]
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.failure_rate and random.random() < self.failure_rate:
+            return 500, self.error('api_error', 'Stub failure')
+
+        parts = path.strip('/').split('/')
+
+        with self._lock:
+            if method == 'POST' and parts == ['v1', 'products']:
+                response = 200, self.create_product(params)
+            elif method == 'POST' and parts == ['v1', 'prices']:
+                response = 200, self.create_price(params)
+            elif method == 'POST' and parts == ['v1', 'checkout', 'sessions']:
+                response = 200, self.create_checkout_session(params)
+            elif method == 'GET' and parts == ['v1', 'checkout', 'sessions']:
+                response = 200, self.list_checkout_sessions(params)
+            elif method == 'POST' and parts[:3] == ['v1', 'checkout', 'sessions'] and parts[4:] == ['expire']:
+                response = self.expire_checkout_session(parts[3])
+            elif method == 'GET' and parts[:3] == ['v1', 'checkout', 'sessions'] and len(parts) == 4:
+                session = self.objects.get(parts[3])
+                response = (200, session) if session else (404, self.error(
+                    'invalid_request_error', f"No such checkout.session: '{parts[3]}'"))
+            else:
+                response = 404, self.error('invalid_request_error', f'Unrecognized request URL ({method}: {path})')
+
+            if idempotency_key and response[0] == 200:
+                self.idempotent_responses[method, idempotency_key] = response
+
+        return response
+
+    @staticmethod
+    def error(error_type, message):
+        return {'error': {'type': error_type, 'message': message}}
+
+    def add(self, prefix, data):
+        data['id'] = f'{prefix}_{uuid.uuid4().hex[:24]}'
+        data['created'] = int(time.time())
+        self.objects[data['id']] = data
+
+        return data
+
+    def create_product(self, params):
+        return self.add('prod', {
+            'object': 'product',
+            'name': params.get('name'),
+            'description': params.get('description'),
+            'active': True,
+        })
+
+    def create_price(self, params):
+        return self.add('price', {
+            'object': 'price',
+            'product': params.get('product'),
+            'unit_amount': int(params.get('unit_amount', 0)),
+            'currency': params.get('currency', 'usd'),
+        })
+
+    def create_checkout_session(self, params):
+        price = self.objects.get(params.get('line_items[0][price]'), {})
+        session = self.add('cs_test', {
+            'object': 'checkout.session',
+            'mode': params.get('mode'),
+            'status': 'open',
+            'payment_status': 'unpaid',
+            'customer_email': params.get('customer_email'),
+            'amount_total': price.get('unit_amount'),
+            'currency': price.get('currency', 'usd'),
+            'success_url': params.get('success_url'),
+            'cancel_url': params.get('cancel_url'),
+        })
+        session['url'] = f'{self.url}/pay/{session["id"]}'
+        session['expires_at'] = session['created'] + 24 * 60 * 60
+
+        return session
+
+    def list_checkout_sessions(self, params):
+        sessions = sorted(
+            (obj for obj in self.objects.values() if obj['object'] == 'checkout.session'),
+            key=lambda obj: obj['created'], reverse=True,
+        )
+
+        if params.get('created[gte]'):
+            sessions = [session for session in sessions if session['created'] >= int(params['created[gte]'])]
+        if params.get('created[lte]'):
+            sessions = [session for session in sessions if session['created'] <= int(params['created[lte]'])]
+        if params.get('status'):
+            sessions = [session for session in sessions if session['status'] == params['status']]
+
+        if params.get('starting_after'):
+            ids = [session['id'] for session in sessions]
+            position = ids.index(params['starting_after']) + 1 if params['starting_after'] in ids else len(ids)
+            sessions = sessions[position:]
+
+        limit = int(params.get('limit', 10))
+
+        return {
+            'object': 'list',
+            'url': '/v1/checkout/sessions',
+            'data': sessions[:limit],
+            'has_more': len(sessions) > limit,
+        }
+
+    def expire_checkout_session(self, session_id):
+        session = self.objects.get(session_id)
+
+        if session is None:
+            return 404, self.error('invalid_request_error', f"No such checkout.session: '{session_id}'")
+        if session['status'] != 'open':
+            return 400, self.error('invalid_request_error',
+                                   'Only Checkout Sessions with a status of open can be expired.')
+
+        session['status'] = 'expired'
+
+        return 200, session
+
+    def complete_session(self, session_id, payment_status='paid', status='complete'):
+        """
+        Переводит сессию Checkout в заданное состояние, как если бы пользователь завершил оплату.
+        """
+
+        with self._lock:
+            session = self.objects[session_id]
+            session['status'] = status
+            session['payment_status'] = payment_status
+
+        return session
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from lms.models import Course, Lesson, Subscription
+from lms.services.cache_service import invalidate_representation, invalidate_subscriptions
+from lms.tasks import provision_stripe_price
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_representation(sender, instance, **kwargs):
+    """
+    Инвалидирует кэшированное представление курса после фиксации транзакции.
+    """
+
+    course_id = instance.pk
+    transaction.on_commit(lambda: invalidate_representation('course', course_id))
+
+
+@receiver(post_init, sender=Course)
+def remember_course_price(sender, instance, **kwargs):
+    """
+    Запоминает исходную цену курса, чтобы после сохранения определить, изменилась ли она.
+    """
+
+    instance._loaded_price = instance.__dict__.get('price')
+
+
+@receiver(post_save, sender=Course)
+def schedule_stripe_provisioning(sender, instance, created, **kwargs):
+    """
+    Ставит задачу создания продукта и цены в Stripe для нового курса или курса с измененной ценой.
+
+    Цены в Stripe неизменяемы, поэтому при изменении цены текущий stripe_price_id сбрасывается и создается новая
+    цена.
+    """
+
+    price_changed = instance._loaded_price is not None and instance._loaded_price != instance.price
+
+    if created or price_changed:
+        if price_changed and instance.stripe_price_id:
+            Course.objects.filter(pk=instance.pk).update(stripe_price_id=None)
+            instance.stripe_price_id = None
+
+        course_id = instance.pk
+        transaction.on_commit(lambda: provision_stripe_price.delay(course_id))
+
+    instance._loaded_price = instance.price
+
+
+@receiver(post_init, sender=Lesson)
+def remember_lesson_course(sender, instance, **kwargs):
+    """
+    Запоминает исходный курс урока, чтобы при переносе урока инвалидировать и прежний курс.
+    """
+
+    instance._loaded_course_id = instance.__dict__.get('course_id')
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_representation(sender, instance, **kwargs):
+    """
+    Инвалидирует кэшированное представление урока и курсов, в которые он входит (курс включает список уроков).
+    """
+
+    course_ids = {instance.course_id, getattr(instance, '_loaded_course_id', None)} - {None}
+    lesson_id = instance.pk
+
+    def invalidate():
+        invalidate_representation('lesson', lesson_id)
+        for course_id in course_ids:
+            invalidate_representation('course', course_id)
+
+    transaction.on_commit(invalidate)
+    instance._loaded_course_id = instance.course_id
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_user_subscriptions(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш подписок пользователя, из которого берется персональное поле is_subscribed.
+    """
+
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_subscriptions(user_id))
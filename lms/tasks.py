@@ -1,14 +1,34 @@
-from datetime import timedelta
+import logging
+import time
+from datetime import datetime, timedelta
 
 from celery import shared_task
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
 from django.utils import timezone
+from psycopg2.errors import LockNotAvailable
 
 from config import settings
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_CHUNK_SIZE = 500
+DEACTIVATION_BATCH_SIZE = 1000
+DEACTIVATION_TIME_BUDGET = 20 * 60
+DEACTIVATION_CHECKPOINT_KEY = 'lms:deactivate-inactive-users:checkpoint'
+DEACTIVATION_CHECKPOINT_GRACE = 10 * 60
+DEACTIVATION_LOCK_TIMEOUT = 2000
+DEACTIVATION_RETRY_DELAY = 60
+STRIPE_PROVISIONING_LOCK_TIMEOUT = 60
+RECONCILIATION_BATCH_SIZE = 100
+RECONCILIATION_CONCURRENCY = 4
+PAYMENT_ABANDON_AFTER = 24 * 60 * 60
+
 
 @shared_task
 def send_update_email(user_email, course_name):
@@ -33,38 +53,423 @@ def send_update_email(user_email, course_name):
     )
 
 
+@shared_task(bind=True)
+def notify_course_subscribers(self, course_id, course_name, chunk_size=NOTIFICATION_CHUNK_SIZE):
+    """
+    Рассылает подписчикам курса уведомление об обновлении, разбивая их на пачки.
+
+    Подписки перебираются по диапазонам id (keyset), из базы выбираются только адреса электронной почты. Для каждой
+    пачки ставится одна задача send_update_emails, поэтому в брокер попадает число сообщений, равное числу пачек, а
+    не числу подписчиков.
+
+    Параметры:
+    course_id (int): Идентификатор курса.
+    course_name (str): Название курса для текста письма.
+    chunk_size (int): Количество адресов в одной пачке.
+
+    Возвращает:
+    dict: Количество подписчиков, пачек и длительность постановки задач в секундах.
+    """
+
+    from lms.models import Subscription
+
+    started = time.monotonic()
+    last_id = 0
+    subscribers = 0
+    chunks = 0
+
+    while True:
+        rows = list(
+            Subscription.objects.filter(course_id=course_id, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'user__email')[:chunk_size]
+        )
+
+        if not rows:
+            break
+
+        last_id = rows[-1][0]
+        send_update_emails.delay([email for _, email in rows], course_name)
+        subscribers += len(rows)
+        chunks += 1
+
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta={'subscribers': subscribers, 'chunks': chunks})
+
+    duration = time.monotonic() - started
+    logger.info('Курс %s: %s подписчиков в %s пачках поставлены в очередь за %.2f с', course_id, subscribers,
+                chunks, duration)
+
+    return {'subscribers': subscribers, 'chunks': chunks, 'duration': duration}
+
+
+@shared_task
+def send_update_emails(user_emails, course_name):
+    """
+    Отправляет уведомление об обновлении курса пачке пользователей через одно SMTP-соединение.
+
+    Параметры:
+    user_emails (list[str]): Адреса электронной почты получателей.
+    course_name (str): Название курса, который был обновлен.
+
+    Возвращает:
+    dict: Количество отправленных писем и скорость отправки (писем в секунду).
+    """
+
+    return send_messages_batch(
+        f'Курс обновлен: {course_name}',
+        f'Уважаемый пользователь, курс "{course_name}" был обновлен. Проверьте новые материалы!',
+        user_emails,
+    )
+
+
+def send_messages_batch(subject, message, user_emails):
+    """
+    Отправляет одинаковое письмо каждому адресу из списка через одно SMTP-соединение.
+
+    Параметры:
+    subject (str): Тема письма.
+    message (str): Текст письма.
+    user_emails (list[str]): Адреса электронной почты получателей.
+
+    Возвращает:
+    dict: Количество отправленных писем и скорость отправки (писем в секунду).
+    """
+
+    started = time.monotonic()
+
+    with get_connection(fail_silently=False) as connection:
+        messages = [
+            EmailMessage(subject, message, settings.EMAIL_HOST_USER, [user_email], connection=connection)
+            for user_email in user_emails
+        ]
+        sent = connection.send_messages(messages) or 0
+
+    duration = time.monotonic() - started
+    rate = sent / duration if duration else float(sent)
+    logger.info('Отправлено %s писем "%s" (%.1f писем/с)', sent, subject, rate)
+
+    return {'sent': sent, 'rate': rate}
+
+
 @shared_task
-def deactivate_inactive_users():
+def send_deactivation_emails(user_emails):
+    """
+    Отправляет пачке пользователей уведомление о деактивации учетной записи через одно SMTP-соединение.
+
+    Параметры:
+    user_emails (list[str]): Адреса электронной почты деактивированных пользователей.
+    """
+
+    return send_messages_batch(
+        'Деактивация учетной записи',
+        'Уважаемый пользователь, Ваша учетная запись деактивирована! Для восстановления доступа свяжитесь с '
+        'администратором.',
+        user_emails,
+    )
+
+
+@shared_task(bind=True, max_retries=5)
+def deactivate_inactive_users(self, batch_size=DEACTIVATION_BATCH_SIZE, time_budget=DEACTIVATION_TIME_BUDGET):
     """
     Деактивирует неактивных пользователей, которые не входили в систему более 30 дней, и отправляет им письмо
     уведомление.
 
-    Функция выбирает всех пользователей, которые были активны, но последний раз
-    входили в систему более месяца назад, и деактивирует их, устанавливая
-    флаг is_active в False.
+    Пользователи обрабатываются пачками по возрастанию (last_login, id), поэтому выборка каждой пачки идет по
+    частичному индексу last_login активных пользователей. Каждая пачка деактивируется одним UPDATE в отдельной
+    транзакции, а после ее фиксации адреса передаются задаче send_deactivation_emails, которая отправляет письма
+    через одно SMTP-соединение.
 
-    Для каждого деактивированного пользователя отправляется письмо уведомление с указанием,
-    что их учетная запись была деактивирована, а также рекомендациями по восстановлению доступа.
+    Строки пачки блокируются с коротким lock_timeout (DEACTIVATION_LOCK_TIMEOUT). Если строка занята другой
+    транзакцией, пачка откатывается и задача повторяется позже с той же позиции, поэтому занятые пользователи не
+    пропускаются.
 
-    Заметки:
-    - Используется временной период в 30 дней для определения неактивности.
-    - Отправка почты осуществляется с использованием настроек электронной почты из settings.
+    После каждой пачки в кэше сохраняется контрольная точка (граница неактивности и ключ последнего обработанного
+    пользователя) со временем жизни запуска: прерванный запуск, его продолжение и повтор продолжают с места
+    остановки, а точка брошенного запуска истекает, и следующий запуск начинается заново с новой границей. Если
+    работа не укладывается в time_budget секунд, задача ставит в очередь свое продолжение, не упираясь в
+    CELERY_TASK_TIME_LIMIT.
+
+    Параметры:
+    batch_size (int): Количество пользователей в одной пачке.
+    time_budget (int): Время работы одного запуска в секундах до постановки продолжения.
 
-    Важно:
-    - Прежде чем применять эту функцию, убедитесь, что неактивных пользователей необходимо
-      деактивировать с точки зрения бизнес-логики вашего приложения.
+    Возвращает:
+    dict: Количество деактивированных пользователей, пачек, длительность и признак продолжения в новой задаче.
     """
 
-    one_month_ago = timezone.now() - timedelta(days=30)
-    inactive_users = User.objects.filter(last_login__lt=one_month_ago, is_active=True)
+    checkpoint_timeout = time_budget + DEACTIVATION_CHECKPOINT_GRACE
+    checkpoint = cache.get(DEACTIVATION_CHECKPOINT_KEY)
+
+    if checkpoint is None:
+        checkpoint = {'cutoff': (timezone.now() - timedelta(days=30)).isoformat(), 'last_login': None, 'last_id': 0}
+
+    cutoff = datetime.fromisoformat(checkpoint['cutoff'])
+    started = time.monotonic()
+    deactivated = 0
+    batches = 0
+
+    while True:
+        batch_started = time.monotonic()
+        users = User.objects.filter(is_active=True, last_login__lt=cutoff)
+
+        if checkpoint['last_login'] is not None:
+            last_login = datetime.fromisoformat(checkpoint['last_login'])
+            users = users.filter(Q(last_login__gt=last_login) | Q(last_login=last_login, id__gt=checkpoint['last_id']))
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL lock_timeout = %s', [f'{DEACTIVATION_LOCK_TIMEOUT}ms'])
+
+                rows = list(
+                    users.select_for_update().order_by('last_login', 'id')
+                    .values_list('id', 'email', 'last_login')[:batch_size]
+                )
+
+                if not rows:
+                    break
+
+                user_ids = [user_id for user_id, _, _ in rows]
+                emails = [email for _, email, _ in rows]
+                count = User.objects.filter(id__in=user_ids).update(is_active=False)
+                transaction.on_commit(lambda emails=emails: send_deactivation_emails.delay(emails))
+        except OperationalError as error:
+            if not isinstance(error.__cause__, LockNotAvailable):
+                raise
+
+            logger.warning('Пользователи заняты другой транзакцией, деактивация будет повторена')
+            cache.set(DEACTIVATION_CHECKPOINT_KEY, checkpoint, checkpoint_timeout)
+            raise self.retry(countdown=DEACTIVATION_RETRY_DELAY,
+                             kwargs={'batch_size': batch_size, 'time_budget': time_budget})
+
+        checkpoint['last_login'] = rows[-1][2].isoformat()
+        checkpoint['last_id'] = user_ids[-1]
+        cache.set(DEACTIVATION_CHECKPOINT_KEY, checkpoint, checkpoint_timeout)
+        deactivated += count
+        batches += 1
+        logger.info('Деактивировано %s пользователей (до id=%s) за %.2f с', count, checkpoint['last_id'],
+                    time.monotonic() - batch_started)
+
+        if time.monotonic() - started > time_budget:
+            self.apply_async(kwargs={'batch_size': batch_size, 'time_budget': time_budget})
+
+            return {'deactivated': deactivated, 'batches': batches, 'duration': time.monotonic() - started,
+                    'continued': True}
+
+    cache.delete(DEACTIVATION_CHECKPOINT_KEY)
+    duration = time.monotonic() - started
+    logger.info('Деактивация завершена: %s пользователей в %s пачках за %.2f с', deactivated, batches, duration)
+
+    return {'deactivated': deactivated, 'batches': batches, 'duration': duration, 'continued': False}
+
+
+@shared_task(bind=True, max_retries=10)
+def provision_stripe_price(self, course_id):
+    """
+    Создает в Stripe продукт и цену курса, если они еще не созданы.
 
-    for user in inactive_users:
-        user.is_active = False
-        send_mail(
-            f'Деактивация учетной записи',
-            f'Уважаемый пользователь, Ваша учетная запись деактивирована! Для восстановления доступа свяжитесь с администратором.',
-            settings.EMAIL_HOST_USER,
-            [user.email],
-            fail_silently=False,
+    Задача ставится при создании курса и при изменении его цены, поэтому оформление оплаты не обращается к Stripe
+    за продуктом и ценой. Одновременная обработка одного курса исключается блокировкой в кэше (cache.add), а
+    запросы к Stripe отправляются с ключами идемпотентности, поэтому дубликаты продуктов не создаются даже при
+    повторном выполнении задачи. Цена сохраняется только если цена курса не изменилась за время запроса.
+
+    Параметры:
+    course_id (int): Идентификатор курса.
+
+    Возвращает:
+    str | None: Идентификатор цены в Stripe или None, если курс не найден.
+    """
+
+    from lms.models import Course
+    from lms.services.cache_service import invalidate_representation
+    from lms.services.stripe_service import create_price, create_product
+
+    lock_key = f'lms:stripe-provisioning:{course_id}'
+
+    if not cache.add(lock_key, self.request.id or 'local', STRIPE_PROVISIONING_LOCK_TIMEOUT):
+        raise self.retry(countdown=5)
+
+    try:
+        course = Course.objects.filter(pk=course_id).first()
+
+        if course is None or course.stripe_price_id:
+            return course and course.stripe_price_id
+
+        if not course.stripe_product_id:
+            product = create_product(course.title, course.description, idempotency_key=f'course-{course.pk}-product')
+            course.stripe_product_id = product.id
+            Course.objects.filter(pk=course.pk).update(stripe_product_id=product.id)
+
+        price = create_price(course.stripe_product_id, course.price,
+                             idempotency_key=f'course-{course.pk}-price-{course.price}')
+        Course.objects.filter(pk=course.pk, price=course.price).update(stripe_price_id=price.id)
+        invalidate_representation('course', course.pk)
+        logger.info('Курс %s: в Stripe создана цена %s', course.pk, price.id)
+
+        return price.id
+    finally:
+        cache.delete(lock_key)
+
+
+@shared_task(bind=True, max_retries=5)
+def process_stripe_event(self, event_pk):
+    """
+    Применяет к платежу событие Stripe, полученное вебхуком.
+
+    Задача выполняется в отдельной очереди 'stripe', поэтому всплеск событий не задерживает прочие фоновые
+    задачи, а вебхук отвечает Stripe сразу после записи события в журнал. Повторное выполнение безопасно:
+    статус платежа меняется условным обновлением.
+
+    Параметры:
+    event_pk (int): Идентификатор записи StripeEvent.
+
+    Возвращает:
+    int: Количество обновленных платежей.
+    """
+
+    from lms.services.payment_service import apply_stripe_event
+    from users.models.stripe_event_model import StripeEvent
+
+    stripe_event = StripeEvent.objects.filter(pk=event_pk, processed_at__isnull=True).first()
+
+    if stripe_event is None:
+        return 0
+
+    try:
+        return apply_stripe_event(stripe_event)
+    except Exception as error:
+        raise self.retry(exc=error, countdown=2 ** self.request.retries)
+
+
+@shared_task
+def process_pending_stripe_events(older_than=60, limit=1000):
+    """
+    Применяет события Stripe, задачи обработки которых были потеряны (например, при перезапуске брокера).
+
+    Параметры:
+    older_than (int): Минимальный возраст необработанного события в секундах.
+    limit (int): Максимальное количество событий за запуск.
+
+    Возвращает:
+    int: Количество обработанных событий.
+    """
+
+    from lms.services.payment_service import apply_stripe_event
+    from users.models.stripe_event_model import StripeEvent
+
+    pending = StripeEvent.objects.filter(
+        processed_at__isnull=True, received_at__lte=timezone.now() - timedelta(seconds=older_than),
+    ).order_by('received_at')[:limit]
+    processed = 0
+
+    for stripe_event in pending:
+        apply_stripe_event(stripe_event)
+        processed += 1
+
+    if processed:
+        logger.info('Обработано отложенных событий Stripe: %s', processed)
+
+    return processed
+
+
+@shared_task
+def reconcile_pending_payments(batch_size=RECONCILIATION_BATCH_SIZE, concurrency=RECONCILIATION_CONCURRENCY,
+                               abandon_after=PAYMENT_ABANDON_AFTER):
+    """
+    Сверяет с Stripe статусы платежей, по которым не пришли события вебхука.
+
+    Платежи в неконечном статусе перебираются пачками по возрастанию id, их сессии запрашиваются из Stripe
+    списком за интервал создания (недостающие - по одной с ограниченным параллелизмом), а новые статусы
+    сохраняются одним bulk_update на пачку. Открытые сессии старше abandon_after завершаются в Stripe (в том же
+    пуле запросов), а платежи по ним и по сессиям, не найденным в Stripe, отмечаются как 'expired'. Сессии, которые
+    не удалось завершить, остаются до следующего запуска.
+
+    Параметры:
+    batch_size (int): Количество платежей в пачке.
+    concurrency (int): Максимальное количество одновременных запросов к Stripe.
+    abandon_after (int): Возраст платежа в секундах, после которого открытая сессия считается брошенной.
+
+    Возвращает:
+    dict: Метрики запуска - просмотрено платежей, обновлено, отмечено истекшими, запросов к Stripe, длительность.
+    """
+
+    from lms.services.payment_service import (PENDING_STATUS, apply_payment_statuses, expire_checkout_sessions,
+                                              fetch_checkout_sessions, get_session_payment_status)
+    from lms.services.stripe_service import get_stripe_service
+    from users.models.payment_model import Payment
+
+    started = time.monotonic()
+    service = get_stripe_service()
+    requests_before = service.request_count
+    abandon_before = timezone.now() - timedelta(seconds=abandon_after)
+    pending = Payment.objects.filter(PENDING_STATUS, stripe_payment_id__isnull=False).exclude(stripe_payment_id='')
+    metrics = {'scanned': 0, 'updated': 0, 'expired': 0}
+    last_id = 0
+
+    while True:
+        batch = list(pending.filter(pk__gt=last_id).order_by('pk')
+                     .only('id', 'payment_date', 'payment_method', 'stripe_payment_id', 'stripe_status',
+                           'settled_at')[:batch_size])
+
+        if not batch:
+            break
+
+        last_id = batch[-1].pk
+        metrics['scanned'] += len(batch)
+        sessions = fetch_checkout_sessions(batch, concurrency)
+        abandoned_sessions = [sessions.get(payment.stripe_payment_id) for payment in batch
+                              if payment.payment_date < abandon_before]
+        expired_sessions = expire_checkout_sessions(
+            [session.id for session in abandoned_sessions if session is not None and session.status == 'open'],
+            concurrency,
         )
-        user.save()
+        changed = []
+
+        for payment in batch:
+            session = sessions.get(payment.stripe_payment_id)
+            abandoned = payment.payment_date < abandon_before
+
+            if session is None:
+                payment_status = 'expired' if abandoned else payment.stripe_status
+            elif session.status == 'open' and abandoned:
+                if expired_sessions.get(session.id) is None:
+                    continue
+
+                payment_status = get_session_payment_status(expired_sessions[session.id])
+            else:
+                payment_status = get_session_payment_status(session)
+
+            if payment_status != payment.stripe_status:
+                payment.stripe_status = payment_status
+                changed.append(payment)
+
+        applied = apply_payment_statuses(changed)
+        metrics['updated'] += len(applied)
+        metrics['expired'] += sum(payment.stripe_status == 'expired' for payment in applied)
+
+    metrics['api_calls'] = service.request_count - requests_before
+    metrics['duration'] = time.monotonic() - started
+    logger.info('Сверка платежей Stripe: просмотрено %(scanned)s, обновлено %(updated)s, истекло %(expired)s, '
+                'запросов к Stripe %(api_calls)s за %(duration).2f с', metrics)
+
+    return metrics
+
+
+@shared_task
+def update_revenue_rollups(batch_size=1000):
+    """
+    Учитывает в сводке выручки зачисленные, но еще не учтенные платежи.
+
+    Ставится при зачислении платежей и периодически как страховка, если постановка была потеряна.
+
+    Параметры:
+    batch_size (int): Количество платежей в пачке.
+
+    Возвращает:
+    dict: Метрики запуска (см. users.services.revenue_service.update_rollups).
+    """
+
+    from users.services.revenue_service import update_rollups
+
+    return update_rollups(batch_size)
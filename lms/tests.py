@@ -1,9 +1,41 @@
+import hashlib
+import hmac
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+from celery.exceptions import Retry
 from django.contrib.auth.models import Group
+from django.contrib.postgres.search import SearchQuery
+from django.core import mail
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
-from lms.models import Course, Lesson
+from config.celery import record_task_published
+from config.metrics import METRICS_INDEX_KEY, collect, registry
+from lms.models import Course, Lesson, Subscription
+from lms.services import cache_service, payment_service
+from lms.services.cache_service import get_subscribed_course_ids, local_cache
+from lms.services.search_service import SEARCH_CONFIG, SEARCH_MODELS
+from lms.services.stripe_service import CircuitBreaker, StripeService, StripeUnavailableError
+from lms.services.stripe_stub import StripeStubServer
+from lms.tasks import (DEACTIVATION_CHECKPOINT_GRACE, DEACTIVATION_CHECKPOINT_KEY, deactivate_inactive_users,
+                       notify_course_subscribers, process_stripe_event, provision_stripe_price,
+                       reconcile_pending_payments, send_deactivation_emails, send_update_email, send_update_emails)
+from users.models.payment_model import Payment
+from users.models.stripe_event_model import StripeEvent
 from users.models.user_model import CustomUser
+from users.services.search_service import search_users
 
 
 class CourseViewSetTest(APITestCase):
@@ -16,6 +48,8 @@ class CourseViewSetTest(APITestCase):
         Настройка тестовой среды, создание пользователей, групп, курса и урока.
         """
 
+        cache.clear()
+        local_cache.clear()
         self.client = APIClient()
 
         self.user = CustomUser.objects.create_user(email='testuser@test.ts', password='password')
@@ -24,7 +58,8 @@ class CourseViewSetTest(APITestCase):
         self.moderators_group = Group.objects.create(name='Модераторы')
         self.moderators_group.user_set.add(self.moderator)
 
-        self.course = Course.objects.create(title='Test Course', description='Test Description', owner=self.user)
+        self.course = Course.objects.create(title='Test Course', description='Test Description', owner=self.user,
+                                            price=1000)
 
         self.lesson = Lesson.objects.create(title='Test Lesson', description='Lesson Content', course=self.course,
                                             video_url='http://youtube.com/eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9',
@@ -124,3 +159,1605 @@ class CourseViewSetTest(APITestCase):
         response = self.client.get(f'/api/courses/{self.course.id}/')
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Базовый класс тестов, проверяющих, что эндпоинты укладываются в заявленное число SQL-запросов.
+
+    Атрибуты:
+        query_budgets (dict): Максимальное число запросов для каждого эндпоинта, ключ - имя бюджета.
+    """
+
+    query_budgets = {}
+
+    def assertWithinQueryBudget(self, name, func, *args, **kwargs):
+        """
+        Выполняет func и проверяет, что число выполненных запросов не превышает бюджет name.
+
+        Возвращаемое значение:
+            Результат вызова func.
+        """
+
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+
+        budget = self.query_budgets[name]
+        executed = len(context.captured_queries)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(executed, budget, f'{name}: {executed} запросов при бюджете {budget}\n{queries}')
+
+        return result
+
+
+class CourseLessonQueryBudgetTest(QueryBudgetTestCase):
+    """
+    Набор тестов, фиксирующих число запросов эндпоинтов курсов и уроков.
+    """
+
+    query_budgets = {
+        'course-list': 4,
+        'course-detail': 5,
+        'course-detail-cached': 1,
+        'lesson-list': 3,
+        'lesson-detail': 1,
+    }
+
+    def setUp(self):
+        """
+        Создание модератора, владельца, нескольких курсов с уроками и подписками.
+        """
+
+        cache.clear()
+        local_cache.clear()
+
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.moderator = CustomUser.objects.create_user(email='moderator@test.ts', password='password')
+        Group.objects.create(name='Модераторы').user_set.add(self.moderator)
+
+        self.create_courses(5)
+
+    def create_courses(self, count):
+        """
+        Создает count курсов с тремя уроками и подпиской владельца на каждый.
+        """
+
+        for index in range(count):
+            course = Course.objects.create(title=f'Course {index}', description='Description', owner=self.owner,
+                                           price=1000)
+            Lesson.objects.bulk_create(
+                Lesson(title=f'Lesson {number}', description='Content', course=course, owner=self.owner,
+                       video_url='http://youtube.com/video.mp4')
+                for number in range(3)
+            )
+            Subscription.objects.create(user=self.owner, course=course)
+
+    def test_course_list_query_count_is_constant(self):
+        """
+        Тест того, что число запросов списка курсов не зависит от количества курсов на странице.
+        """
+
+        self.client.force_authenticate(user=self.owner)
+        response = self.assertWithinQueryBudget('course-list', self.client.get, '/api/courses/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['lesson_count'], 3)
+        self.assertTrue(response.data['results'][0]['is_subscribed'])
+
+        self.create_courses(5)
+        response = self.assertWithinQueryBudget('course-list', self.client.get, '/api/courses/?expand=lessons')
+
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(len(response.data['results'][0]['lessons']), 3)
+
+    def test_course_list_for_moderator(self):
+        """
+        Тест списка курсов для модератора: подписки модератора не учитываются чужими аннотациями.
+        """
+
+        self.client.force_authenticate(user=self.moderator)
+        response = self.assertWithinQueryBudget('course-list', self.client.get, '/api/courses/')
+
+        self.assertEqual(response.data['count'], 5)
+        self.assertFalse(any(course['is_subscribed'] for course in response.data['results']))
+
+    def test_course_detail_query_budget(self):
+        """
+        Тест числа запросов при получении курса модератором.
+        """
+
+        course = Course.objects.first()
+        self.client.force_authenticate(user=self.moderator)
+        response = self.assertWithinQueryBudget('course-detail', self.client.get, f'/api/courses/{course.id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['lessons']), 3)
+
+        response = self.assertWithinQueryBudget('course-detail-cached', self.client.get,
+                                                f'/api/courses/{course.id}/')
+
+        self.assertEqual(response.data['lesson_count'], 3)
+
+    def test_lesson_list_query_budget(self):
+        """
+        Тест числа запросов при получении списка уроков модератором.
+        """
+
+        self.client.force_authenticate(user=self.moderator)
+        response = self.assertWithinQueryBudget('lesson-list', self.client.get, '/api/lessons/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_lesson_detail_query_budget(self):
+        """
+        Тест числа запросов при получении урока владельцем.
+        """
+
+        lesson = Lesson.objects.first()
+        self.client.force_authenticate(user=self.owner)
+        response = self.assertWithinQueryBudget('lesson-detail', self.client.get, f'/api/lessons/{lesson.id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class KeysetPaginationTest(APITestCase):
+    """
+    Набор тестов курсорной пагинации курсов и уроков.
+    """
+
+    def setUp(self):
+        """
+        Создание модератора и набора курсов с уроками.
+        """
+
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        Group.objects.create(name='Модераторы').user_set.add(self.owner)
+        self.client.force_authenticate(user=self.owner)
+
+        for index in range(7):
+            course = Course.objects.create(title=f'Course {index}', description='Description', owner=self.owner,
+                                           price=1000)
+            Lesson.objects.create(title=f'Lesson {index}', description='Content', course=course, owner=self.owner,
+                                  video_url='http://youtube.com/video.mp4')
+
+    def collect(self, url):
+        """
+        Проходит все страницы, начиная с url, и возвращает идентификаторы объектов.
+        """
+
+        ids = []
+
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        return ids
+
+    def test_courses_cursor_walk(self):
+        """
+        Тест обхода курсов по курсору: все курсы выдаются ровно один раз в порядке (updated_at, id) по убыванию.
+        """
+
+        ids = self.collect('/api/courses/?pagination=cursor&page_size=3')
+        expected = list(Course.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+
+        self.assertEqual(ids, expected)
+
+    def test_cursor_is_stable_under_inserts(self):
+        """
+        Тест того, что вставка новой строки не сдвигает следующую страницу.
+        """
+
+        first = self.client.get('/api/lessons/?pagination=cursor&page_size=3')
+        Lesson.objects.create(title='New', description='Content', course=Course.objects.first(), owner=self.owner,
+                              video_url='http://youtube.com/video.mp4')
+        second = self.client.get(first.data['next'])
+
+        first_ids = [item['id'] for item in first.data['results']]
+        second_ids = [item['id'] for item in second.data['results']]
+
+        self.assertTrue(set(first_ids).isdisjoint(second_ids))
+        self.assertEqual(second_ids, sorted(second_ids, reverse=True))
+        self.assertLess(max(second_ids), min(first_ids))
+
+    def test_previous_link(self):
+        """
+        Тест возврата на предыдущую страницу по ссылке previous.
+        """
+
+        first = self.client.get('/api/lessons/?pagination=cursor&page_size=3')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_count_is_optional(self):
+        """
+        Тест того, что количество возвращается только по запросу.
+        """
+
+        response = self.client.get('/api/lessons/?pagination=cursor')
+        self.assertNotIn('count', response.data)
+
+        response = self.client.get('/api/lessons/?pagination=cursor&count=exact')
+        self.assertEqual(response.data['count'], 7)
+
+        response = self.client.get('/api/lessons/?pagination=cursor&count=approx')
+        self.assertIsInstance(response.data['count'], int)
+        self.assertGreaterEqual(response.data['count'], 0)
+
+    def test_invalid_cursor(self):
+        """
+        Тест ответа 404 на некорректный курсор.
+        """
+
+        response = self.client.get('/api/lessons/?cursor=broken')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RepresentationCacheTest(APITestCase):
+    """
+    Набор тестов кэша сериализованных представлений курсов и уроков.
+    """
+
+    def setUp(self):
+        """
+        Очистка кэшей, создание владельца, модератора и курса с уроком.
+        """
+
+        cache.clear()
+        local_cache.clear()
+
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.moderator = CustomUser.objects.create_user(email='moderator@test.ts', password='password')
+        Group.objects.create(name='Модераторы').user_set.add(self.moderator)
+
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.owner, price=1000)
+        self.lesson = Lesson.objects.create(title='Lesson', description='Content', course=self.course,
+                                            owner=self.owner, video_url='http://youtube.com/video.mp4')
+
+    def test_is_subscribed_is_overlaid_per_user(self):
+        """
+        Тест того, что общее кэшированное тело курса дополняется подпиской конкретного пользователя.
+        """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(user=self.owner, course=self.course)
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertTrue(self.client.get(f'/api/courses/{self.course.id}/').data['is_subscribed'])
+
+        self.client.force_authenticate(user=self.moderator)
+        self.assertFalse(self.client.get(f'/api/courses/{self.course.id}/').data['is_subscribed'])
+
+    def test_lesson_change_invalidates_course(self):
+        """
+        Тест того, что изменение урока инвалидирует представления урока и его курса.
+        """
+
+        self.client.force_authenticate(user=self.owner)
+        self.client.get(f'/api/courses/{self.course.id}/')
+        self.client.get(f'/api/lessons/{self.lesson.id}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = 'Renamed'
+            self.lesson.save()
+
+        course = self.client.get(f'/api/courses/{self.course.id}/').data
+        lesson = self.client.get(f'/api/lessons/{self.lesson.id}/').data
+
+        self.assertEqual(course['lessons'][0]['title'], 'Renamed')
+        self.assertEqual(lesson['title'], 'Renamed')
+
+    def test_subscription_change_invalidates_overlay(self):
+        """
+        Тест того, что подписка и отписка сразу отражаются в поле is_subscribed.
+        """
+
+        self.client.force_authenticate(user=self.owner)
+        self.assertFalse(self.client.get(f'/api/courses/{self.course.id}/').data['is_subscribed'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/subscribe/', {'course_id': self.course.id}, format='json')
+
+        self.assertTrue(self.client.get(f'/api/courses/{self.course.id}/').data['is_subscribed'])
+
+    def test_invalidation_publisher_is_reused(self):
+        """
+        Тест того, что рассылка инвалидаций использует один клиент Redis на процесс.
+        """
+
+        with (mock.patch.object(cache_service, '_get_redis_url', return_value='redis://localhost:6379/0'),
+              mock.patch.object(cache_service, '_publisher_pid', None),
+              mock.patch('redis.Redis.from_url') as from_url):
+            cache_service.invalidate_representation('course', self.course.pk)
+            cache_service.invalidate_representation('lesson', self.lesson.pk)
+
+        from_url.assert_called_once_with('redis://localhost:6379/0')
+        self.assertEqual(from_url.return_value.publish.call_count, 2)
+
+
+class ConditionalRequestTest(APITestCase):
+    """
+    Набор тестов условных запросов (ETag / Last-Modified / If-Match) для курсов и уроков.
+    """
+
+    def setUp(self):
+        """
+        Очистка кэшей, создание владельца и курса с уроком.
+        """
+
+        cache.clear()
+        local_cache.clear()
+
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.owner, price=1000)
+        self.lesson = Lesson.objects.create(title='Lesson', description='Content', course=self.course,
+                                            owner=self.owner, video_url='http://youtube.com/video.mp4')
+        self.client.force_authenticate(user=self.owner)
+
+    def test_course_not_modified(self):
+        """
+        Тест ответа 304 на повторный запрос курса с актуальным ETag и его изменения после правки урока.
+        """
+
+        url = f'/api/courses/{self.course.id}/'
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.lesson.title = 'Renamed'
+        self.lesson.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_lesson_not_modified(self):
+        """
+        Тест ответа 304 на повторный запрос урока с актуальным ETag.
+        """
+
+        url = f'/api/lessons/{self.lesson.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_match_on_update(self):
+        """
+        Тест оптимистичной блокировки: изменение с устаревшим If-Match отклоняется с кодом 412.
+        """
+
+        url = f'/api/lessons/{self.lesson.id}/'
+        etag = self.client.get(url)['ETag']
+
+        data = {'title': 'First', 'video_url': 'http://youtube.com/video.mp4'}
+        response = self.client.patch(url, data, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        data = {'title': 'Second', 'video_url': 'http://youtube.com/video.mp4'}
+        response = self.client.patch(url, data, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.title, 'First')
+
+
+class SparseFieldsetTest(APITestCase):
+    """
+    Набор тестов выбора полей (?fields=) и раскрытия уроков (?expand=lessons) в списке курсов.
+    """
+
+    def setUp(self):
+        """
+        Создание владельца и курса с несколькими уроками.
+        """
+
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.course = Course.objects.create(title='Course', description='Long description', owner=self.owner,
+                                            price=1000)
+        Lesson.objects.bulk_create(
+            Lesson(title=f'Lesson {number}', description='Content', course=self.course, owner=self.owner,
+                   video_url='http://youtube.com/video.mp4')
+            for number in range(5)
+        )
+        self.client.force_authenticate(user=self.owner)
+
+    def test_lessons_are_not_embedded_by_default(self):
+        """
+        Тест того, что по умолчанию список курсов не содержит уроков и не загружает их.
+        """
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/courses/')
+
+        self.assertNotIn('lessons', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['lesson_count'], 5)
+        self.assertFalse(any('lms_lesson"."title' in query['sql'] for query in context.captured_queries))
+
+    def test_expand_lessons_with_limit(self):
+        """
+        Тест раскрытия уроков с ограничением их числа на курс.
+        """
+
+        response = self.client.get('/api/courses/?expand=lessons&lessons_limit=2')
+        course = response.data['results'][0]
+
+        self.assertEqual(len(course['lessons']), 2)
+        self.assertEqual(course['lesson_count'], 5)
+
+    def test_fields_are_not_loaded(self):
+        """
+        Тест того, что не запрошенные поля не выбираются из базы данных.
+        """
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/courses/?fields=id,title')
+
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertFalse(any('"description"' in query['sql'] for query in context.captured_queries))
+
+    def test_unknown_field(self):
+        """
+        Тест ответа 400 на неизвестное поле.
+        """
+
+        response = self.client.get('/api/courses/?fields=id,unknown')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_detail_fields(self):
+        """
+        Тест того, что получение курса проверяет fields так же, как список, и всегда возвращает id.
+        """
+
+        response = self.client.get(f'/api/courses/{self.course.pk}/', {'fields': 'title,is_subscribed'})
+
+        self.assertEqual(response.data, {'id': self.course.pk, 'title': 'Course', 'is_subscribed': False})
+        self.assertEqual(self.client.get(f'/api/courses/{self.course.pk}/', {'fields': 'unknown'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(self.client.get('/api/courses/', {'fields': 'title'}).data['results'][0]),
+                         {'id', 'title'})
+
+
+class SubscriberNotificationTest(APITestCase):
+    """
+    Набор тестов рассылки уведомлений подписчикам курса пачками.
+    """
+
+    def setUp(self):
+        """
+        Создание курса и семи подписчиков.
+        """
+
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.owner, price=1000)
+
+        for index in range(7):
+            user = CustomUser.objects.create_user(email=f'user{index}@test.ts', password='password')
+            Subscription.objects.create(user=user, course=self.course)
+
+    def test_fan_out_in_chunks(self):
+        """
+        Тест того, что подписчики разбиваются на пачки и каждый получает письмо ровно один раз.
+        """
+
+        with mock.patch.object(send_update_emails, 'delay') as delay:
+            result = notify_course_subscribers(self.course.id, 'Course', chunk_size=3)
+
+        chunks = [call.args[0] for call in delay.call_args_list]
+
+        self.assertEqual(result['subscribers'], 7)
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual(sorted(sum(chunks, [])), sorted(f'user{index}@test.ts' for index in range(7)))
+
+    def test_send_chunk(self):
+        """
+        Тест отправки пачки писем.
+        """
+
+        result = send_update_emails(['a@test.ts', 'b@test.ts'], 'Course')
+
+        self.assertEqual(result['sent'], 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_course_update_enqueues_single_task(self):
+        """
+        Тест того, что изменение курса ставит одну задачу рассылки после фиксации транзакции.
+        """
+
+        self.client.force_authenticate(user=self.owner)
+
+        with mock.patch.object(notify_course_subscribers, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(f'/api/courses/{self.course.id}/', {'title': 'Updated'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        delay.assert_called_once_with(self.course.id, 'Course')
+
+
+class DeactivateInactiveUsersTest(APITestCase):
+    """
+    Набор тестов пакетной деактивации неактивных пользователей.
+    """
+
+    def setUp(self):
+        """
+        Создание пяти давно не входивших пользователей и одного активного.
+        """
+
+        cache.clear()
+        old_login = timezone.now() - timezone.timedelta(days=60)
+        self.stale_users = [
+            CustomUser.objects.create_user(email=f'stale{index}@test.ts', password='password', last_login=old_login)
+            for index in range(5)
+        ]
+        self.recent_user = CustomUser.objects.create_user(email='recent@test.ts', password='password',
+                                                          last_login=timezone.now())
+
+    def test_deactivates_in_batches(self):
+        """
+        Тест деактивации пачками и передачи адресов задаче рассылки после фиксации каждой пачки.
+        """
+
+        with mock.patch.object(send_deactivation_emails, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = deactivate_inactive_users(batch_size=2)
+
+        self.assertEqual(result['deactivated'], 5)
+        self.assertEqual(result['batches'], 3)
+        self.assertEqual(CustomUser.objects.filter(is_active=False).count(), 5)
+        self.assertTrue(CustomUser.objects.get(pk=self.recent_user.pk).is_active)
+        self.assertEqual(sum(len(call.args[0]) for call in delay.call_args_list), 5)
+        self.assertIsNone(cache.get(DEACTIVATION_CHECKPOINT_KEY))
+
+    def test_resumes_from_checkpoint(self):
+        """
+        Тест продолжения прерванного запуска с сохраненной контрольной точки.
+        """
+
+        checkpoint = {
+            'cutoff': (timezone.now() - timezone.timedelta(days=30)).isoformat(),
+            'last_login': self.stale_users[2].last_login.isoformat(),
+            'last_id': self.stale_users[2].pk,
+        }
+        cache.set(DEACTIVATION_CHECKPOINT_KEY, checkpoint, 60)
+
+        with mock.patch.object(send_deactivation_emails, 'delay'):
+            result = deactivate_inactive_users(batch_size=10)
+
+        self.assertEqual(result['deactivated'], 2)
+        self.assertEqual(set(CustomUser.objects.filter(is_active=False).values_list('pk', flat=True)),
+                         {user.pk for user in self.stale_users[3:]})
+
+    def test_checkpoint_expires(self):
+        """
+        Тест того, что контрольная точка хранится ограниченное время.
+        """
+
+        with mock.patch.object(send_deactivation_emails, 'delay'), \
+                mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            deactivate_inactive_users(batch_size=2, time_budget=60)
+
+        self.assertTrue(cache_set.call_args_list)
+        self.assertTrue(all(call.args[2] == 60 + DEACTIVATION_CHECKPOINT_GRACE for call in cache_set.call_args_list))
+
+    def test_send_deactivation_emails(self):
+        """
+        Тест отправки уведомлений о деактивации пачкой.
+        """
+
+        send_deactivation_emails(['a@test.ts', 'b@test.ts'])
+
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class DeactivateLockedUsersTest(TransactionTestCase):
+    """
+    Тест деактивации пользователей, строки которых заблокированы другой транзакцией.
+    """
+
+    def test_locked_users_are_retried(self):
+        """
+        Тест того, что пачка с занятой строкой откатывается и повторяется с той же позиции, а не пропускается.
+        """
+
+        cache.clear()
+        old_login = timezone.now() - timezone.timedelta(days=60)
+        users = [
+            CustomUser.objects.create_user(email=f'stale{index}@test.ts', password='password',
+                                           last_login=old_login + timezone.timedelta(minutes=index))
+            for index in range(4)
+        ]
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with transaction.atomic():
+                CustomUser.objects.select_for_update().get(pk=users[2].pk)
+                locked.set()
+                release.wait(10)
+
+            connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked.wait(10)
+
+        try:
+            with mock.patch.object(send_deactivation_emails, 'delay'), \
+                    mock.patch('lms.tasks.DEACTIVATION_LOCK_TIMEOUT', 100), \
+                    mock.patch.object(deactivate_inactive_users, 'retry', return_value=Retry()) as retry:
+                with self.assertRaises(Retry):
+                    deactivate_inactive_users(batch_size=2)
+        finally:
+            release.set()
+            thread.join()
+
+        retry.assert_called_once()
+        self.assertEqual(cache.get(DEACTIVATION_CHECKPOINT_KEY)['last_id'], users[1].pk)
+        self.assertEqual(set(CustomUser.objects.filter(is_active=False).values_list('pk', flat=True)),
+                         {users[0].pk, users[1].pk})
+
+        with mock.patch.object(send_deactivation_emails, 'delay'):
+            result = deactivate_inactive_users(batch_size=2)
+
+        self.assertEqual(result['deactivated'], 2)
+        self.assertFalse(CustomUser.objects.filter(is_active=True).exists())
+
+
+class SubscriptionToggleTest(APITestCase):
+    """
+    Набор тестов атомарного переключения подписки и массовой подписки.
+    """
+
+    def setUp(self):
+        """
+        Создание владельца, курса и группы пользователей.
+        """
+
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.owner, price=1000)
+        self.users = [CustomUser.objects.create_user(email=f'user{index}@test.ts', password='password')
+                      for index in range(5)]
+
+    def test_toggle(self):
+        """
+        Тест переключения подписки туда и обратно.
+        """
+
+        self.assertTrue(Subscription.objects.toggle(self.owner.pk, self.course.pk))
+        self.assertTrue(Subscription.objects.filter(user=self.owner, course=self.course).exists())
+
+        self.assertFalse(Subscription.objects.toggle(self.owner.pk, self.course.pk))
+        self.assertFalse(Subscription.objects.filter(user=self.owner, course=self.course).exists())
+
+        self.assertIsNone(Subscription.objects.toggle(self.owner.pk, self.course.pk + 100))
+
+    def test_subscribe_unknown_course(self):
+        """
+        Тест ответа 404 при подписке на несуществующий курс.
+        """
+
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.post('/api/subscribe/', {'course_id': self.course.pk + 100}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_enroll(self):
+        """
+        Тест массовой подписки: существующие подписки и неизвестные пользователи пропускаются.
+        """
+
+        Subscription.objects.create(user=self.users[0], course=self.course)
+        self.client.force_authenticate(user=self.owner)
+        self.assertEqual(get_subscribed_course_ids(self.users[1]), frozenset())
+
+        with (mock.patch.object(cache, 'delete_many', wraps=cache.delete_many) as delete_many,
+              self.captureOnCommitCallbacks(execute=True)):
+            response = self.client.post(f'/api/courses/{self.course.id}/enroll/', {
+                'user_ids': [self.users[0].pk, self.users[1].pk, 999999],
+                'emails': ['user2@test.ts', 'user3@test.ts', 'missing@test.ts'],
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'matched': 4, 'created': 3})
+        self.assertEqual(Subscription.objects.filter(course=self.course).count(), 4)
+        delete_many.assert_called_once()
+        self.assertEqual(get_subscribed_course_ids(self.users[1]), frozenset({self.course.pk}))
+
+    def test_bulk_enroll_requires_owner(self):
+        """
+        Тест запрета массовой подписки на чужой курс.
+        """
+
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.post(f'/api/courses/{self.course.id}/enroll/', {'user_ids': [self.users[1].pk]},
+                                    format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CatalogSearchTest(APITestCase):
+    """
+    Набор тестов поиска по курсам и урокам: ограничение видимости, фильтр по типу, ранжирование и подсветка.
+    """
+
+    def setUp(self):
+        """
+        Очистка кэша, создание владельцев, модератора, курсов и уроков.
+        """
+
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.other = CustomUser.objects.create_user(email='other@test.ts', password='password')
+        self.moderator = CustomUser.objects.create_user(email='moderator@test.ts', password='password')
+        self.moderator.groups.add(Group.objects.create(name='Модераторы'))
+
+        self.course = Course.objects.create(title='Программирование на Python',
+                                            description='Основы языка и стандартная библиотека', owner=self.owner,
+                                            price=1000)
+        self.lesson = Lesson.objects.create(course=self.course, title='Функции',
+                                            description='Функции и программирование на Python',
+                                            video_url='https://www.youtube.com/watch?v=python', owner=self.owner)
+        self.other_course = Course.objects.create(title='Python для анализа данных', description='Pandas',
+                                                  owner=self.other, price=1000)
+
+    def search(self, user, **params):
+        self.client.force_authenticate(user=user)
+
+        return self.client.get('/api/search/', params)
+
+    def test_scoping_and_types(self):
+        """
+        Тест того, что пользователь находит только свои курсы и уроки, модератор - все, а type ограничивает типы.
+        """
+
+        results = self.search(self.owner, q='python').data['results']
+        self.assertEqual({(result['type'], result['id']) for result in results},
+                         {('course', self.course.pk), ('lesson', self.lesson.pk)})
+        self.assertEqual(results[0]['type'], 'course')
+        self.assertEqual(next(result for result in results if result['type'] == 'lesson')['course'], self.course.pk)
+
+        results = self.search(self.moderator, q='python', type='course').data['results']
+        self.assertEqual({result['id'] for result in results}, {self.course.pk, self.other_course.pk})
+        self.assertEqual(len(self.search(self.moderator, q='python', limit=1).data['results']), 1)
+
+        self.assertEqual(self.search(self.owner, q='').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search(self.owner, q='python', type='user').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_vector_is_not_serialized(self):
+        """
+        Тест того, что поисковый вектор не попадает в ответы API и не загружается вместе с курсами.
+        """
+
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.get(f'/api/courses/{self.course.pk}/')
+
+        self.assertNotIn('search_vector', response.data)
+        self.assertNotIn('search_vector', response.data['lessons'][0])
+        self.assertIn('search_vector', Course.objects.get(pk=self.course.pk).get_deferred_fields())
+
+    @skipUnless(connection.vendor == 'postgresql', 'Полнотекстовый поиск доступен только в PostgreSQL')
+    def test_ranking_and_highlight(self):
+        """
+        Тест поиска по словоформам, ранжирования (название важнее описания), подсветки и заполнения векторов,
+        не вычисленных триггером (записи, созданные до миграции).
+        """
+
+        results = self.search(self.owner, q='программированию').data['results']
+
+        self.assertEqual([result['type'] for result in results], ['course', 'lesson'])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        self.assertIn('<mark>Программирование</mark>', results[0]['title_highlight'])
+        self.assertIn('<mark>программирование</mark>', results[1]['description_highlight'])
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute('ALTER TABLE lms_course DISABLE TRIGGER lms_course_search_vector_update')
+            Course.objects.update(search_vector=None)
+            cursor.execute('ALTER TABLE lms_course ENABLE TRIGGER lms_course_search_vector_update')
+
+        self.assertEqual(self.search(self.owner, q='python', type='course').data['results'], [])
+
+        call_command('reindex_search', type=['course'], missing=True, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(len(self.search(self.owner, q='python', type='course').data['results']), 1)
+
+    def test_highlight_is_escaped(self):
+        """
+        Тест того, что HTML в названии и описании экранируется в подсветке, а теги <mark> остаются.
+        """
+
+        course = Course.objects.create(title='<script>alert(1)</script> Python',
+                                       description='<img src=x onerror=alert(1)> Python', owner=self.owner,
+                                       price=1000)
+
+        result = next(result for result in self.search(self.owner, q='python', type='course').data['results']
+                      if result['id'] == course.pk)
+
+        self.assertEqual(result['title_highlight'], '&lt;script&gt;alert(1)&lt;/script&gt; <mark>Python</mark>')
+        self.assertIn('<mark>Python</mark>', result['description_highlight'])
+        self.assertNotRegex(result['description_highlight'].replace('<mark>', '').replace('</mark>', ''), '[<>]')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN-планы проверяются только на PostgreSQL')
+class HotQueryIndexTest(APITestCase):
+    """
+    Набор тестов, проверяющих по EXPLAIN, что горячие запросы проекта выполняются по индексу.
+
+    Последовательное сканирование отключается (enable_seqscan = off), чтобы на маленьких тестовых таблицах план
+    показывал, есть ли вообще подходящий индекс.
+    """
+
+    index_scans = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+    def setUp(self):
+        """
+        Отключение последовательного сканирования в рамках транзакции теста.
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset):
+        """
+        Проверяет, что план запроса содержит сканирование по индексу.
+        """
+
+        plan = queryset.explain()
+        self.assertTrue(any(scan in plan for scan in self.index_scans), plan)
+
+    def test_payment_by_stripe_session(self):
+        """
+        Тест поиска платежа по идентификатору сессии Stripe.
+        """
+
+        self.assertUsesIndex(Payment.objects.filter(stripe_payment_id='cs_test'))
+
+    def test_payments_of_user(self):
+        """
+        Тест выборки платежей пользователя по дате.
+        """
+
+        self.assertUsesIndex(Payment.objects.filter(user_id=1).order_by('-payment_date'))
+
+    def test_payments_of_user_in_range(self):
+        """
+        Тест страницы платежей пользователя за период в порядке курсорной пагинации.
+        """
+
+        self.assertUsesIndex(
+            Payment.objects.filter(user_id=1, payment_date__gte=timezone.now()).order_by('-payment_date', '-id')[:10]
+        )
+
+    def test_subscribers_of_course(self):
+        """
+        Тест обхода подписчиков курса по id.
+        """
+
+        self.assertUsesIndex(Subscription.objects.filter(course_id=1, id__gt=0).order_by('id'))
+
+    def test_subscription_of_user(self):
+        """
+        Тест поиска подписки пользователя на курс.
+        """
+
+        self.assertUsesIndex(Subscription.objects.filter(user_id=1, course_id=1))
+
+    def test_courses_of_owner(self):
+        """
+        Тест выборки курсов владельца по времени изменения.
+        """
+
+        self.assertUsesIndex(Course.objects.filter(owner_id=1).order_by('-updated_at'))
+
+    def test_inactive_users(self):
+        """
+        Тест выборки пачки давно не входивших активных пользователей в порядке (last_login, id).
+        """
+
+        self.assertUsesIndex(
+            CustomUser.objects.filter(is_active=True, last_login__lt=timezone.now()).order_by('last_login', 'id')[:1000]
+        )
+
+    def test_catalog_search(self):
+        """
+        Тест полнотекстового поиска курсов и уроков по поисковому вектору.
+        """
+
+        query = SearchQuery('курс', search_type='websearch', config=SEARCH_CONFIG)
+
+        for model in SEARCH_MODELS.values():
+            self.assertUsesIndex(model.objects.filter(search_vector=query))
+
+    def test_user_search(self):
+        """
+        Тест поиска пользователей по подстроке почты, телефона и города и по началу почты.
+        """
+
+        for term in ('test.ts', '900123', 'moscow', 'us', 'user@test'):
+            self.assertUsesIndex(search_users(CustomUser.objects.all(), term))
+
+
+class StripeProvisioningTest(APITestCase):
+    """
+    Набор тестов фонового создания продукта и цены курса в Stripe.
+    """
+
+    def setUp(self):
+        """
+        Очистка кэша, создание владельца и курса.
+        """
+
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.owner, price=1000)
+
+    @mock.patch('lms.services.stripe_service.create_price', return_value=mock.Mock(id='price_1'))
+    @mock.patch('lms.services.stripe_service.create_product', return_value=mock.Mock(id='prod_1'))
+    def test_provision(self, create_product, create_price):
+        """
+        Тест создания продукта и цены и идемпотентности повторного запуска.
+        """
+
+        self.assertEqual(provision_stripe_price(self.course.pk), 'price_1')
+        self.assertEqual(provision_stripe_price(self.course.pk), 'price_1')
+
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.stripe_product_id, self.course.stripe_price_id), ('prod_1', 'price_1'))
+        create_product.assert_called_once()
+        create_price.assert_called_once_with('prod_1', 1000, idempotency_key=f'course-{self.course.pk}-price-1000')
+
+    def test_price_change_schedules_provisioning(self):
+        """
+        Тест того, что изменение цены сбрасывает цену Stripe и ставит задачу ее создания.
+        """
+
+        Course.objects.filter(pk=self.course.pk).update(stripe_product_id='prod_1', stripe_price_id='price_1')
+        course = Course.objects.get(pk=self.course.pk)
+
+        with mock.patch.object(provision_stripe_price, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                course.price = 2000
+                course.save()
+
+        delay.assert_called_once_with(course.pk)
+        self.assertIsNone(Course.objects.get(pk=course.pk).stripe_price_id)
+
+    def test_checkout_waits_for_provisioning(self):
+        """
+        Тест ответа 409 при оплате курса, цена которого еще не создана в Stripe.
+        """
+
+        self.client.force_authenticate(user=self.owner)
+
+        with mock.patch.object(provision_stripe_price, 'delay') as delay:
+            response = self.client.post(f'/api/create-payment/{self.course.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('Retry-After', response)
+        delay.assert_called_once_with(self.course.pk)
+
+    @mock.patch('lms.views.create_checkout_session')
+    def test_checkout_single_stripe_call(self, create_checkout_session):
+        """
+        Тест того, что оформление оплаты подготовленного курса делает только один запрос к Stripe.
+        """
+
+        Course.objects.filter(pk=self.course.pk).update(stripe_product_id='prod_1', stripe_price_id='price_1')
+        create_checkout_session.return_value = mock.Mock(id='cs_1', url='https://stripe.test/cs_1',
+                                                         payment_status='unpaid', expires_at=time.time() + 86400)
+        self.client.force_authenticate(user=self.owner)
+
+        response = self.client.post(f'/api/create-payment/{self.course.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        create_checkout_session.assert_called_once()
+        self.assertEqual(Payment.objects.get().stripe_payment_id, 'cs_1')
+
+
+class StripeServiceTest(APITestCase):
+    """
+    Набор тестов клиента Stripe на локальной заглушке Stripe API.
+    """
+
+    def setUp(self):
+        """
+        Запуск заглушки Stripe и создание клиента, направленного на нее.
+        """
+
+        self.server = StripeStubServer()
+        self.service = StripeService('sk_test_stub', api_base=self.server.start(), timeout=1, max_retries=2,
+                                     backoff=0.01, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        self.addCleanup(self.server.stop)
+
+    def test_checkout_flow(self):
+        """
+        Тест создания продукта, цены и сессии и получения сессии через заглушку.
+        """
+
+        product = self.service.create_product('Course', 'Description')
+        price = self.service.create_price(product.id, 1000)
+        session = self.service.create_checkout_session(price.id, 'http://test/success', 'http://test/cancel')
+
+        self.assertEqual(price.unit_amount, 1000)
+        self.assertEqual(self.service.retrieve_checkout_session(session.id).payment_status, 'unpaid')
+
+    def test_idempotent_retry(self):
+        """
+        Тест того, что повтор создающего запроса с тем же ключом не создает дубликат.
+        """
+
+        first = self.service.create_product('Course', 'Description', idempotency_key='course-1-product')
+        second = self.service.create_product('Course', 'Description', idempotency_key='course-1-product')
+
+        self.assertEqual(first.id, second.id)
+
+    def test_retries_then_opens_circuit(self):
+        """
+        Тест повторов при ошибках 500 и отказа без запросов к Stripe при разомкнутом автомате защиты.
+        """
+
+        self.server.failure_rate = 1
+
+        with self.assertLogs('lms.services.stripe_service', 'WARNING'):
+            for _ in range(2):
+                with self.assertRaises(StripeUnavailableError):
+                    self.service.create_product('Course', 'Description')
+
+        self.assertEqual(self.server.request_count, 6)
+        self.assertEqual(self.service.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(StripeUnavailableError):
+            self.service.create_product('Course', 'Description')
+
+        self.assertEqual(self.server.request_count, 6)
+
+    def test_unexpected_error_releases_trial_call(self):
+        """
+        Тест того, что ошибка, не являющаяся ошибкой Stripe, в пробном вызове снова размыкает автомат, а не
+        блокирует все последующие вызовы.
+        """
+
+        breaker = self.service.breaker
+        breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+        with self.assertRaises(RuntimeError):
+            self.service.call(mock.Mock(side_effect=RuntimeError))
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        breaker.opened_at = time.monotonic() - breaker.reset_timeout
+        self.service.create_product('Course', 'Description')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_timeout(self):
+        """
+        Тест того, что медленный ответ прерывается по таймауту вызова.
+        """
+
+        self.server.latency = 0.5
+        self.service.max_retries = 0
+
+        with self.assertRaises(StripeUnavailableError):
+            self.service.call(self.service.client.products.create, {'name': 'Course'}, timeout=0.1)
+
+    def test_checkout_unavailable(self):
+        """
+        Тест ответа 503 при недоступности Stripe во время оформления оплаты.
+        """
+
+        owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        course = Course.objects.create(title='Course', description='Description', owner=owner, price=1000,
+                                       stripe_product_id='prod_1', stripe_price_id='price_1')
+        self.client.force_authenticate(user=owner)
+
+        with mock.patch('lms.views.create_checkout_session', side_effect=StripeUnavailableError('down')):
+            response = self.client.post(f'/api/create-payment/{course.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(Payment.objects.exists())
+
+
+@mock.patch('lms.views.settings.STRIPE_WEBHOOK_SECRET', 'whsec_test')
+class StripeWebhookTest(APITestCase):
+    """
+    Набор тестов приема событий Stripe через вебхук.
+    """
+
+    def setUp(self):
+        """
+        Создание пользователя, курса и ожидающего оплаты платежа.
+        """
+
+        self.user = CustomUser.objects.create_user(email='user@test.ts', password='password')
+        course = Course.objects.create(title='Course', description='Description', owner=self.user, price=1000)
+        self.payment = Payment.objects.create(user=self.user, paid_course=course, amount=10,
+                                              payment_method='TRANSFER', stripe_payment_id='cs_1',
+                                              stripe_status='unpaid')
+
+    def send_event(self, event_id, event_type, payment_status='paid', secret='whsec_test'):
+        """
+        Отправляет на вебхук подписанное событие сессии Checkout.
+        """
+
+        payload = json.dumps({
+            'id': event_id,
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': {'id': 'cs_1', 'object': 'checkout.session', 'payment_status': payment_status}},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+
+        with mock.patch.object(process_stripe_event, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/stripe/webhook/', payload, content_type='application/json',
+                                            HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}')
+
+        for call in delay.call_args_list:
+            process_stripe_event(*call.args)
+
+        return response, delay
+
+    def test_completed_event(self):
+        """
+        Тест перевода платежа в статус paid и записи события в журнал.
+        """
+
+        response, delay = self.send_event('evt_1', 'checkout.session.completed')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        delay.assert_called_once()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.stripe_status, 'paid')
+        self.assertIsNotNone(StripeEvent.objects.get(event_id='evt_1').processed_at)
+
+    def test_duplicate_delivery(self):
+        """
+        Тест того, что повторная доставка события не записывается и не обрабатывается повторно.
+        """
+
+        self.send_event('evt_1', 'checkout.session.completed')
+        response, delay = self.send_event('evt_1', 'checkout.session.completed')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        delay.assert_not_called()
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_final_status_not_overwritten(self):
+        """
+        Тест того, что запоздавшее событие не откатывает конечный статус платежа.
+        """
+
+        self.send_event('evt_1', 'checkout.session.completed')
+        self.send_event('evt_2', 'checkout.session.expired', payment_status='unpaid')
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.stripe_status, 'paid')
+        self.assertEqual(StripeEvent.objects.filter(processed_at__isnull=False).count(), 2)
+
+    def test_invalid_signature(self):
+        """
+        Тест отклонения события с неверной подписью.
+        """
+
+        response, delay = self.send_event('evt_1', 'checkout.session.completed', secret='whsec_other')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        delay.assert_not_called()
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_unsigned_event(self):
+        """
+        Тест отклонения события без подписи.
+        """
+
+        payload = json.dumps({'id': 'evt_1', 'type': 'checkout.session.completed', 'data': {'object': {}}})
+        response = self.client.post('/api/stripe/webhook/', payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_webhook_secret_not_configured(self):
+        """
+        Тест того, что без секрета вебхука события не принимаются, даже подписанные пустым ключом.
+        """
+
+        with mock.patch('lms.views.settings.STRIPE_WEBHOOK_SECRET', ''):
+            response, delay = self.send_event('evt_1', 'checkout.session.completed', secret='')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        delay.assert_not_called()
+        self.assertFalse(StripeEvent.objects.exists())
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.stripe_status, 'unpaid')
+
+    def test_check_session_status_without_stripe(self):
+        """
+        Тест того, что проверка статуса сессии читает платеж из базы данных без запроса к Stripe.
+        """
+
+        self.send_event('evt_1', 'checkout.session.completed')
+        self.client.force_login(self.user)
+
+        with mock.patch('lms.services.stripe_service.get_stripe_service') as get_stripe_service:
+            response = self.client.get('/api/check-session-status/cs_1/')
+
+        get_stripe_service.assert_not_called()
+        self.assertEqual(response.json(), {'status': 'complete', 'payment_status': 'paid',
+                                           'customer_email': 'user@test.ts'})
+        self.assertEqual(self.client.get('/api/check-session-status/cs_unknown/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+
+class PaymentReconciliationTest(APITestCase):
+    """
+    Набор тестов сверки ожидающих платежей со Stripe.
+    """
+
+    def setUp(self):
+        """
+        Запуск заглушки Stripe, создание пользователя и курса.
+        """
+
+        server = StripeStubServer()
+        self.server = server
+        self.service = StripeService('sk_test_stub', api_base=server.start(), max_retries=0)
+        self.addCleanup(server.stop)
+
+        patcher = mock.patch('lms.services.stripe_service.get_stripe_service', return_value=self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = CustomUser.objects.create_user(email='user@test.ts', password='password')
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.user, price=1000)
+
+    def create_payment(self, session_id, age=None):
+        """
+        Создает ожидающий оплаты платеж по сессии session_id возрастом age.
+        """
+
+        payment = Payment.objects.create(user=self.user, paid_course=self.course, amount=10,
+                                         payment_method='TRANSFER', stripe_payment_id=session_id,
+                                         stripe_status='unpaid')
+
+        if age is not None:
+            Payment.objects.filter(pk=payment.pk).update(payment_date=timezone.now() - age)
+
+        return payment
+
+    def test_reconcile(self):
+        """
+        Тест обновления статусов пачками списком сессий и отметки брошенных сессий истекшими.
+        """
+
+        sessions = [self.service.create_checkout_session('price_1', 'http://test/s', 'http://test/c')
+                    for _ in range(3)]
+        self.server.complete_session(sessions[0].id)
+        paid = self.create_payment(sessions[0].id)
+        open_ = self.create_payment(sessions[1].id)
+        abandoned = self.create_payment(sessions[2].id, age=timezone.timedelta(days=2))
+        missing = self.create_payment('cs_missing', age=timezone.timedelta(days=2))
+        requests_before = self.server.request_count
+
+        metrics = reconcile_pending_payments(batch_size=2)
+
+        statuses = dict(Payment.objects.values_list('pk', 'stripe_status'))
+        self.assertEqual([statuses[payment.pk] for payment in (paid, open_, abandoned, missing)],
+                         ['paid', 'unpaid', 'expired', 'expired'])
+        self.assertEqual(self.server.objects[sessions[2].id]['status'], 'expired')
+        self.assertEqual((metrics['scanned'], metrics['updated'], metrics['expired']), (4, 3, 2))
+        self.assertEqual(metrics['api_calls'], self.server.request_count - requests_before)
+        # Первая пачка - один запрос списка; вторая - список (сессии созданы позже "состаренных" платежей),
+        # два запроса по одной сессии и завершение брошенной сессии.
+        self.assertEqual(metrics['api_calls'], 5)
+
+    def test_expire_unavailable_and_webhook_race(self):
+        """
+        Тест того, что недоступность Stripe при завершении сессии не прерывает сверку, а платежи, завершенные
+        вебхуком во время сверки, не считаются истекшими.
+        """
+
+        session = self.service.create_checkout_session('price_1', 'http://test/s', 'http://test/c')
+        abandoned = self.create_payment(session.id, age=timezone.timedelta(days=2))
+        missing = self.create_payment('cs_missing', age=timezone.timedelta(days=2))
+        apply_payment_statuses = payment_service.apply_payment_statuses
+
+        def apply_after_webhook(payments):
+            Payment.objects.filter(pk=missing.pk).update(stripe_status='paid')
+            return apply_payment_statuses(payments)
+
+        with (mock.patch.object(payment_service, 'expire_checkout_session', side_effect=StripeUnavailableError),
+              mock.patch.object(payment_service, 'apply_payment_statuses', side_effect=apply_after_webhook),
+              self.assertLogs('lms.services.payment_service', 'WARNING')):
+            metrics = reconcile_pending_payments()
+
+        statuses = dict(Payment.objects.values_list('pk', 'stripe_status'))
+        self.assertEqual((statuses[abandoned.pk], statuses[missing.pk]), ('unpaid', 'paid'))
+        self.assertEqual((metrics['scanned'], metrics['updated'], metrics['expired']), (2, 0, 0))
+
+    def test_final_payments_skipped(self):
+        """
+        Тест того, что платежи в конечном статусе не запрашиваются из Stripe.
+        """
+
+        Payment.objects.filter(pk=self.create_payment('cs_1').pk).update(stripe_status='paid')
+
+        metrics = reconcile_pending_payments()
+
+        self.assertEqual((metrics['scanned'], metrics['api_calls']), (0, 0))
+
+
+class CheckoutSessionReuseTest(APITestCase):
+    """
+    Набор тестов повторного использования сессий Checkout и заголовка Idempotency-Key.
+    """
+
+    def setUp(self):
+        """
+        Запуск заглушки Stripe, создание пользователя и двух подготовленных к оплате курсов.
+        """
+
+        cache.clear()
+        server = StripeStubServer()
+        self.server = server
+        service = StripeService('sk_test_stub', api_base=server.start(), max_retries=0)
+        self.addCleanup(server.stop)
+
+        patcher = mock.patch('lms.services.stripe_service.get_stripe_service', return_value=service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = CustomUser.objects.create_user(email='user@test.ts', password='password')
+        self.courses = [
+            Course.objects.create(title=f'Course {number}', description='Description', owner=self.user, price=1000,
+                                  stripe_product_id='prod_1', stripe_price_id='price_1')
+            for number in range(2)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def pay(self, course, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+
+        return self.client.post(f'/api/create-payment/{course.pk}/', **headers)
+
+    def test_open_session_reused(self):
+        """
+        Тест того, что повторные запросы возвращают открытую сессию без запросов к Stripe.
+        """
+
+        first = self.pay(self.courses[0])
+        requests_after_first = self.server.request_count
+        second = self.pay(self.courses[0])
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.server.request_count, requests_after_first)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_new_session_after_payment(self):
+        """
+        Тест создания новой сессии, если платеж по прежней сессии завершен.
+        """
+
+        first = self.pay(self.courses[0])
+        Payment.objects.update(stripe_status='paid')
+
+        second = self.pay(self.courses[0])
+
+        self.assertNotEqual(second.data['id'], first.data['id'])
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_idempotency_key(self):
+        """
+        Тест повтора сохраненного ответа по ключу идемпотентности и отказа при повторе ключа с другим запросом.
+        """
+
+        first = self.pay(self.courses[0], key='key-1')
+        requests_after_first = self.server.request_count
+
+        with CaptureQueriesContext(connection) as queries:
+            replay = self.pay(self.courses[0], key='key-1')
+
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.server.request_count, requests_after_first)
+        self.assertFalse([query for query in queries if 'lms_course' in query['sql']])
+        self.assertEqual(self.pay(self.courses[1], key='key-1').status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+class SeedDataBenchmarkTest(APITestCase):
+    """
+    Набор тестов генератора тестовых данных и бенчмарка маршрутов API.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.options = {'users': 20, 'courses': 3, 'lessons_per_course': 2, 'subscriptions_per_user': 2,
+                        'payments': 50, 'stdout': io.StringIO()}
+
+    def get_snapshot(self):
+        return list(Payment.objects.order_by('payment_date').values_list('payment_date', 'amount', 'user__email',
+                                                                         'stripe_status'))
+
+    def test_seed_data_is_deterministic(self):
+        """
+        Тест объема тестовых данных и их повторяемости при пересоздании.
+        """
+
+        call_command('seed_data', **self.options)
+
+        self.assertEqual(CustomUser.objects.count(), 20)
+        self.assertEqual(Lesson.objects.count(), 6)
+        self.assertEqual(Subscription.objects.count(), 40)
+        self.assertEqual(Payment.objects.count(), 50)
+        snapshot = self.get_snapshot()
+
+        with self.assertRaises(CommandError):
+            call_command('seed_data', **self.options)
+
+        call_command('seed_data', flush=True, **self.options)
+        self.assertEqual(self.get_snapshot(), snapshot)
+
+    def test_benchmark_covers_all_routes(self):
+        """
+        Тест того, что бенчмарк выполняет сценарий для каждого маршрута и не меняет данные.
+        """
+
+        call_command('seed_data', **self.options)
+        counts = (Course.objects.count(), Lesson.objects.count(), Subscription.objects.count(),
+                  Payment.objects.count(), CustomUser.objects.count())
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('benchmark_api', iterations=2, warmup=0, output=output.name, stdout=io.StringIO())
+            report = json.load(output)
+
+        self.assertEqual(report['uncovered_routes'], [])
+        self.assertEqual(report['meta']['dataset']['payments'], 50)
+
+        for name, metrics in report['endpoints'].items():
+            self.assertTrue(all(code < 400 for code in metrics['status']), name)
+            self.assertGreaterEqual(metrics['latency_ms']['p90'], metrics['latency_ms']['p50'])
+
+        self.assertEqual((Course.objects.count(), Lesson.objects.count(), Subscription.objects.count(),
+                          Payment.objects.count(), CustomUser.objects.count()), counts)
+
+
+class MetricsTest(APITestCase):
+    """
+    Набор тестов метрик запросов, заголовка Server-Timing и эндпоинта /metrics/.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='user@test.ts', password='password')
+        Course.objects.create(title='Course', description='Description', owner=self.user, price=1000)
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_timing(self):
+        """
+        Тест заголовка Server-Timing с временем SQL-запросов, сериализации и общим временем.
+        """
+
+        response = self.client.get('/api/courses/')
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+
+        self.assertEqual(set(timing), {'db', 'serialize', 'total'})
+        self.assertRegex(timing['db'], r'^dur=[\d.]+;desc="[1-9]\d* queries"$')
+        self.assertGreater(float(timing['serialize'].removeprefix('dur=')), 0)
+
+    def test_metrics_endpoint(self):
+        """
+        Тест публикации метрик в формате Prometheus, объединения процессов и защиты токеном.
+        """
+
+        self.client.get('/api/courses/')
+        cache.set('metrics:process:other:1', {('http_requests_total', (('method', 'GET'), ('status', '200'),
+                                                                       ('view', 'lms:course-list'))): 5})
+        cache.set(METRICS_INDEX_KEY, {'metrics:process:other:1', 'metrics:process:gone:2'})
+
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            response = self.client.get('/metrics/')
+
+        body = response.content.decode()
+        count = re.search(r'^http_requests_total\{method="GET",status="200",view="lms:course-list"\} (\d+)$',
+                          body, re.MULTILINE)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertGreaterEqual(int(count.group(1)), 6)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertRegex(body, r'http_request_duration_seconds_bucket\{method="GET",view="lms:course-list",'
+                               r'le="\+Inf"\} \d+')
+        self.assertNotIn('metrics:process:gone:2', cache.get(METRICS_INDEX_KEY))
+
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code,
+                             status.HTTP_200_OK)
+
+    def test_metrics_access_without_token(self):
+        """
+        Тест того, что без METRICS_TOKEN метрики доступны только персоналу и разрешенным адресам.
+        """
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1').status_code, status.HTTP_200_OK)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/metrics/').status_code, status.HTTP_200_OK)
+
+
+class CeleryMetricsTest(APITestCase):
+    """
+    Набор тестов метрик задач Celery и сводки celery_top.
+    """
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def get_value(self, name, **labels):
+        return collect().get((name, tuple(sorted(labels.items()))))
+
+    def test_task_metrics(self):
+        """
+        Тест учета постановки, ожидания в очереди, времени выполнения и результатов задач.
+        """
+
+        headers = {}
+        record_task_published(sender='lms.tasks.send_update_email', headers=headers, routing_key='celery')
+        headers['published_at'] -= 2
+
+        send_update_email.apply(['user@test.ts', 'Course'], headers=headers)
+
+        with mock.patch('lms.tasks.send_mail', side_effect=OSError):
+            send_update_email.apply(['user@test.ts', 'Course'])
+
+        labels = {'task': 'lms.tasks.send_update_email', 'queue': 'celery'}
+        wait = self.get_value('celery_task_queue_wait_seconds', **labels)
+
+        self.assertEqual(self.get_value('celery_task_published_total', **labels), 1)
+        self.assertEqual(self.get_value('celery_tasks_total', state='SUCCESS', **labels), 1)
+        self.assertEqual(self.get_value('celery_tasks_total', state='FAILURE', **labels), 1)
+        self.assertEqual(self.get_value('celery_task_runtime_seconds', **labels)[-1], 2)
+        self.assertEqual(wait[-1], 1)
+        self.assertGreaterEqual(wait[-2], 2)
+        self.assertEqual(self.get_value('celery_queue_length', queue='stripe'), 0)
+
+    def test_celery_top(self):
+        """
+        Тест сводки задач командой celery_top.
+        """
+
+        for _ in range(3):
+            record_task_published(sender='lms.tasks.deactivate_inactive_users', headers={}, routing_key='celery')
+
+        send_update_email.apply(['user@test.ts', 'Course'])
+        stdout = io.StringIO()
+        call_command('celery_top', iterations=1, sort='backlog', stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+
+        self.assertIn('celery=0', lines[0])
+        self.assertTrue(lines[2].startswith('lms.tasks.deactivate_inactive_users'))
+        self.assertEqual(lines[2].split()[2], '3')
+        self.assertTrue(lines[3].startswith('lms.tasks.send_update_email'))
@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 
 from lms.apps import LmsConfig
 from lms.views import CourseViewSet, LessonListCreateAPIView, LessonRetrieveUpdateDestroyAPIView, SubscriptionView, \
-    CreatePaymentAPIView, payment_success, payment_cancel, check_session_status
+    CreatePaymentAPIView, payment_success, payment_cancel, check_session_status, \
+    stripe_webhook, CatalogSearchView
 
 app_name = LmsConfig.name
 
@@ -14,9 +15,11 @@ urlpatterns = [
     path('', include(router.urls)),
     path('lessons/', LessonListCreateAPIView.as_view(), name='lesson-list-create'),
     path('lessons/<int:pk>/', LessonRetrieveUpdateDestroyAPIView.as_view(), name='lesson-detail'),
+    path('search/', CatalogSearchView.as_view(), name='search'),
     path('subscribe/', SubscriptionView.as_view(), name='subscribe'),
     path('create-payment/<int:course_id>/', CreatePaymentAPIView.as_view(), name='create-payment'),
     path('success/', payment_success, name='payment-success'),
     path('cancel/', payment_cancel, name='payment-cancel'),
     path('check-session-status/<str:session_id>/', check_session_status, name='check-session-status'),
+    path('stripe/webhook/', stripe_webhook, name='stripe-webhook'),
 ]
@@ -1,38 +1,66 @@
+import json
+
 import stripe
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Value
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
-from rest_framework import viewsets, generics, status
+from rest_framework import viewsets, generics, status, serializers
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from config import settings
+from lms.mixins import ConditionalRequestMixin, IdempotencyKeyMixin, ServerTimingMixin
 from lms.models import Course, Lesson, Subscription
-from lms.paginators import LessonsAndCoursesPageNumberPagination
-from lms.serializers import CourseSerializer, LessonSerializer
-from lms.services.stripe_service import create_product, create_price, create_checkout_session
+from lms.paginators import LessonsAndCoursesPageNumberPagination, KeysetPaginationMixin
+from lms.serializers import CourseSerializer, LessonSerializer, BulkEnrollmentSerializer, CatalogSearchQuerySerializer
+from lms.services.cache_service import (get_representation, get_subscribed_course_ids, invalidate_subscriptions,
+                                        invalidate_subscriptions_many)
+from lms.services.payment_service import (CHECKOUT_SESSION_EVENTS, FINAL_STATUSES, get_open_checkout_session,
+                                          record_stripe_event, remember_checkout_session)
+from lms.services.search_service import SEARCH_MODELS, search_catalog
+from lms.services.stripe_service import StripeUnavailableError, create_checkout_session
+from lms.tasks import process_stripe_event, provision_stripe_price
 from users.models.payment_model import Payment
 from users.permissions import IsModerator, IsOwner
+from users.services.role_service import is_moderator
 
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
-
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ServerTimingMixin, ConditionalRequestMixin, KeysetPaginationMixin, viewsets.ModelViewSet):
     """
     Вьюсет для работы с курсами. Поддерживает все стандартные операции CRUD.
 
+    Ответы на получение и изменение курса содержат ETag и Last-Modified, вычисленные по времени изменения курса и
+    его уроков, поэтому условные GET-запросы получают 304 без загрузки уроков, а PUT/PATCH поддерживают If-Match.
+
     Атрибуты:
         queryset (QuerySet): Запрос для получения всех объектов Course.
         serializer_class (Serializer): Класс сериализатора для модели Course.
         pagination_class (Class): Класс пагинации, применяемый к результатам.
+        cursor_ordering (tuple): Сортировка при курсорной пагинации (?pagination=cursor).
+        default_lessons_limit (int): Число уроков курса в списке при ?expand=lessons без ?lessons_limit.
+        max_lessons_limit (int): Максимальное значение ?lessons_limit.
+
+    Параметры запроса списка:
+        fields: Поля курса через запятую (id возвращается всегда), остальные поля не выбираются из базы данных.
+                При получении курса параметр ограничивает поля ответа.
+        expand: Значение lessons включает в курсы вложенные уроки (по умолчанию уроки в списке не возвращаются).
+        lessons_limit: Максимальное число вложенных уроков на курс.
     """
 
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     pagination_class = LessonsAndCoursesPageNumberPagination
+    cursor_ordering = ('-updated_at', '-id')
+    default_lessons_limit = 20
+    max_lessons_limit = 100
 
     def get_permissions(self):
         """
@@ -44,7 +72,7 @@ class CourseViewSet(viewsets.ModelViewSet):
 
         if self.action in ['create']:
             self.permission_classes = [IsAuthenticated]
-        elif self.action in ['destroy', 'update', 'partial_update', 'retrieve', 'list']:
+        elif self.action in ['destroy', 'update', 'partial_update', 'retrieve', 'list', 'enroll']:
             self.permission_classes = [IsAuthenticated, IsOwner | IsModerator]
 
         return [permission() for permission in self.permission_classes]
@@ -67,13 +95,246 @@ class CourseViewSet(viewsets.ModelViewSet):
             QuerySet: Запрос для получения объектов Course, доступных текущему пользователю.
         """
 
-        if self.request.user.groups.filter(name='Модераторы').exists():
-            return Course.objects.all()
+        if is_moderator(self.request.user):
+            queryset = Course.objects.all()
+        else:
+            queryset = Course.objects.filter(owner=self.request.user)
+
+        if self.action == 'enroll':
+            return queryset.only('id', 'owner')
+
+        if self.action == 'retrieve':
+            return queryset.only('id', 'owner', 'updated_at').annotate(
+                lesson_count=Count('lessons'),
+                lessons_updated_at=Max('lessons__updated_at'),
+            )
+
+        if self.action == 'list':
+            return self.get_list_queryset(queryset)
+
+        return self.annotate_queryset(queryset)
+
+    def get_requested_fields(self):
+        """
+        Разбирает параметр fields запроса списка или получения курса.
+
+        Поле id возвращается всегда, неизвестные поля отклоняются с ошибкой 400.
+
+        Возвращаемое значение:
+            set | None: Множество запрошенных полей или None, если параметр не задан (все поля).
+        """
+
+        value = self.request.query_params.get('fields')
+
+        if not value:
+            return None
+
+        fields = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = fields - set(self.get_serializer_class()().fields)
+
+        if unknown:
+            raise serializers.ValidationError({'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}.'})
+
+        return fields | {'id'}
+
+    def get_list_options(self):
+        """
+        Разбирает параметры fields, expand и lessons_limit запроса списка.
+
+        Возвращаемое значение:
+            tuple: Множество запрошенных полей (None - все поля), признак раскрытия уроков и лимит уроков на курс.
+        """
+
+        if hasattr(self, '_list_options'):
+            return self._list_options
+
+        params = self.request.query_params
+        fields = self.get_requested_fields()
+        expand = {name.strip() for name in params.get('expand', '').split(',')}
+
+        try:
+            lessons_limit = int(params.get('lessons_limit', self.default_lessons_limit))
+        except ValueError:
+            raise serializers.ValidationError({'lessons_limit': 'Ожидается целое число.'})
+
+        lessons_limit = max(1, min(lessons_limit, self.max_lessons_limit))
+        self._list_options = fields, 'lessons' in expand, lessons_limit
+
+        return self._list_options
+
+    def get_list_queryset(self, queryset):
+        """
+        Возвращает queryset списка курсов, загружающий только запрошенные данные.
+
+        Из таблицы курсов выбираются только запрошенные поля, аннотации lesson_count и is_subscribed добавляются
+        только если эти поля запрошены, а уроки подгружаются (не более lessons_limit на курс) только при
+        ?expand=lessons.
+
+        Аргументы:
+            queryset (QuerySet): Запрос курсов, доступных пользователю.
+
+        Возвращаемое значение:
+            QuerySet: Запрос для списка курсов.
+        """
+
+        fields, expand_lessons, lessons_limit = self.get_list_options()
+        annotations = {}
+
+        if fields is None or 'lesson_count' in fields:
+            annotations['lesson_count'] = Count('lessons')
+
+        if fields is None or 'is_subscribed' in fields:
+            subscriptions = Subscription.objects.filter(user=self.request.user, course=OuterRef('pk'))
+            annotations['is_subscribed'] = Exists(subscriptions)
+
+        if fields is not None:
+            model_fields = {field.name for field in Course._meta.concrete_fields}
+            queryset = queryset.only('id', 'updated_at', *(fields & model_fields))
 
-        return Course.objects.filter(owner=self.request.user)
+        if expand_lessons:
+            lessons = Lesson.objects.order_by('id')[:lessons_limit]
+            queryset = queryset.prefetch_related(Prefetch('lessons', queryset=lessons, to_attr='limited_lessons'))
 
+        return queryset.annotate(**annotations).order_by('pk')
 
-class LessonListCreateAPIView(generics.ListCreateAPIView):
+    def get_serializer(self, *args, **kwargs):
+        """
+        Передает сериализатору списка запрошенные поля и признак раскрытия уроков.
+        """
+
+        if self.action == 'list':
+            fields, expand_lessons, _ = self.get_list_options()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', ['lessons'] if expand_lessons else [])
+            kwargs.setdefault('lessons_source', 'limited_lessons')
+
+        return super().get_serializer(*args, **kwargs)
+
+    def annotate_queryset(self, queryset):
+        """
+        Дополняет queryset данными, необходимыми сериализатору, чтобы число запросов не зависело от размера страницы.
+
+        Количество уроков и признак подписки текущего пользователя вычисляются в основном запросе, а уроки курсов
+        загружаются одним дополнительным запросом через prefetch_related.
+
+        Аргументы:
+            queryset (QuerySet): Исходный запрос курсов.
+
+        Возвращаемое значение:
+            QuerySet: Запрос курсов с аннотациями lesson_count, lessons_updated_at и is_subscribed.
+        """
+
+        subscriptions = Subscription.objects.filter(user=self.request.user, course=OuterRef('pk'))
+
+        return queryset.annotate(
+            lesson_count=Count('lessons', distinct=True),
+            lessons_updated_at=Max('lessons__updated_at'),
+            is_subscribed=Exists(subscriptions),
+        ).prefetch_related('lessons').order_by('pk')
+
+    def get_etag_parts(self, instance):
+        """
+        Возвращает значения, от которых зависит представление курса для текущего пользователя.
+        """
+
+        return (instance.pk, instance.updated_at, instance.lessons_updated_at, instance.lesson_count,
+                self.get_is_subscribed(instance))
+
+    def get_last_modified(self, instance):
+        """
+        Возвращает время последнего изменения курса или его уроков.
+        """
+
+        timestamps = [value for value in (instance.updated_at, instance.lessons_updated_at) if value]
+
+        return max(timestamps, default=None)
+
+    def get_is_subscribed(self, instance):
+        """
+        Возвращает признак подписки текущего пользователя, используя аннотацию или кэш подписок.
+        """
+
+        if not hasattr(instance, 'is_subscribed'):
+            instance.is_subscribed = instance.pk in get_subscribed_course_ids(self.request.user)
+
+        return instance.is_subscribed
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Возвращает курс из кэша представлений.
+
+        Для проверки доступа и вычисления ETag загружаются только id, владелец, время изменения курса и агрегаты по
+        урокам. Если клиент прислал актуальный ETag, возвращается 304 без сериализации. Общее для всех пользователей
+        представление берется из двухуровневого кэша (lms.services.cache_service), поверх него накладывается
+        персональное поле is_subscribed.
+
+        Возвращаемое значение:
+            Response: Представление курса или ответ 304.
+        """
+
+        fields = self.get_requested_fields()
+        instance = self.get_object()
+        not_modified = self.check_preconditions(request, instance)
+
+        if not_modified is not None:
+            return not_modified
+
+        data = get_representation('course', instance.pk, lambda: self.build_representation(instance.pk))
+        data['is_subscribed'] = self.get_is_subscribed(instance)
+
+        if fields is not None:
+            data = {name: value for name, value in data.items() if name in fields}
+
+        return self.set_validators(Response(data), instance)
+
+    @action(detail=True, methods=['post'], serializer_class=BulkEnrollmentSerializer)
+    def enroll(self, request, pk=None):
+        """
+        Массово подписывает пользователей на курс (например, при подключении корпоративной группы).
+
+        Принимает списки user_ids и/или emails. Подписки вставляются пачками с пропуском уже существующих, поэтому
+        повторный вызов безопасен. Доступно владельцу курса и модераторам.
+
+        Возвращаемое значение:
+            Response: Количество найденных пользователей и созданных подписок.
+        """
+
+        course = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        created, user_ids = Subscription.objects.bulk_subscribe(
+            course.pk,
+            user_ids=serializer.validated_data.get('user_ids', []),
+            emails=serializer.validated_data.get('emails', []),
+        )
+        transaction.on_commit(lambda: invalidate_subscriptions_many(user_ids))
+
+        return Response({'matched': len(user_ids), 'created': created}, status=status.HTTP_200_OK)
+
+    def build_representation(self, pk):
+        """
+        Строит общее для всех пользователей представление курса без персонального поля is_subscribed.
+
+        Аргументы:
+            pk (int): Идентификатор курса.
+
+        Возвращаемое значение:
+            dict: Сериализованный курс.
+        """
+
+        course = Course.objects.annotate(
+            lesson_count=Count('lessons', distinct=True),
+            lessons_updated_at=Max('lessons__updated_at'),
+            is_subscribed=Value(False),
+        ).prefetch_related('lessons').get(pk=pk)
+        data = dict(self.get_serializer(course).data)
+        data.pop('is_subscribed')
+
+        return data
+
+
+class LessonListCreateAPIView(ServerTimingMixin, KeysetPaginationMixin, generics.ListCreateAPIView):
     """
     API представление для создания и получения списка уроков.
 
@@ -81,11 +342,13 @@ class LessonListCreateAPIView(generics.ListCreateAPIView):
         queryset (QuerySet): Запрос для получения всех объектов Lesson.
         serializer_class (Serializer): Класс сериализатора для модели Lesson.
         pagination_class (Class): Класс пагинации, применяемый к результатам.
+        cursor_ordering (tuple): Сортировка при курсорной пагинации (?pagination=cursor).
     """
 
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     pagination_class = LessonsAndCoursesPageNumberPagination
+    cursor_ordering = ('-id',)
 
     def get_permissions(self):
         """
@@ -120,16 +383,20 @@ class LessonListCreateAPIView(generics.ListCreateAPIView):
             QuerySet: Запрос для получения объектов Lesson, доступных текущему пользователю.
         """
 
-        if self.request.user.groups.filter(name='Модераторы').exists():
-            return Lesson.objects.all()
+        if is_moderator(self.request.user):
+            return Lesson.objects.order_by('pk')
 
-        return Lesson.objects.filter(owner=self.request.user)
+        return Lesson.objects.filter(owner=self.request.user).order_by('pk')
 
 
-class LessonRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class LessonRetrieveUpdateDestroyAPIView(ServerTimingMixin, ConditionalRequestMixin,
+                                         generics.RetrieveUpdateDestroyAPIView):
     """
     API представление для получения, обновления и удаления уроков.
 
+    Ответы содержат ETag и Last-Modified по времени изменения урока: условные GET-запросы получают 304, а PUT/PATCH
+    поддерживают If-Match.
+
     Атрибуты:
         queryset (QuerySet): Запрос для получения всех объектов Lesson.
         serializer_class (Serializer): Класс сериализатора для модели Lesson.
@@ -153,8 +420,65 @@ class LessonRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
 
         return [permission() for permission in self.permission_classes]
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Возвращает урок, используя кэш сериализованных представлений.
+
+        Возвращаемое значение:
+            Response: Представление урока или ответ 304.
+        """
+
+        instance = self.get_object()
+        not_modified = self.check_preconditions(request, instance)
+
+        if not_modified is not None:
+            return not_modified
+
+        data = get_representation('lesson', instance.pk, lambda: dict(self.get_serializer(instance).data))
+
+        return self.set_validators(Response(data), instance)
+
+    def get_etag_parts(self, instance):
+        """
+        Возвращает значения, от которых зависит представление урока.
+        """
+
+        return instance.pk, instance.updated_at
+
+    def get_last_modified(self, instance):
+        """
+        Возвращает время последнего изменения урока.
+        """
+
+        return instance.updated_at
+
+
+class CatalogSearchView(ServerTimingMixin, APIView):
+    """
+    Представление полнотекстового поиска по курсам и урокам.
+
+    Результаты отсортированы по релевантности и содержат фрагменты названия и описания с подсветкой совпадений
+    (см. lms.services.search_service.search_catalog). Модераторы ищут по всем курсам и урокам, остальные
+    пользователи - по своим.
+
+    Параметры запроса: q (строка поиска), type (course, lesson; можно повторять), limit.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = CatalogSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        types = [kind for kind in SEARCH_MODELS if kind in params.get('type', ())]
+
+        return Response({
+            'query': params['q'],
+            'results': search_catalog(request.user, params['q'], types, params['limit']),
+        })
 
-class SubscriptionView(APIView):
+
+class SubscriptionView(ServerTimingMixin, APIView):
     """
     Представление для управления подписками на курсы.
 
@@ -168,7 +492,8 @@ class SubscriptionView(APIView):
         Обрабатывает POST-запрос для добавления или удаления подписки на курс.
 
         Если пользователь уже подписан на указанный курс, подписка будет удалена. Если не подписан, подписка будет
-        создана.
+        создана. Переключение выполняется одним атомарным запросом (Subscription.objects.toggle), поэтому
+        одновременные запросы не создают дубликатов.
 
         Параметры
         ----------
@@ -193,21 +518,24 @@ class SubscriptionView(APIView):
         """
 
         user = request.user
-        course_id = request.data.get('course_id')
-        course = get_object_or_404(Course, id=course_id)
-        subscription = Subscription.objects.filter(user=user, course=course)
 
-        if subscription.exists():
-            subscription.delete()
-            message = 'подписка удалена'
-        else:
-            Subscription.objects.create(user=user, course=course)
-            message = 'подписка добавлена'
+        try:
+            course_id = int(request.data.get('course_id'))
+        except (TypeError, ValueError):
+            raise Http404
+
+        subscribed = Subscription.objects.toggle(user.pk, course_id)
+
+        if subscribed is None:
+            raise Http404
+
+        transaction.on_commit(lambda: invalidate_subscriptions(user.pk))
+        message = 'подписка добавлена' if subscribed else 'подписка удалена'
 
         return Response({"message": message})
 
 
-class CreatePaymentAPIView(APIView):
+class CreatePaymentAPIView(ServerTimingMixin, IdempotencyKeyMixin, APIView):
     """
     Представление для создания платежа.
 
@@ -220,37 +548,83 @@ class CreatePaymentAPIView(APIView):
 
     Возвращаемое значение метода post:
         Response: Ответ с данными платежной сессии или с сообщением об ошибке.
+
+    Продукт и цена курса создаются в Stripe заранее задачей provision_stripe_price, поэтому при оформлении оплаты
+    выполняется единственный запрос к Stripe - создание сессии. Если цена курса еще не создана, задача ставится
+    повторно, а клиент получает ответ 409 с заголовком Retry-After. Если Stripe недоступен (таймауты или разомкнут
+    автомат защиты), клиент сразу получает ответ 503 с заголовком Retry-After.
+
+    Повторные запросы не создают новых сессий и платежей: запрос с уже использованным заголовком Idempotency-Key
+    получает сохраненный ответ, а пока у пользователя есть открытая сессия для курса, возвращается она.
     """
     permission_classes = [IsAuthenticated]
+    provisioning_retry_after = 5
+    unavailable_retry_after = 30
+    checkout_lock_timeout = 30
 
     def post(self, request, course_id):
-        course = get_object_or_404(Course, id=course_id)
+        return self.idempotent_response(request, self.create_payment, course_id)
 
-        if not course.stripe_product_id:
-            product = create_product(course.title, course.description)
-            course.stripe_product_id = product.id
-            course.save()
+    def create_payment(self, request, course_id):
+        course = get_object_or_404(Course.objects.only('id', 'price', 'stripe_price_id'), id=course_id)
 
         if not course.stripe_price_id:
-            price = create_price(course.stripe_product_id, course.price)
-            course.stripe_price_id = price.id
-            course.save()
+            provision_stripe_price.delay(course.id)
+
+            return Response({'error': 'Course is not ready for payment yet, retry later'},
+                            status=status.HTTP_409_CONFLICT,
+                            headers={'Retry-After': str(self.provisioning_retry_after)})
+
+        session = get_open_checkout_session(request.user.pk, course)
+
+        if session is not None:
+            return Response({'id': session['id'], 'url': session['url']}, status=status.HTTP_200_OK)
+
+        lock_key = f'lms:checkout-lock:{request.user.pk}:{course.pk}'
+
+        if not cache.add(lock_key, 1, self.checkout_lock_timeout):
+            return Response({'error': 'Checkout session is being created, retry later'},
+                            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+
+        try:
+            return self.create_checkout_session(request, course)
+        finally:
+            cache.delete(lock_key)
+
+    def create_checkout_session(self, request, course):
+        session = get_open_checkout_session(request.user.pk, course)
+
+        if session is not None:
+            return Response({'id': session['id'], 'url': session['url']}, status=status.HTTP_200_OK)
 
         success_url = request.build_absolute_uri(reverse('lms:payment-success'))
         cancel_url = request.build_absolute_uri(reverse('lms:payment-cancel'))
-        session = create_checkout_session(course.stripe_price_id, success_url, cancel_url)
-
-        if session is None:
+        idempotency_key = None
+
+        if self.idempotency_key:
+            idempotency_key = f'checkout-{request.user.pk}-{course.pk}-{course.stripe_price_id}-{self.idempotency_key}'
+
+        try:
+            session = create_checkout_session(course.stripe_price_id, success_url, cancel_url,
+                                              idempotency_key=idempotency_key)
+        except StripeUnavailableError:
+            return Response({'error': 'Payment provider is unavailable, retry later'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': str(self.unavailable_retry_after)})
+        except stripe.StripeError:
             return Response({'error': 'Failed to create checkout session'}, status=status.HTTP_400_BAD_REQUEST)
 
-        Payment.objects.create(
-            user=request.user,
-            paid_course=course,
+        Payment.objects.get_or_create(
             stripe_payment_id=session.id,
-            amount=course.price / 100,
-            payment_method='TRANSFER',
-            stripe_status=session.payment_status,
+            defaults={
+                'user': request.user,
+                'paid_course': course,
+                'amount': course.price / 100,
+                'payment_method': 'TRANSFER',
+                'stripe_status': session.payment_status,
+            },
         )
+        remember_checkout_session(request.user.pk, course, session)
 
         return Response({'id': session.id, 'url': session.url}, status=status.HTTP_200_OK)
 
@@ -284,41 +658,71 @@ def payment_cancel(request):
 @login_required
 def check_session_status(request, session_id):
     """
-    Проверяет статус сеанса оплаты Stripe и обновляет соответствующий платеж в базе данных.
+    Возвращает статус сеанса оплаты Stripe по данным платежа в базе данных.
+
+    Статус платежа обновляется вебхуком Stripe (stripe_webhook), поэтому проверка не обращается к Stripe.
 
     Аргументы:
     request -- HTTP-запрос, из которого может быть извлечена информация о пользователе.
     session_id -- Идентификатор сеанса оплаты Stripe для проверки.
 
     Возвращает:
-    JsonResponse с информацией о статусе сеанса и состоянии оплаты при успешной проверке.
-    JsonResponse с ошибкой при возникновении ошибки Stripe.
-
-    Порядок действий:
-    1. Извлекается сеанс оплаты Stripe с использованием предоставленного session_id.
-    2. Формируется JsonResponse с данными о статусе сеанса, состоянии оплаты и электронной почте клиента.
-    3. В случае ошибки Stripe, формируется JsonResponse с информацией об ошибке.
-    4. Всегда выполняется блок finally для обновления статуса транзакции в базе данных,
-       если статус в базе данных отличается от текущего статуса оплаты.
-
-    Исключения:
-    stripe.error.StripeError -- Обработчик исключений Stripe для вывода сообщения об ошибке в формате JsonResponse.
+    JsonResponse с информацией о статусе сеанса и состоянии оплаты.
+    JsonResponse с ошибкой 404, если платеж пользователя с таким сеансом не найден.
+    """
+
+    payment = Payment.objects.filter(user=request.user, stripe_payment_id=session_id).only('stripe_status').first()
+
+    if payment is None:
+        return JsonResponse({'error': 'Payment not found'}, status=404)
+
+    if payment.stripe_status == 'expired':
+        session_status = 'expired'
+    elif payment.stripe_status in FINAL_STATUSES:
+        session_status = 'complete'
+    else:
+        session_status = 'open'
+
+    return JsonResponse({
+        'status': session_status,
+        'payment_status': payment.stripe_status,
+        'customer_email': request.user.email,
+    })
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """
+    Принимает события Stripe.
+
+    Проверяется подпись события (STRIPE_WEBHOOK_SECRET), событие один раз записывается в журнал StripeEvent, а
+    события сессий Checkout передаются на обработку задаче process_stripe_event в очереди 'stripe'. Повторная
+    доставка уже полученного события подтверждается без обработки. Без заданного секрета подпись проверить
+    нельзя, поэтому события не принимаются.
+
+    Аргументы:
+    request -- HTTP-запрос Stripe с телом события и заголовком Stripe-Signature.
+
+    Возвращает:
+    JsonResponse со статусом 200 при успешном приеме события.
+    JsonResponse с ошибкой 400 при некорректном теле или подписи.
+    JsonResponse с ошибкой 503, если секрет вебхука не задан.
     """
 
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        return JsonResponse({'error': 'Stripe webhook secret is not configured'}, status=503)
+
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
-        return JsonResponse({
-            'status': session['status'],
-            'payment_status': session['payment_status'],
-            'customer_email': session['customer_email'],
-        })
-    except stripe.error.StripeError as e:
-        return JsonResponse({'error': str(e)}, status=400)
-    finally:
-        payment_id = session['id']
-        payment_status = session['status']
-        payment_line = Payment.objects.all().filter(stripe_payment_id=payment_id).first()
-
-        if payment_line.stripe_status != payment_status:
-            payment_line.stripe_status = payment_status
-            payment_line.save()
+        stripe.Webhook.construct_event(request.body, request.headers.get('Stripe-Signature', ''),
+                                       settings.STRIPE_WEBHOOK_SECRET)
+        payload = json.loads(request.body)
+    except (ValueError, stripe.SignatureVerificationError):
+        return JsonResponse({'error': 'Invalid payload or signature'}, status=400)
+
+    stripe_event = record_stripe_event(payload)
+
+    if stripe_event is not None and stripe_event.type in CHECKOUT_SESSION_EVENTS:
+        transaction.on_commit(lambda: process_stripe_event.delay(stripe_event.pk))
+
+    return JsonResponse({'received': True})
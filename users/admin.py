@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from users.models.import_checkpoint_model import ImportCheckpoint
 from users.models.payment_model import Payment
+from users.models.stripe_event_model import StripeEvent
 from users.models.user_model import CustomUser
+from users.services.search_service import search_users
 
 
 class CustomUserAdmin(UserAdmin):
@@ -15,20 +18,24 @@ class CustomUserAdmin(UserAdmin):
         list_display : tuple
             Список полей, отображаемых в изменяемом списке объектов.
         list_filter : tuple
-            Список полей, по которым производится фильтрация в изменяемом списке объектов.
+            Список полей, по которым производится фильтрация в изменяемом списке объектов. Почта, телефон и город
+            ищутся поиском: фильтр по ним перечислял бы все различные значения таблицы пользователей.
         fieldsets : tuple
             Определяет разделы и поля, отображаемые при просмотре/изменении объекта.
         add_fieldsets : tuple
             Определяет разделы и поля, отображаемые при добавлении нового объекта.
         search_fields : tuple
-            Список полей, по которым будет производиться поиск.
+            Список полей, по которым будет производиться поиск. Условия поиска строит
+            users.services.search_service, чтобы они использовали триграммные индексы.
+        show_full_result_count : bool
+            Не подсчитывать общее количество пользователей при поиске.
         ordering : tuple
             Определяет порядок сортировки объектов в списке.
     """
 
     model = CustomUser
     list_display = ('email', 'phone', 'city', 'is_staff', 'is_active',)
-    list_filter = ('email', 'phone', 'city', 'is_staff', 'is_active',)
+    list_filter = ('is_staff', 'is_active',)
     fieldsets = (
         (None, {'fields': ('email', 'password', 'phone', 'city', 'avatar')}),
         ('Permissions', {'fields': ('is_staff', 'is_active')}),
@@ -40,9 +47,59 @@ class CustomUserAdmin(UserAdmin):
             'fields': ('email', 'password1', 'password2', 'is_staff', 'is_active')}
          ),
     )
-    search_fields = ('email',)
+    search_fields = ('email', 'phone', 'city')
+    show_full_result_count = False
     ordering = ('email',)
 
+    def get_search_results(self, request, queryset, search_term):
+        return search_users(queryset, search_term), False
+
 
 admin.site.register(CustomUser, CustomUserAdmin)
-admin.site.register(Payment)
+
+
+@admin.register(Payment)
+class PaymentAdmin(admin.ModelAdmin):
+    """
+    Интерфейс администратора для платежей. Пользователь загружается вместе со списком (он нужен для __str__).
+    """
+
+    list_display = ('__str__', 'payment_date', 'payment_method', 'stripe_status')
+    list_filter = ('payment_method', 'stripe_status')
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'paid_course', 'paid_lesson')
+    date_hierarchy = 'payment_date'
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    """
+    Интерфейс администратора для журнала событий Stripe (только просмотр).
+    """
+
+    list_display = ('event_id', 'type', 'object_id', 'created', 'received_at', 'processed_at')
+    list_filter = ('type',)
+    search_fields = ('=event_id', '=object_id')
+    readonly_fields = [field.name for field in StripeEvent._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    """
+    Интерфейс администратора для контрольных точек загрузки платежей (просмотр и удаление).
+    """
+
+    list_display = ('name', 'row', 'loaded', 'updated_at')
+    readonly_fields = [field.name for field in ImportCheckpoint._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,64 @@
+import sys
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+from django.core.management import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.models.payment_model import Payment
+from users.services.export_service import EXPORT_FORMATS, export_payments
+
+
+class Command(BaseCommand):
+    help = 'Выгружает платежи потоком в CSV или NDJSON (по умолчанию в stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=list(EXPORT_FORMATS), default='csv',
+                            help='Формат выгрузки')
+        parser.add_argument('--gzip', action='store_true', help='Сжимать выгрузку в gzip')
+        parser.add_argument('--date-from', help='Первый день периода по дате платежа (ГГГГ-ММ-ДД)')
+        parser.add_argument('--date-to', help='Последний день периода по дате платежа (ГГГГ-ММ-ДД)')
+        parser.add_argument('--course', type=int, help='Идентификатор оплаченного курса')
+        parser.add_argument('--method', choices=[choice for choice, _ in Payment.PAYMENT_METHOD_CHOICES],
+                            help='Способ оплаты')
+        parser.add_argument('--output', '-o', default='-', help='Файл выгрузки ("-" - stdout)')
+
+    @staticmethod
+    def start_of_day(value):
+        return timezone.make_aware(datetime.combine(value, dt_time.min))
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from']) if options['date_from'] else None
+            date_to = date.fromisoformat(options['date_to']) if options['date_to'] else None
+        except ValueError as error:
+            raise CommandError(f'Некорректная дата: {error}')
+
+        payments = Payment.objects.all()
+
+        if date_from is not None:
+            payments = payments.filter(payment_date__gte=self.start_of_day(date_from))
+        if date_to is not None:
+            payments = payments.filter(payment_date__lt=self.start_of_day(date_to + timedelta(days=1)))
+        if options['course'] is not None:
+            payments = payments.filter(paid_course_id=options['course'])
+        if options['method'] is not None:
+            payments = payments.filter(payment_method=options['method'])
+
+        started = time.monotonic()
+        size = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+
+        try:
+            for chunk in export_payments(payments, options['export_format'], options['gzip']):
+                output.write(chunk)
+                size += len(chunk)
+        finally:
+            if output is sys.stdout.buffer:
+                output.flush()
+            else:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено {size} байт за {time.monotonic() - started:.2f} с'
+        ))
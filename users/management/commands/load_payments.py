@@ -1,52 +1,66 @@
-from django.core.management import BaseCommand
+import os
 
-from lms.models import Course, Lesson
-from users.models import CustomUser, Payment
+from django.core.management import BaseCommand, CommandError
+
+from users.services.import_service import (IMPORT_BATCH_SIZE, IMPORT_FORMATS, PaymentImportError, PaymentLoader,
+                                           detect_format, open_source, read_checkpoint, read_rows)
+from users.services.revenue_service import schedule_rollup_update
 
 
 class Command(BaseCommand):
-    help = 'Записывает тестовые данные о платежах в базу данных'
+    help = 'Загружает платежи из CSV или NDJSON (файла, файла .gz или stdin) пачками с возобновлением с контрольной точки'
 
-    def handle(self, *args, **kwargs):
-        try:
-            user1 = CustomUser.objects.get(pk=1)
-        except CustomUser.DoesNotExist:
-            user1 = CustomUser.objects.create(pk=1, email='testuser1@example.com', password='testpassword')
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Файл платежей ("-" - stdin)')
+        parser.add_argument('--format', dest='import_format', choices=IMPORT_FORMATS,
+                            help='Формат файла. По умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Размер пачки строк')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Создавать отсутствующих пользователей по user_email')
+        parser.add_argument('--checkpoint',
+                            help='Имя контрольной точки в базе данных. По умолчанию - путь к файлу')
+        parser.add_argument('--resume', action='store_true', help='Продолжить загрузку с контрольной точки')
+        parser.add_argument('--max-errors', type=int, default=1000,
+                            help='Допустимое количество ошибочных строк')
 
-            self.stdout.write(self.style.WARNING('Создан тестовый пользователь с pk=1'))
+    def handle(self, *args, **options):
+        source = options['source']
+        checkpoint = options['checkpoint'] or (os.path.abspath(source) if source != '-' else None)
 
-        try:
-            user2 = CustomUser.objects.get(pk=2)
-        except CustomUser.DoesNotExist:
-            user2 = CustomUser.objects.create(pk=2, email='testuser2@example.com', password='testpassword')
+        if options['resume'] and checkpoint is None:
+            raise CommandError('Для загрузки из stdin с возобновлением укажите --checkpoint')
 
-            self.stdout.write(self.style.WARNING('Создан тестовый пользователь с pk=2'))
+        skip = read_checkpoint(checkpoint) if options['resume'] else 0
+        loader = PaymentLoader(batch_size=options['batch_size'], create_users=options['create_users'],
+                               checkpoint=checkpoint, max_errors=options['max_errors'])
 
-        try:
-            course = Course.objects.get(pk=1)
-        except Course.DoesNotExist:
-            course = Course.objects.create(pk=1, title='Test Course', description='This is a test course.')
+        if skip:
+            self.stdout.write(self.style.WARNING(f'Продолжение загрузки после строки {skip}'))
 
-            self.stdout.write(self.style.WARNING('Создан тестовый курс с pk=1'))
+        def on_batch(row, metrics):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Строка {row}: загружено {metrics["loaded"]}, {metrics["rate"]:.0f} строк/с')
 
         try:
-            lesson = Lesson.objects.get(pk=1)
-        except Lesson.DoesNotExist:
-            lesson = Lesson.objects.create(pk=1, title='Test Lesson', content='This is a test lesson.')
-            self.stdout.write(self.style.WARNING('Создан тестовый урок с pk=1'))
-
-        Payment.objects.create(
-            user=user1,
-            paid_course=course,
-            amount=199.99,
-            payment_method='CASH'
-        )
-
-        Payment.objects.create(
-            user=user2,
-            paid_lesson=lesson,
-            amount=29.99,
-            payment_method='TRANSFER'
-        )
-
-        self.stdout.write(self.style.SUCCESS('Успешно записаны данные о платежах'))
+            with open_source(source) as stream:
+                rows = read_rows(stream, options['import_format'] or detect_format(source))
+                metrics = loader.load(rows, skip=skip, on_batch=on_batch)
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {source}: {error}')
+        except PaymentImportError as error:
+            self.report_errors(loader)
+            raise CommandError(f'Загрузка прервана: {error}')
+
+        self.report_errors(loader)
+
+        if metrics['loaded']:
+            schedule_rollup_update()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено платежей: {metrics["loaded"]} за {metrics["duration"]:.2f} с '
+            f'({metrics["rate"]:.0f} строк/с), ошибок: {metrics["errors"]}'
+        ))
+
+    def report_errors(self, loader):
+        for number, message in loader.errors:
+            self.stderr.write(f'Строка {number}: {message}')
@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management import BaseCommand, CommandError
+
+from users.services.revenue_service import ROLLUP_BATCH_SIZE, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводку выручки (PaymentRollup) по таблице платежей за период'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='Первый день периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--date-to', help='Последний день периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE, help='Размер пачки платежей')
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from']) if options['date_from'] else None
+            date_to = date.fromisoformat(options['date_to']) if options['date_to'] else None
+        except ValueError as error:
+            raise CommandError(f'Некорректная дата: {error}')
+
+        metrics = rebuild_rollups(date_from, date_to, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Учтено платежей: {metrics["payments"]} в {metrics["batches"]} пачках за {metrics["duration"]:.2f} с'
+        ))
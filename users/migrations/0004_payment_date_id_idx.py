@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:31
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('lms', '0008_course_updated_at_id_idx'),
+        ('users', '0003_payment_stripe_payment_id_payment_stripe_status'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+        ),
+    ]
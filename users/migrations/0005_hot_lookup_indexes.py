@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:43
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('lms', '0011_hot_lookup_indexes'),
+        ('users', '0004_payment_date_id_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_login'], name='user_active_last_login_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['stripe_payment_id'], name='payment_stripe_payment_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['user', 'payment_date'], name='payment_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True, verbose_name='id события')),
+                ('type', models.CharField(max_length=100, verbose_name='тип события')),
+                ('object_id', models.CharField(blank=True, max_length=255, verbose_name='id объекта')),
+                ('payload', models.JSONField(verbose_name='тело события')),
+                ('created', models.DateTimeField(verbose_name='время создания в Stripe')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='время получения')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='время обработки')),
+            ],
+            options={
+                'verbose_name': 'событие Stripe',
+                'verbose_name_plural': 'события Stripe',
+                'indexes': [models.Index(fields=['object_id'], name='stripe_event_object_id_idx'), models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['received_at'], name='stripe_event_unprocessed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.14 on 2026-10-18 10:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0011_hot_lookup_indexes'),
+        ('users', '0006_stripeevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('payment_method', models.CharField(max_length=10, verbose_name='способ оплаты')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='сумма')),
+                ('payment_count', models.PositiveIntegerField(default=0, verbose_name='количество платежей')),
+            ],
+            options={
+                'verbose_name': 'сводка выручки',
+                'verbose_name_plural': 'сводки выручки',
+            },
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='rolled_up',
+            field=models.BooleanField(default=False, verbose_name='учтен в сводке выручки'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='время зачисления'),
+        ),
+        migrations.AddField(
+            model_name='paymentrollup',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_rollups', to='lms.course', verbose_name='курс'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'course', 'payment_method'), name='unique_payment_rollup'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('lms', '0011_hot_lookup_indexes'),
+        ('users', '0007_payment_rollups'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(fields=['user', 'payment_date', 'id'], name='payment_user_date_id_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='payment',
+            name='payment_user_date_idx',
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.14 on 2026-10-18 11:27
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0008_payment_user_date_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='customuser',
+            index=GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='user_email_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='customuser',
+            index=GinIndex(OpClass('phone', name='gin_trgm_ops'), name='user_phone_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='customuser',
+            index=GinIndex(OpClass(Upper('city'), name='gin_trgm_ops'), name='user_city_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='customuser',
+            index=models.Index(OpClass(Upper('email'), name='text_pattern_ops'), name='user_email_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0009_user_search_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('rolled_up', False), ('settled_at__isnull', False)), fields=['settled_at'], name='payment_rollup_pending_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='paymentrollup',
+            index=models.Index(fields=['course', 'day'], name='payment_rollup_course_day_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_payment_rollup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='имя')),
+                ('row', models.PositiveBigIntegerField(default=0, verbose_name='последняя строка')),
+                ('loaded', models.PositiveBigIntegerField(default=0, verbose_name='загружено платежей')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='время обновления')),
+            ],
+            options={
+                'verbose_name': 'контрольная точка загрузки',
+                'verbose_name_plural': 'контрольные точки загрузки',
+            },
+        ),
+    ]
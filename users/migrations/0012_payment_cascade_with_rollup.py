@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:18
+
+import users.models.payment_model
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lms', '0012_search_vector'),
+        ('users', '0011_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='paid_course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=users.models.payment_model.cascade_with_rollup, related_name='payments', to='lms.course'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='paid_lesson',
+            field=models.ForeignKey(blank=True, null=True, on_delete=users.models.payment_model.cascade_with_rollup, related_name='payments', to='lms.lesson'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='user',
+            field=models.ForeignKey(on_delete=users.models.payment_model.cascade_with_rollup, related_name='payments', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
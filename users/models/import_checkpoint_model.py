@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Модель ImportCheckpoint (Контрольная точка загрузки).
+
+    Хранит номер последней загруженной строки пакетной загрузки платежей (users.services.import_service). Запись
+    обновляется в той же транзакции, что и вставка пачки, поэтому после сбоя загрузка продолжается ровно со
+    следующей незагруженной строки.
+
+    Поля:
+    -----
+    name : CharField
+        Имя контрольной точки, по умолчанию - путь к загружаемому файлу. Уникально.
+    row : PositiveBigIntegerField
+        Номер последней обработанной строки данных.
+    loaded : PositiveBigIntegerField
+        Количество платежей, загруженных с начала загрузки.
+    updated_at : DateTimeField
+        Время последнего обновления.
+    """
+
+    name = models.CharField(max_length=255, unique=True, verbose_name='имя')
+    row = models.PositiveBigIntegerField(default=0, verbose_name='последняя строка')
+    loaded = models.PositiveBigIntegerField(default=0, verbose_name='загружено платежей')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='время обновления')
+
+    def __str__(self):
+        return f'{self.name}: {self.row}'
+
+    class Meta:
+        verbose_name = 'контрольная точка загрузки'
+        verbose_name_plural = 'контрольные точки загрузки'
@@ -1,10 +1,41 @@
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 from lms.models import Course, Lesson
 from users.models.user_model import CustomUser
 
 
+def cascade_with_rollup(collector, field, sub_objs, using):
+    """
+    Каскадное удаление платежей (on_delete) при удалении пользователя, курса или урока.
+
+    Перед каскадом учтенные платежи одним запросом вычитаются из сводки выручки (revenue_service.retract_payments),
+    после чего платежи удаляются одним DELETE без загрузки в память. Если удаление родительской записи выполняется
+    вне транзакции, вычет фиксируется отдельно, и расхождения сводки устраняет пересчет (rebuild_rollups).
+    """
+
+    from users.services.revenue_service import retract_payments
+
+    retract_payments(sub_objs)
+    models.CASCADE(collector, field, sub_objs, using)
+
+
+class PaymentQuerySet(models.QuerySet):
+    """
+    Набор запросов платежей.
+
+    Массовое удаление вычитает учтенные платежи из сводки выручки один раз для всего набора, а не по одному платежу.
+    """
+
+    def delete(self):
+        from users.services.revenue_service import retract_payments
+
+        with transaction.atomic(using=self.db):
+            retract_payments(self)
+            return super().delete()
+
+
 class Payment(models.Model):
     """
     Модель Payment (Платеж).
@@ -27,11 +58,17 @@ class Payment(models.Model):
         Идентификатор транзакции в Stripe. Может быть пустым.
     stripe_status : CharField
         Статус транзакции в Stripe. Может быть пустым.
+    settled_at : DateTimeField, optional
+        Время зачисления оплаты: создания платежа наличными или перехода транзакции Stripe в оплаченный статус.
+    rolled_up : BooleanField
+        Учтен ли платеж в сводной таблице выручки (PaymentRollup).
 
     Методы:
     -------
     __str__():
         Возвращает строковое представление платежа.
+    delete():
+        Удаляет платеж, вычитая его из сводки выручки в той же транзакции.
 
     Классы Meta:
     ------------
@@ -39,21 +76,32 @@ class Payment(models.Model):
         Человекочитаемое название модели в единственном числе.
     verbose_name_plural : str
         Человекочитаемое название модели во множественном числе.
+    indexes : list
+        Индексы (payment_date, id) для курсорной пагинации и фильтра по дате, stripe_payment_id для поиска по сессии
+        Stripe, (user, payment_date, id) для истории платежей пользователя и частичный индекс зачисленных платежей,
+        еще не учтенных в сводной таблице выручки.
     """
 
     PAYMENT_METHOD_CHOICES = [
         ('CASH', 'Наличные'),
         ('TRANSFER', 'Перевод на счет'),
     ]
+    PAID_STATUSES = ('paid', 'no_payment_required')
 
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="payments")
+    user = models.ForeignKey(CustomUser, on_delete=cascade_with_rollup, related_name="payments")
     payment_date = models.DateTimeField(auto_now_add=True)
-    paid_course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name="payments")
-    paid_lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, null=True, blank=True, related_name="payments")
+    paid_course = models.ForeignKey(Course, on_delete=cascade_with_rollup, null=True, blank=True,
+                                    related_name="payments")
+    paid_lesson = models.ForeignKey(Lesson, on_delete=cascade_with_rollup, null=True, blank=True,
+                                    related_name="payments")
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHOD_CHOICES)
     stripe_payment_id = models.CharField(max_length=255, null=True, blank=True, verbose_name="id транзакции")
     stripe_status = models.CharField(max_length=20, null=True, verbose_name="статус транзакции")
+    settled_at = models.DateTimeField(null=True, blank=True, verbose_name="время зачисления")
+    rolled_up = models.BooleanField(default=False, verbose_name="учтен в сводке выручки")
+
+    objects = PaymentQuerySet.as_manager()
 
     def __str__(self):
         return f"Платеж от {self.user.email} на сумму {self.amount}"
@@ -70,17 +118,54 @@ class Payment(models.Model):
             raise ValidationError("Поля 'stripe_payment_id' и 'stripe_status' должны быть заполнены, если метод оплаты "
                                   "'TRANSFER'.")
 
+    @property
+    def is_settled(self):
+        """
+        Возвращает True, если оплата зачислена: платеж наличными или оплаченная транзакция Stripe.
+        """
+
+        return self.payment_method == 'CASH' or self.stripe_status in self.PAID_STATUSES
+
     def save(self, *args, **kwargs):
         """
         Сохраняет запись в базу данных.
 
-        Перед сохранением проверяет запись с помощью clean().
+        Перед сохранением проверяет запись с помощью clean() и отмечает время зачисления оплаты (или снимает его,
+        если оплата больше не зачислена). Если изменился уже учтенный в сводке выручки платеж, его прежний вклад
+        вычитается из сводки в той же транзакции (см. revenue_service.retract_changed_payment).
         """
 
+        from users.services.revenue_service import retract_changed_payment
+
         self.clean()
 
-        super().save(*args, **kwargs)
+        if not self.is_settled:
+            self.settled_at = None
+        elif self.settled_at is None:
+            self.settled_at = timezone.now()
+
+        with transaction.atomic():
+            retract_changed_payment(self)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """
+        Удаляет запись из базы данных, вычитая учтенный платеж из сводки выручки в той же транзакции.
+        """
+
+        from users.services.revenue_service import retract_payments
+
+        with transaction.atomic():
+            retract_payments(Payment.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
 
     class Meta:
         verbose_name = 'платеж'
         verbose_name_plural = 'платежи'
+        indexes = [
+            models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+            models.Index(fields=['stripe_payment_id'], name='payment_stripe_payment_id_idx'),
+            models.Index(fields=['user', 'payment_date', 'id'], name='payment_user_date_id_idx'),
+            models.Index(fields=['settled_at'], condition=models.Q(settled_at__isnull=False, rolled_up=False),
+                         name='payment_rollup_pending_idx'),
+        ]
@@ -0,0 +1,52 @@
+from django.db import models
+
+from lms.models import Course
+
+
+class PaymentRollup(models.Model):
+    """
+    Модель PaymentRollup (Сводка выручки).
+
+    Сводная таблица зачисленных платежей по дням, курсам и способам оплаты. Обновляется инкрементально
+    (users.services.revenue_service) и позволяет строить аналитику без чтения таблицы платежей.
+
+    Поля:
+    -----
+    day : DateField
+        День зачисления оплаты.
+    course : ForeignKey
+        Курс, за который получена оплата (для оплаты урока - курс урока).
+    payment_method : CharField
+        Способ оплаты.
+    amount : DecimalField
+        Сумма зачисленных платежей.
+    payment_count : PositiveIntegerField
+        Количество зачисленных платежей.
+
+    Классы Meta:
+    ------------
+    constraints : list
+        Уникальность строки сводки для дня, курса и способа оплаты.
+    indexes : list
+        Индекс (course, day) для аналитики по курсу и его владельцу.
+    """
+
+    day = models.DateField(verbose_name='день')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='payment_rollups',
+                               verbose_name='курс')
+    payment_method = models.CharField(max_length=10, verbose_name='способ оплаты')
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='сумма')
+    payment_count = models.PositiveIntegerField(default=0, verbose_name='количество платежей')
+
+    def __str__(self):
+        return f'{self.day} {self.course_id} {self.payment_method}: {self.amount}'
+
+    class Meta:
+        verbose_name = 'сводка выручки'
+        verbose_name_plural = 'сводки выручки'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'course', 'payment_method'], name='unique_payment_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['course', 'day'], name='payment_rollup_course_day_idx'),
+        ]
@@ -0,0 +1,53 @@
+from django.db import models
+
+
+class StripeEvent(models.Model):
+    """
+    Модель StripeEvent (Событие Stripe).
+
+    Журнал событий, полученных через вебхук Stripe. Записи только добавляются: каждое событие сохраняется один раз
+    (повторная доставка того же события отбрасывается уникальным индексом по event_id), а после применения к
+    платежу отмечается время обработки.
+
+    Поля:
+    -----
+    event_id : CharField
+        Идентификатор события в Stripe (evt_...). Уникален.
+    type : CharField
+        Тип события, например 'checkout.session.completed'.
+    object_id : CharField
+        Идентификатор объекта события, для сессий Checkout совпадает с Payment.stripe_payment_id.
+    payload : JSONField
+        Тело события.
+    created : DateTimeField
+        Время создания события в Stripe.
+    received_at : DateTimeField
+        Время получения события.
+    processed_at : DateTimeField, optional
+        Время применения события к платежу. Пусто, пока событие не обработано.
+
+    Классы Meta:
+    ------------
+    indexes : list
+        Индекс по object_id для поиска событий сессии и частичный индекс необработанных событий.
+    """
+
+    event_id = models.CharField(max_length=255, unique=True, verbose_name='id события')
+    type = models.CharField(max_length=100, verbose_name='тип события')
+    object_id = models.CharField(max_length=255, blank=True, verbose_name='id объекта')
+    payload = models.JSONField(verbose_name='тело события')
+    created = models.DateTimeField(verbose_name='время создания в Stripe')
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='время получения')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='время обработки')
+
+    def __str__(self):
+        return f'{self.type} ({self.event_id})'
+
+    class Meta:
+        verbose_name = 'событие Stripe'
+        verbose_name_plural = 'события Stripe'
+        indexes = [
+            models.Index(fields=['object_id'], name='stripe_event_object_id_idx'),
+            models.Index(fields=['received_at'], condition=models.Q(processed_at__isnull=True),
+                         name='stripe_event_unprocessed_idx'),
+        ]
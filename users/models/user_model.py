@@ -2,7 +2,9 @@ from django.apps import apps
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class UserManager(BaseUserManager):
@@ -116,6 +118,10 @@ class CustomUser(AbstractUser):
             Человекочитаемое имя модели в единственном числе.
         verbose_name_plural : str
             Человекочитаемое имя модели во множественном числе.
+        indexes : list
+            Частичный индекс last_login по активным пользователям для задачи деактивации, триграммные индексы GIN
+            по UPPER(email), phone и UPPER(city) для поиска по подстроке и индекс text_pattern_ops по UPPER(email)
+            для поиска по началу адреса (см. users.services.search_service).
 
     Специальные атрибуты:
         USERNAME_FIELD : str
@@ -145,3 +151,11 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = 'пользователь'
         verbose_name_plural = 'пользователи'
+        indexes = [
+            models.Index(fields=['last_login'], condition=models.Q(is_active=True),
+                         name='user_active_last_login_idx'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='user_email_trgm_idx'),
+            GinIndex(OpClass('phone', name='gin_trgm_ops'), name='user_phone_trgm_idx'),
+            GinIndex(OpClass(Upper('city'), name='gin_trgm_ops'), name='user_city_trgm_idx'),
+            models.Index(OpClass(Upper('email'), name='text_pattern_ops'), name='user_email_prefix_idx'),
+        ]
@@ -1,11 +1,14 @@
 from rest_framework.permissions import BasePermission
 
+from users.services.role_service import is_moderator
+
 
 class IsModerator(BasePermission):
     """
     Разрешение, предоставляющее доступ только модераторам.
 
-    Пользователь должен состоять в группе 'Модераторы', чтобы иметь это разрешение.
+    Пользователь должен состоять в группе 'Модераторы', чтобы иметь это разрешение. Роли берутся из кэша
+    (users.services.role_service), поэтому проверка не выполняет запросов к базе данных.
 
     Методы:
         has_permission(request, view): Проверяет, что пользователь находится в группе 'Модераторы'.
@@ -23,7 +26,7 @@ class IsModerator(BasePermission):
             bool: True, если пользователь состоит в группе 'Модераторы', иначе False.
         """
 
-        return request.user.groups.filter(name='Модераторы').exists()
+        return is_moderator(request.user)
 
 
 class IsOwner(BasePermission):
@@ -47,4 +50,29 @@ class IsOwner(BasePermission):
             bool: True, если пользователь является владельцем объекта, иначе False.
         """
 
-        return obj.owner == request.user
+        return obj.owner_id == request.user.pk
+
+
+class IsProfileOwnerOrModerator(BasePermission):
+    """
+    Разрешение на доступ к вложенным ресурсам профиля (например, истории платежей): только самому пользователю
+    профиля и модераторам.
+
+    Методы:
+        has_permission(request, view): Проверяет, что профиль из адреса (pk) принадлежит пользователю или
+                                       пользователь является модератором.
+    """
+
+    def has_permission(self, request, view):
+        """
+        Проверяет, что пользователь имеет разрешение для доступа к представлению.
+
+        Аргументы:
+            request: Объект запроса DRF.
+            view: Представление, для которого определяется разрешение.
+
+        Возвращаемое значение:
+            bool: True, если профиль принадлежит пользователю или пользователь - модератор, иначе False.
+        """
+
+        return view.kwargs.get('pk') == request.user.pk or is_moderator(request.user)
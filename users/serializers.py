@@ -2,6 +2,9 @@ from rest_framework import serializers
 
 from users.models.user_model import CustomUser
 from users.models.payment_model import Payment
+from users.services.export_service import EXPORT_FORMATS
+from users.services.profile_service import get_payment_summary
+from users.services.search_service import SEARCH_MAX_LENGTH
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -10,16 +13,82 @@ class PaymentSerializer(serializers.ModelSerializer):
 
     Этот сериализатор преобразует объекты модели Payment в формат JSON и обратно для использования в API.
 
+    Атрибуты:
+        user_email, course_title, lesson_title : ReadOnlyField
+            Данные связанных объектов. Чтобы не выполнять запрос на каждый платеж, связанные объекты должны быть
+            загружены через select_related (см. PaymentViewSet.get_queryset).
+
     Класс Meta:
         model : Model
             Модель, используемая для сериализации (Payment).
-        fields : str
-            Поля модели, которые будут включены в сериализацию ('__all__' означает, что все поля будут включены).
+        fields : list
+            Поля, которые будут включены в сериализацию. Служебные поля сводки выручки не включаются.
+        read_only_fields : list
+            Поля, которые нельзя изменить через API: плательщик, сумма и данные транзакции Stripe.
     """
 
+    user_email = serializers.ReadOnlyField(source='user.email')
+    course_title = serializers.ReadOnlyField(source='paid_course.title')
+    lesson_title = serializers.ReadOnlyField(source='paid_lesson.title')
+
     class Meta:
         model = Payment
-        fields = '__all__'
+        fields = ['id', 'user', 'user_email', 'payment_date', 'paid_course', 'course_title', 'paid_lesson',
+                  'lesson_title', 'amount', 'payment_method', 'stripe_payment_id', 'stripe_status']
+        read_only_fields = ['user', 'amount', 'stripe_payment_id', 'stripe_status']
+
+
+class PaymentAnalyticsQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров запроса аналитики платежей.
+
+    Атрибуты:
+        date_from, date_to : DateField
+            Период (включительно) по дню зачисления оплаты.
+        course, owner : IntegerField
+            Фильтры по курсу и владельцу курса.
+        payment_method : ChoiceField
+            Фильтр по способу оплаты.
+        interval : ChoiceField
+            Шаг временного ряда.
+        group_by : ChoiceField
+            Разбивка итогов.
+    """
+
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    course = serializers.IntegerField(required=False, min_value=1)
+    owner = serializers.IntegerField(required=False, min_value=1)
+    payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHOD_CHOICES, required=False)
+    interval = serializers.ChoiceField(choices=['day', 'week', 'month'], default='day')
+    group_by = serializers.ChoiceField(choices=['course', 'owner', 'payment_method'], required=False)
+
+
+class PaymentExportQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров выгрузки платежей (фильтры задаются параметрами списка платежей).
+
+    Атрибуты:
+        export_format : ChoiceField
+            Формат выгрузки: csv или ndjson.
+        gzip : BooleanField
+            Сжимать выгрузку в gzip.
+    """
+
+    export_format = serializers.ChoiceField(choices=list(EXPORT_FORMATS), default='csv')
+    gzip = serializers.BooleanField(default=False)
+
+
+class UserSearchQuerySerializer(serializers.Serializer):
+    """
+    Сериализатор параметров поиска пользователей.
+
+    Атрибуты:
+        search : CharField
+            Часть почты, телефона или города (см. users.services.search_service).
+    """
+
+    search = serializers.CharField(required=False, allow_blank=True, max_length=SEARCH_MAX_LENGTH)
 
 
 class PublicUserProfileSerializer(serializers.ModelSerializer):
@@ -34,15 +103,28 @@ class PublicUserProfileSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     """
     Сериализатор для профиля пользователя.
+
+    Вместо истории платежей профиль содержит сводку зачисленных платежей: количество, сумму и дату последнего
+    платежа. Сводка берется из полей, добавленных запросом (users.services.profile_service.annotate_payment_summary),
+    а для отдельного пользователя вычисляется одним запросом. История платежей доступна постранично по адресу
+    /api/users/profile/<id>/payments/.
     """
 
-    payment_history = PaymentSerializer(many=True, read_only=True, source='payments')
+    payment_count = serializers.IntegerField(read_only=True)
+    total_spent = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    last_payment_date = serializers.DateTimeField(read_only=True)
 
     class Meta:
         model = CustomUser
-        fields = ['email', 'password', 'phone', 'city', 'avatar', 'payment_history']
+        fields = ['id', 'email', 'password', 'phone', 'city', 'avatar', 'payment_count', 'total_spent',
+                  'last_payment_date']
         extra_kwargs = {'password': {'write_only': True}}
 
+    def to_representation(self, instance):
+        get_payment_summary(instance)
+
+        return super().to_representation(instance)
+
     def create(self, validated_data):
         user = CustomUser.objects.create_user(
             email=validated_data['email'],
@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_FIELDS = (
+    ('id', 'id'),
+    ('payment_date', 'payment_date'),
+    ('user_id', 'user_id'),
+    ('user_email', 'user__email'),
+    ('course_id', 'paid_course_id'),
+    ('lesson_id', 'paid_lesson_id'),
+    ('amount', 'amount'),
+    ('payment_method', 'payment_method'),
+    ('stripe_payment_id', 'stripe_payment_id'),
+    ('stripe_status', 'stripe_status'),
+    ('settled_at', 'settled_at'),
+)
+
+
+def get_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Возвращает итератор строк выгрузки платежей в порядке id.
+
+    Строки читаются через iterator(): в PostgreSQL это серверный курсор, из которого строки забираются пачками по
+    chunk_size, поэтому память процесса не зависит от размера выгрузки.
+
+    Аргументы:
+    - queryset (QuerySet): Отфильтрованные платежи.
+    - chunk_size (int): Количество строк, забираемых из курсора за раз.
+
+    Возвращает:
+    - Iterator[tuple]: Значения полей EXPORT_FIELDS.
+    """
+
+    return (
+        queryset.order_by('id').values_list(*(lookup for _, lookup in EXPORT_FIELDS))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def iter_csv(rows):
+    """
+    Преобразует строки выгрузки в CSV, отдавая данные блоками около EXPORT_BUFFER_SIZE символов.
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_FIELDS])
+
+    for row in rows:
+        writer.writerow(row)
+
+        if buffer.tell() >= EXPORT_BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    """
+    Преобразует строки выгрузки в NDJSON (один объект JSON в строке), отдавая данные блоками.
+    """
+
+    headers = [header for header, _ in EXPORT_FIELDS]
+    chunk = []
+    size = 0
+
+    for row in rows:
+        line = json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        chunk.append(line)
+        size += len(line)
+
+        if size >= EXPORT_BUFFER_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+
+    yield ''.join(chunk)
+
+
+def iter_gzip(chunks):
+    """
+    Сжимает поток байтов в формат gzip на лету.
+
+    После каждого блока выполняется Z_SYNC_FLUSH, чтобы получатель сразу получал сжатые данные, а не ждал
+    заполнения внутреннего буфера компрессора.
+    """
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+def export_payments(queryset, export_format='csv', compress=False):
+    """
+    Возвращает поток байтов выгрузки платежей.
+
+    Аргументы:
+    - queryset (QuerySet): Отфильтрованные платежи.
+    - export_format (str): Формат: 'csv' или 'ndjson'.
+    - compress (bool): Сжимать выгрузку в gzip.
+
+    Возвращает:
+    - Iterator[bytes]: Блоки выгрузки.
+    """
+
+    serialize = iter_csv if export_format == 'csv' else iter_ndjson
+    chunks = (chunk.encode('utf-8') for chunk in serialize(get_export_rows(queryset)))
+
+    return iter_gzip(chunks) if compress else chunks
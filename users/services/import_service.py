@@ -0,0 +1,349 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from lms.models import Course, Lesson
+from users.models.import_checkpoint_model import ImportCheckpoint
+from users.models.payment_model import Payment
+from users.models.user_model import CustomUser
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_FORMATS = ('csv', 'ndjson')
+PAYMENT_COLUMNS = ('user', 'payment_date', 'paid_course', 'paid_lesson', 'amount', 'payment_method',
+                   'stripe_payment_id', 'stripe_status', 'settled_at', 'rolled_up')
+PAYMENT_METHODS = {choice for choice, _ in Payment.PAYMENT_METHOD_CHOICES}
+MAX_AMOUNT = Decimal(10) ** 8
+
+
+class PaymentImportError(ValueError):
+    """
+    Ошибка проверки строки загружаемых платежей.
+    """
+
+
+def detect_format(path):
+    """
+    Определяет формат файла платежей по расширению (без учета .gz): '.ndjson' и '.jsonl' - NDJSON, иначе CSV.
+    """
+
+    name = path.removesuffix('.gz')
+
+    return 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def open_source(path):
+    """
+    Открывает файл платежей на чтение в текстовом режиме. '-' - стандартный ввод, файлы .gz распаковываются на лету.
+    """
+
+    if path == '-':
+        return open(sys.stdin.fileno(), encoding='utf-8', newline='', closefd=False)
+
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(stream, import_format='csv'):
+    """
+    Читает строки платежей из потока.
+
+    Аргументы:
+    - stream (TextIO): Поток CSV с заголовком или NDJSON.
+    - import_format (str): Формат: 'csv' или 'ndjson'.
+
+    Возвращает:
+    - Iterator[tuple[int, dict]]: Номер строки данных (с 1) и ее значения по именам колонок.
+    """
+
+    if import_format == 'csv':
+        yield from enumerate(csv.DictReader(stream), start=1)
+        return
+
+    number = 0
+
+    for line in stream:
+        if not line.strip():
+            continue
+
+        number += 1
+
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as error:
+            yield number, error
+
+
+def read_checkpoint(name):
+    """
+    Возвращает номер последней загруженной строки из контрольной точки или 0, если ее нет.
+    """
+
+    return ImportCheckpoint.objects.filter(name=name).values_list('row', flat=True).first() or 0
+
+
+def write_checkpoint(name, row, loaded):
+    """
+    Записывает контрольную точку: номер последней загруженной строки и количество загруженных платежей.
+
+    Вызывается в транзакции вставки пачки (см. PaymentLoader.load_batch).
+    """
+
+    ImportCheckpoint.objects.update_or_create(name=name, defaults={'row': row, 'loaded': loaded})
+
+
+class PaymentLoader:
+    """
+    Пакетный загрузчик платежей.
+
+    Строки загружаются пачками: пользователи пачки ищутся одним запросом (найденные запоминаются в памяти), курсы и
+    уроки проверяются по множествам идентификаторов, загруженным один раз, а проверенные строки вставляются одной
+    командой COPY с датами из загружаемых данных. Каждая пачка загружается в отдельной транзакции вместе с
+    обновлением контрольной точки (если она задана), поэтому пачка не может быть загружена дважды.
+
+    Колонки строки совпадают с колонками выгрузки export_payments: user_id или user_email, course_id, lesson_id,
+    payment_date, amount, payment_method, stripe_payment_id, stripe_status и необязательная settled_at. Колонка
+    id игнорируется.
+
+    Атрибуты:
+        batch_size (int): Количество строк в пачке.
+        create_users (bool): Создавать пользователей, которых нет в базе, по user_email (без пароля).
+        checkpoint (str | None): Имя контрольной точки (ImportCheckpoint), None - без контрольной точки.
+        max_errors (int | None): Допустимое количество ошибочных строк; при превышении загрузка прерывается.
+        errors (list[tuple[int, str]]): Номера ошибочных строк и описания ошибок.
+        loaded (int): Количество загруженных платежей.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, create_users=False, checkpoint=None, max_errors=None):
+        self.batch_size = batch_size
+        self.create_users = create_users
+        self.checkpoint = checkpoint
+        self.max_errors = max_errors
+        self.errors = []
+        self.loaded = 0
+        self.user_ids = set()
+        self.users_by_email = {}
+        self.course_ids = set(Course.objects.values_list('pk', flat=True))
+        self.lesson_ids = set(Lesson.objects.values_list('pk', flat=True))
+
+    def resolve_users(self, rows):
+        """
+        Загружает в память пользователей, на которых ссылаются строки пачки и которые еще не известны загрузчику.
+        """
+
+        emails = {CustomUser.objects.normalize_email(row['user_email']) for _, row in rows
+                  if isinstance(row, dict) and row.get('user_email')} - self.users_by_email.keys()
+        user_ids = {str(row['user_id']) for _, row in rows
+                    if isinstance(row, dict) and row.get('user_id') and not row.get('user_email')}
+        user_ids = {int(pk) for pk in user_ids if pk.isdigit()} - self.user_ids
+
+        if emails:
+            self.users_by_email.update(CustomUser.objects.filter(email__in=emails).values_list('email', 'pk'))
+            missing = emails - self.users_by_email.keys()
+
+            if missing and self.create_users:
+                password = make_password(None)
+                CustomUser.objects.bulk_create([CustomUser(email=email, password=password) for email in missing],
+                                               batch_size=self.batch_size, ignore_conflicts=True)
+                self.users_by_email.update(CustomUser.objects.filter(email__in=missing).values_list('email', 'pk'))
+
+        if user_ids:
+            self.user_ids.update(CustomUser.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+
+    def get_user_id(self, row):
+        if row.get('user_email'):
+            email = CustomUser.objects.normalize_email(row['user_email'])
+
+            if email not in self.users_by_email:
+                raise PaymentImportError(f'пользователь {email} не найден')
+
+            return self.users_by_email[email]
+
+        try:
+            user_id = int(row.get('user_id') or 0)
+        except ValueError:
+            user_id = 0
+
+        if user_id not in self.user_ids:
+            raise PaymentImportError(f'пользователь {row.get("user_id")!r} не найден')
+
+        return user_id
+
+    @staticmethod
+    def get_reference(row, column, known_ids):
+        value = row.get(column)
+
+        if value in (None, ''):
+            return None
+
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise PaymentImportError(f'некорректное значение {column}: {value!r}')
+
+        if value not in known_ids:
+            raise PaymentImportError(f'{column} {value} не найден')
+
+        return value
+
+    @staticmethod
+    def get_datetime(row, column, required=False):
+        value = row.get(column)
+
+        if value in (None, ''):
+            if required:
+                raise PaymentImportError(f'не заполнено поле {column}')
+            return None
+
+        parsed = parse_datetime(str(value))
+
+        if parsed is None:
+            raise PaymentImportError(f'некорректная дата {column}: {value!r}')
+
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+    def build(self, row):
+        """
+        Проверяет строку и возвращает значения колонок PAYMENT_COLUMNS.
+
+        Исключения:
+        - PaymentImportError: Если строка не прошла проверку.
+        """
+
+        if not isinstance(row, dict):
+            raise PaymentImportError(f'некорректная строка: {row}')
+
+        try:
+            amount = Decimal(str(row.get('amount'))).quantize(Decimal('0.01'))
+            valid_amount = abs(amount) < MAX_AMOUNT
+        except InvalidOperation:
+            valid_amount = False
+
+        if not valid_amount:
+            raise PaymentImportError(f'некорректная сумма: {row.get("amount")!r}')
+
+        payment = Payment(payment_method=row.get('payment_method'),
+                          stripe_payment_id=row.get('stripe_payment_id') or None,
+                          stripe_status=row.get('stripe_status') or None)
+
+        if payment.payment_method not in PAYMENT_METHODS:
+            raise PaymentImportError(f'некорректный способ оплаты: {payment.payment_method!r}')
+        if payment.payment_method == 'TRANSFER' and not payment.stripe_payment_id and not payment.stripe_status:
+            raise PaymentImportError('для перевода должны быть заполнены stripe_payment_id или stripe_status')
+        if len(payment.stripe_payment_id or '') > 255 or len(payment.stripe_status or '') > 20:
+            raise PaymentImportError('слишком длинные stripe_payment_id или stripe_status')
+
+        payment_date = self.get_datetime(row, 'payment_date', required=True)
+        settled_at = self.get_datetime(row, 'settled_at')
+
+        if settled_at is None and payment.is_settled:
+            settled_at = payment_date
+
+        return (self.get_user_id(row), payment_date, self.get_reference(row, 'course_id', self.course_ids),
+                self.get_reference(row, 'lesson_id', self.lesson_ids), amount, payment.payment_method,
+                payment.stripe_payment_id, payment.stripe_status, settled_at, False)
+
+    def insert(self, values):
+        """
+        Вставляет строки одной командой COPY.
+        """
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(values)
+        buffer.seek(0)
+        columns = ', '.join(connection.ops.quote_name(Payment._meta.get_field(name).column) for name in PAYMENT_COLUMNS)
+
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(Payment._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+
+    def load_batch(self, rows):
+        """
+        Проверяет и загружает пачку строк и обновляет контрольную точку в одной транзакции.
+
+        Аргументы:
+        - rows (list[tuple[int, dict]]): Номера и значения строк.
+
+        Возвращает:
+        - int: Количество загруженных платежей.
+        """
+
+        self.resolve_users(rows)
+        values = []
+
+        for number, row in rows:
+            try:
+                values.append(self.build(row))
+            except PaymentImportError as error:
+                self.errors.append((number, str(error)))
+
+        if self.max_errors is not None and len(self.errors) > self.max_errors:
+            raise PaymentImportError(f'превышено допустимое количество ошибок ({self.max_errors})')
+
+        with transaction.atomic():
+            if values:
+                self.insert(values)
+
+            if self.checkpoint is not None:
+                write_checkpoint(self.checkpoint, rows[-1][0], self.loaded + len(values))
+
+        self.loaded += len(values)
+
+        return len(values)
+
+    def load(self, rows, skip=0, on_batch=None):
+        """
+        Загружает строки пачками.
+
+        Аргументы:
+        - rows (Iterable[tuple[int, dict]]): Номера и значения строк (см. read_rows).
+        - skip (int): Номер последней строки, загруженной ранее; строки до нее включительно пропускаются.
+        - on_batch (Callable[[int, dict], None]): Вызывается после каждой пачки с номером ее последней строки и
+          метриками загрузки.
+
+        Возвращает:
+        - dict: Метрики загрузки - загружено строк, ошибок, длительность и скорость (строк в секунду).
+        """
+
+        started = time.monotonic()
+        batch = []
+
+        def flush():
+            self.load_batch(batch)
+
+            if on_batch is not None:
+                on_batch(batch[-1][0], self.get_metrics(started))
+
+            batch.clear()
+
+        for number, row in rows:
+            if number <= skip:
+                continue
+
+            batch.append((number, row))
+
+            if len(batch) >= self.batch_size:
+                flush()
+
+        if batch:
+            flush()
+
+        return self.get_metrics(started)
+
+    def get_metrics(self, started):
+        duration = time.monotonic() - started
+
+        return {'loaded': self.loaded, 'errors': len(self.errors), 'duration': duration,
+                'rate': self.loaded / duration if duration else 0}
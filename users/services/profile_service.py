@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from users.models.payment_model import Payment
+
+SUMMARY_AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def get_settled_payments():
+    """
+    Возвращает зачисленные платежи: платежи наличными и оплаченные транзакции Stripe (см. Payment.settled_at).
+    """
+
+    return Payment.objects.filter(settled_at__isnull=False)
+
+
+def annotate_payment_summary(queryset):
+    """
+    Добавляет к запросу пользователей сводку их зачисленных платежей.
+
+    Каждое поле вычисляется коррелированным подзапросом по индексу (user, payment_date, id), поэтому сводка
+    считается в том же запросе только для строк текущей страницы, без GROUP BY по всей таблице пользователей.
+
+    Аргументы:
+    - queryset (QuerySet): Запрос пользователей.
+
+    Возвращает:
+    - QuerySet: Запрос с полями payment_count, total_spent и last_payment_date.
+    """
+
+    payments = get_settled_payments().filter(user=OuterRef('pk')).order_by().values('user')
+
+    return queryset.annotate(
+        payment_count=Coalesce(
+            Subquery(payments.annotate(value=Count('pk')).values('value'), output_field=IntegerField()), 0,
+        ),
+        total_spent=Coalesce(
+            Subquery(payments.annotate(value=Sum('amount')).values('value'), output_field=SUMMARY_AMOUNT_FIELD),
+            Value(Decimal('0')), output_field=SUMMARY_AMOUNT_FIELD,
+        ),
+        last_payment_date=Subquery(payments.annotate(value=Max('payment_date')).values('value')),
+    )
+
+
+def get_payment_summary(user):
+    """
+    Возвращает сводку зачисленных платежей одного пользователя, если она не была добавлена к нему запросом
+    (annotate_payment_summary).
+
+    Аргументы:
+    - user (CustomUser): Пользователь.
+
+    Возвращает:
+    - dict: payment_count, total_spent и last_payment_date.
+    """
+
+    if hasattr(user, 'payment_count'):
+        return {
+            'payment_count': user.payment_count,
+            'total_spent': user.total_spent,
+            'last_payment_date': user.last_payment_date,
+        }
+
+    summary = get_settled_payments().filter(user=user).aggregate(
+        payment_count=Count('pk'),
+        total_spent=Coalesce(Sum('amount'), Value(Decimal('0')), output_field=SUMMARY_AMOUNT_FIELD),
+        last_payment_date=Max('payment_date'),
+    )
+
+    for name, value in summary.items():
+        setattr(user, name, value)
+
+    return summary
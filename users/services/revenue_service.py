@@ -0,0 +1,281 @@
+import logging
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+
+from users.models.payment_model import Payment
+from users.models.payment_rollup_model import PaymentRollup
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_BATCH_SIZE = 1000
+ROLLUP_WATERMARK_KEY = 'users:revenue-rollup:watermark'
+ROLLUP_SCHEDULE_KEY = 'users:revenue-rollup:scheduled'
+ROLLUP_SCHEDULE_DELAY = 5
+ANALYTICS_INTERVALS = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+ANALYTICS_GROUPS = {'course': 'course_id', 'owner': 'course__owner_id', 'payment_method': 'payment_method'}
+ROLLUP_FIELDS = ('amount', 'settled_at', 'paid_course_id', 'paid_lesson_id', 'payment_method')
+
+
+def get_rollup_groups(payment_ids):
+    """
+    Возвращает суммы и количество платежей по дню зачисления, курсу и способу оплаты для строк сводки.
+    """
+
+    return (
+        Payment.objects.filter(pk__in=payment_ids)
+        .annotate(day=TruncDate('settled_at'), course_key=Coalesce('paid_course_id', 'paid_lesson__course_id'))
+        .values('day', 'course_key', 'payment_method')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+
+def add_to_rollup(day, course_id, payment_method, amount, payment_count):
+    """
+    Прибавляет сумму и количество платежей к строке сводки, создавая строку при необходимости.
+    """
+
+    key = {'day': day, 'course_id': course_id, 'payment_method': payment_method}
+    increment = {'amount': F('amount') + amount, 'payment_count': F('payment_count') + payment_count}
+
+    if PaymentRollup.objects.filter(**key).update(**increment):
+        return
+
+    try:
+        with transaction.atomic():
+            PaymentRollup.objects.create(**key, amount=amount, payment_count=payment_count)
+    except IntegrityError:
+        PaymentRollup.objects.filter(**key).update(**increment)
+
+
+def apply_pending_payments(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Учитывает в сводке выручки одну пачку зачисленных, но еще не учтенных платежей.
+
+    Платежи пачки блокируются (занятые другим обработчиком пропускаются), суммируются одним запросом по дню,
+    курсу и способу оплаты и отмечаются учтенными в той же транзакции, поэтому каждый платеж учитывается ровно
+    один раз.
+
+    Аргументы:
+    - batch_size (int): Максимальное количество платежей в пачке.
+
+    Возвращает:
+    - tuple[int, datetime | None]: Количество учтенных платежей и наибольшее время зачисления среди них.
+    """
+
+    with transaction.atomic():
+        batch = list(
+            Payment.objects.filter(settled_at__isnull=False, rolled_up=False).order_by('settled_at')
+            .select_for_update(skip_locked=True).values_list('pk', 'settled_at')[:batch_size]
+        )
+
+        if not batch:
+            return 0, None
+
+        payment_ids = [pk for pk, _ in batch]
+
+        for group in get_rollup_groups(payment_ids):
+            if group['course_key'] is not None:
+                add_to_rollup(group['day'], group['course_key'], group['payment_method'], group['total'],
+                              group['count'])
+
+        Payment.objects.filter(pk__in=payment_ids).update(rolled_up=True)
+
+    return len(batch), max(settled_at for _, settled_at in batch)
+
+
+def retract_payments(payments):
+    """
+    Вычитает из сводки выручки учтенные платежи запроса и снимает с них отметку об учете.
+
+    Платежи запроса блокируются до конца транзакции, поэтому обновление сводки (apply_pending_payments) не учтет
+    их повторно, пока вызывающий код не сохранит изменения. Строки сводки, в которых не осталось платежей,
+    удаляются. Изменившиеся платежи с временем зачисления учитываются заново при следующем обновлении сводки.
+
+    Вызывается перед изменением и удалением платежей (см. Payment.save, Payment.delete, PaymentQuerySet.delete и
+    cascade_with_rollup) - один раз на весь набор удаляемых платежей. Массовые изменения учтенных платежей через
+    QuerySet.update должны вызывать ее сами или пересчитывать сводку (rebuild_rollups).
+
+    Аргументы:
+    - payments (QuerySet): Платежи.
+
+    Возвращает:
+    - int: Количество вычтенных из сводки платежей.
+    """
+
+    with transaction.atomic():
+        payment_ids = [
+            pk for pk, rolled_up in payments.order_by('pk').select_for_update().values_list('pk', 'rolled_up')
+            if rolled_up
+        ]
+
+        if not payment_ids:
+            return 0
+
+        groups = [group for group in get_rollup_groups(payment_ids) if group['course_key'] is not None]
+
+        for group in groups:
+            PaymentRollup.objects.filter(
+                day=group['day'], course_id=group['course_key'], payment_method=group['payment_method'],
+            ).update(amount=F('amount') - group['total'], payment_count=F('payment_count') - group['count'])
+
+        PaymentRollup.objects.filter(day__in={group['day'] for group in groups}, payment_count=0).delete()
+        Payment.objects.filter(pk__in=payment_ids).update(rolled_up=False)
+
+    return len(payment_ids)
+
+
+def retract_changed_payment(payment):
+    """
+    Перед сохранением платежа вычитает из сводки его прежний вклад, если изменились поля, от которых зависит
+    сводка (ROLLUP_FIELDS), и переносит в платеж текущую отметку об учете из базы данных.
+
+    Должна вызываться в транзакции сохранения платежа: строка платежа остается заблокированной до ее записи.
+
+    Аргументы:
+    - payment (Payment): Сохраняемый платеж.
+    """
+
+    if payment.pk is None or payment._state.adding:
+        return
+
+    stored = Payment.objects.select_for_update().filter(pk=payment.pk).values(*ROLLUP_FIELDS, 'rolled_up').first()
+
+    if stored is None:
+        return
+
+    if stored['rolled_up'] and any(stored[field] != getattr(payment, field) for field in ROLLUP_FIELDS):
+        retract_payments(Payment.objects.filter(pk=payment.pk))
+        payment.rolled_up = False
+    else:
+        payment.rolled_up = stored['rolled_up']
+
+
+def update_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Учитывает в сводке выручки все зачисленные, но еще не учтенные платежи и сдвигает отметку актуальности.
+
+    Отметка (watermark) - наибольшее время зачисления учтенного платежа - хранится в кэше и возвращается
+    аналитикой как время, по которое данные сводки полны.
+
+    Аргументы:
+    - batch_size (int): Количество платежей в пачке.
+
+    Возвращает:
+    - dict: Метрики запуска - учтено платежей, пачек, отметка актуальности и длительность.
+    """
+
+    started = time.monotonic()
+    payments = batches = 0
+    watermark = cache.get(ROLLUP_WATERMARK_KEY)
+
+    while True:
+        applied, settled_at = apply_pending_payments(batch_size)
+
+        if not applied:
+            break
+
+        payments += applied
+        batches += 1
+
+        if watermark is None or settled_at > watermark:
+            watermark = settled_at
+            cache.set(ROLLUP_WATERMARK_KEY, watermark, None)
+
+    metrics = {'payments': payments, 'batches': batches, 'watermark': watermark,
+               'duration': time.monotonic() - started}
+
+    if payments:
+        logger.info('Сводка выручки: учтено %(payments)s платежей в %(batches)s пачках за %(duration).2f с', metrics)
+
+    return metrics
+
+
+def schedule_rollup_update():
+    """
+    Ставит после фиксации транзакции задачу обновления сводки выручки.
+
+    Задача откладывается на несколько секунд, и за это время новые задачи не ставятся, поэтому всплеск
+    зачислений обрабатывается одной задачей.
+    """
+
+    from lms.tasks import update_revenue_rollups
+
+    if cache.add(ROLLUP_SCHEDULE_KEY, 1, ROLLUP_SCHEDULE_DELAY):
+        transaction.on_commit(lambda: update_revenue_rollups.apply_async(countdown=ROLLUP_SCHEDULE_DELAY))
+
+
+def rebuild_rollups(date_from=None, date_to=None, batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Пересчитывает сводку выручки за период по таблице платежей.
+
+    Зачисленным платежам без времени зачисления (созданным до появления сводки) оно проставляется по дате
+    платежа, строки сводки за период удаляются, а платежи периода учитываются заново.
+
+    Аргументы:
+    - date_from (date): Первый день периода (включительно). None - без ограничения.
+    - date_to (date): Последний день периода (включительно). None - без ограничения.
+    - batch_size (int): Количество платежей в пачке.
+
+    Возвращает:
+    - dict: Метрики пересчета (см. update_rollups).
+    """
+
+    with transaction.atomic():
+        Payment.objects.filter(
+            Q(payment_method='CASH') | Q(stripe_status__in=Payment.PAID_STATUSES), settled_at__isnull=True,
+        ).update(settled_at=F('payment_date'))
+
+        payments = Payment.objects.filter(settled_at__isnull=False, rolled_up=True)
+        rollups = PaymentRollup.objects.all()
+
+        if date_from is not None:
+            payments = payments.filter(settled_at__date__gte=date_from)
+            rollups = rollups.filter(day__gte=date_from)
+        if date_to is not None:
+            payments = payments.filter(settled_at__date__lte=date_to)
+            rollups = rollups.filter(day__lte=date_to)
+
+        rollups.delete()
+        payments.update(rolled_up=False)
+
+    return update_rollups(batch_size)
+
+
+def get_revenue_analytics(rollups, interval='day', group_by=None):
+    """
+    Возвращает итоги, временной ряд и разбивку выручки по строкам сводки.
+
+    Аргументы:
+    - rollups (QuerySet): Отфильтрованные строки PaymentRollup.
+    - interval (str): Шаг временного ряда: 'day', 'week' или 'month'.
+    - group_by (str): Разбивка: 'course', 'owner', 'payment_method' или None.
+
+    Возвращает:
+    - dict: Ключи as_of, totals, series и (если задан group_by) groups.
+    """
+
+    aggregates = {
+        'amount': Coalesce(Sum('amount'), Value(Decimal('0'))),
+        'count': Coalesce(Sum('payment_count'), Value(0)),
+    }
+    trunc = ANALYTICS_INTERVALS[interval]
+    period = trunc('day') if trunc else F('day')
+
+    data = {
+        'as_of': cache.get(ROLLUP_WATERMARK_KEY),
+        'totals': rollups.aggregate(**aggregates),
+        'series': list(rollups.annotate(period=period).values('period').annotate(**aggregates).order_by('period')),
+    }
+
+    if group_by is not None:
+        data['groups'] = list(
+            rollups.values(key=F(ANALYTICS_GROUPS[group_by])).annotate(**aggregates).order_by('-amount', 'key')
+        )
+
+    return data
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+
+MODERATORS_GROUP = 'Модераторы'
+ROLES_CACHE_TIMEOUT = 60 * 60
+
+
+def get_roles_cache_key(user_id):
+    """
+    Возвращает ключ кэша, под которым хранятся роли пользователя.
+
+    Аргументы:
+    - user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+    - str: Ключ кэша.
+    """
+
+    return f'users:roles:{user_id}'
+
+
+def get_user_roles(user):
+    """
+    Возвращает множество названий групп пользователя.
+
+    Роли вычисляются не более одного раза за запрос (результат запоминается на объекте пользователя) и хранятся в
+    общем кэше, поэтому повторные проверки не обращаются к базе данных. Кэш сбрасывается сигналами при изменении
+    состава групп (см. users.signals).
+
+    Аргументы:
+    - user (CustomUser): Пользователь, для которого определяются роли.
+
+    Возвращает:
+    - frozenset: Названия групп пользователя. Для анонимного пользователя - пустое множество.
+    """
+
+    if user is None or not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, '_cached_roles', None)
+
+    if roles is None:
+        key = get_roles_cache_key(user.pk)
+        roles = cache.get(key)
+
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+
+        user._cached_roles = roles
+
+    return roles
+
+
+def is_moderator(user):
+    """
+    Проверяет, состоит ли пользователь в группе модераторов.
+
+    Аргументы:
+    - user (CustomUser): Проверяемый пользователь.
+
+    Возвращает:
+    - bool: True, если пользователь состоит в группе 'Модераторы'.
+    """
+
+    return MODERATORS_GROUP in get_user_roles(user)
+
+
+def invalidate_user_roles(user_ids):
+    """
+    Удаляет роли пользователей из общего кэша.
+
+    Аргументы:
+    - user_ids (Iterable[int]): Идентификаторы пользователей.
+    """
+
+    keys = [get_roles_cache_key(user_id) for user_id in user_ids]
+
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,64 @@
+import re
+
+from django.db.models import Q
+
+SEARCH_MAX_LENGTH = 100
+SEARCH_MIN_SUBSTRING_LENGTH = 3
+PHONE_PATTERN = re.compile(r'^\+?[\d\s()-]+$')
+
+
+def get_user_search_condition(term):
+    """
+    Возвращает условие поиска пользователей по почте, телефону и городу.
+
+    Условия соответствуют индексам модели CustomUser (см. users.migrations.0009_user_search_indexes):
+    - строка с '@' внутри ищется только по началу почты (индекс text_pattern_ops по UPPER(email));
+    - номер телефона (цифры, '+', пробелы, скобки и дефисы) ищется только по телефону, без форматирования;
+    - строки короче SEARCH_MIN_SUBSTRING_LENGTH ищутся только по началу значения (индекс text_pattern_ops для
+      почты, триграммы начала слова для города и телефона): для подстроки из одного-двух символов в любом месте
+      триграмм нет, и триграммный индекс просматривался бы целиком;
+    - остальные строки ищутся как подстрока без учета регистра (UPPER(...) LIKE '%...%') по триграммным индексам
+      GIN.
+
+    Аргументы:
+    - term (str): Строка поиска без пробелов по краям.
+
+    Возвращает:
+    - Q: Условие фильтрации пользователей.
+    """
+
+    if '@' in term and not term.startswith('@') and not term.endswith('@') and ' ' not in term:
+        return Q(email__istartswith=term)
+
+    if PHONE_PATTERN.match(term) and any(char.isdigit() for char in term):
+        digits = re.sub(r'[^\d+]', '', term)
+
+        if len(digits.lstrip('+')) < SEARCH_MIN_SUBSTRING_LENGTH:
+            return Q(phone__startswith=digits)
+
+        return Q(phone__contains=digits)
+
+    if len(term) < SEARCH_MIN_SUBSTRING_LENGTH:
+        return Q(email__istartswith=term) | Q(city__istartswith=term)
+
+    return Q(email__icontains=term) | Q(phone__contains=term) | Q(city__icontains=term)
+
+
+def search_users(queryset, term):
+    """
+    Фильтрует пользователей по строке поиска (см. get_user_search_condition).
+
+    Аргументы:
+    - queryset (QuerySet): Запрос пользователей.
+    - term (str): Строка поиска, длина ограничивается SEARCH_MAX_LENGTH символами.
+
+    Возвращает:
+    - QuerySet: Отфильтрованный запрос или исходный запрос для пустой строки.
+    """
+
+    term = (term or '').strip()[:SEARCH_MAX_LENGTH]
+
+    if not term:
+        return queryset
+
+    return queryset.filter(get_user_search_condition(term))
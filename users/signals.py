@@ -0,0 +1,71 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models.payment_model import Payment
+from users.models.user_model import CustomUser
+from users.services.revenue_service import schedule_rollup_update
+from users.services.role_service import invalidate_user_roles
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidate_roles_on_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Сбрасывает кэш ролей при изменении связи пользователей и групп.
+
+    Если изменение выполнено со стороны пользователя (user.groups), сбрасываются роли этого пользователя. Если со
+    стороны группы (group.user_set) - роли пользователей из pk_set, а при очистке группы - всех ее участников,
+    собранных на шаге pre_clear.
+    """
+
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user_roles([instance.pk])
+        return
+
+    if action == 'pre_clear':
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidate_user_roles(getattr(instance, '_cleared_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_roles(pk_set or [])
+
+
+@receiver(post_save, sender=Group)
+def invalidate_roles_on_group_rename(sender, instance, created, **kwargs):
+    """
+    Сбрасывает кэш ролей участников группы при ее изменении (например, переименовании).
+    """
+
+    if not created:
+        invalidate_user_roles(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_on_group_delete(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш ролей участников группы перед ее удалением.
+    """
+
+    invalidate_user_roles(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_roles_on_user_create(sender, instance, created, **kwargs):
+    """
+    Сбрасывает возможную устаревшую запись кэша для только что созданного пользователя.
+    """
+
+    if created:
+        invalidate_user_roles([instance.pk])
+
+
+@receiver(post_save, sender=Payment)
+def schedule_rollup_on_settlement(sender, instance, **kwargs):
+    """
+    Ставит обновление сводки выручки, если сохраненный платеж зачислен, но еще не учтен в сводке.
+    """
+
+    if instance.settled_at is not None and not instance.rolled_up:
+        schedule_rollup_update()
+
@@ -0,0 +1,661 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from lms.models import Course
+from lms.services.payment_service import apply_stripe_event, record_stripe_event
+from users.models.import_checkpoint_model import ImportCheckpoint
+from users.models.payment_model import Payment
+from users.models.payment_rollup_model import PaymentRollup
+from users.models.user_model import CustomUser
+from users.services.revenue_service import rebuild_rollups, update_rollups
+from users.services.role_service import get_user_roles, is_moderator
+
+
+class RoleServiceTest(APITestCase):
+    """
+    Набор тестов кэширования ролей пользователя.
+    """
+
+    def setUp(self):
+        """
+        Очистка кэша, создание пользователя и группы модераторов.
+        """
+
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='user@test.ts', password='password')
+        self.moderators_group = Group.objects.create(name='Модераторы')
+
+    def fresh_user(self):
+        """
+        Возвращает новый экземпляр пользователя, как это происходит в каждом запросе.
+        """
+
+        return CustomUser.objects.get(pk=self.user.pk)
+
+    def test_roles_are_cached_between_requests(self):
+        """
+        Тест того, что повторная проверка роли в новом запросе не обращается к базе данных.
+        """
+
+        self.assertFalse(is_moderator(self.fresh_user()))
+
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertFalse(is_moderator(user))
+            self.assertEqual(get_user_roles(user), frozenset())
+
+    def test_invalidation_on_user_groups_change(self):
+        """
+        Тест сброса кэша при добавлении и удалении группы со стороны пользователя.
+        """
+
+        self.assertFalse(is_moderator(self.fresh_user()))
+
+        self.user.groups.add(self.moderators_group)
+        self.assertTrue(is_moderator(self.fresh_user()))
+
+        self.user.groups.remove(self.moderators_group)
+        self.assertFalse(is_moderator(self.fresh_user()))
+
+    def test_invalidation_on_group_members_change(self):
+        """
+        Тест сброса кэша при изменении состава группы со стороны группы.
+        """
+
+        self.assertFalse(is_moderator(self.fresh_user()))
+
+        self.moderators_group.user_set.add(self.user)
+        self.assertTrue(is_moderator(self.fresh_user()))
+
+        self.moderators_group.user_set.clear()
+        self.assertFalse(is_moderator(self.fresh_user()))
+
+    def test_invalidation_on_group_delete(self):
+        """
+        Тест сброса кэша при удалении группы.
+        """
+
+        self.moderators_group.user_set.add(self.user)
+        self.assertTrue(is_moderator(self.fresh_user()))
+
+        self.moderators_group.delete()
+        self.assertFalse(is_moderator(self.fresh_user()))
+
+
+@mock.patch('lms.tasks.update_revenue_rollups.apply_async')
+class RevenueRollupTest(APITestCase):
+    """
+    Набор тестов сводки выручки и аналитики платежей.
+    """
+
+    def setUp(self):
+        """
+        Очистка кэша, создание владельцев, курсов и платежей.
+        """
+
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(email='owner@test.ts', password='password')
+        self.other = CustomUser.objects.create_user(email='other@test.ts', password='password')
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.owner, price=1000)
+        other_course = Course.objects.create(title='Other', description='Description', owner=self.other, price=500)
+
+        for amount in (10, 20):
+            Payment.objects.create(user=self.other, paid_course=self.course, amount=amount, payment_method='CASH')
+
+        Payment.objects.create(user=self.owner, paid_course=other_course, amount=5, payment_method='CASH')
+        self.pending = Payment.objects.create(user=self.other, paid_course=self.course, amount=30,
+                                              payment_method='TRANSFER', stripe_payment_id='cs_1',
+                                              stripe_status='unpaid')
+
+    def pay_pending(self):
+        """
+        Применяет событие оплаты сессии ожидающего платежа.
+        """
+
+        stripe_event = record_stripe_event({
+            'id': 'evt_1', 'type': 'checkout.session.completed', 'created': 0,
+            'data': {'object': {'id': 'cs_1', 'payment_status': 'paid'}},
+        })
+        apply_stripe_event(stripe_event)
+
+    def test_incremental_update(self, apply_async):
+        """
+        Тест того, что зачисление платежа учитывается в сводке ровно один раз.
+        """
+
+        cache.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pay_pending()
+
+        apply_async.assert_called()
+        self.assertEqual(update_rollups()['payments'], 4)
+        self.assertEqual(update_rollups()['payments'], 0)
+
+        rollup = PaymentRollup.objects.get(course=self.course, payment_method='TRANSFER')
+        self.assertEqual((rollup.amount, rollup.payment_count), (Decimal('30'), 1))
+        self.assertEqual(PaymentRollup.objects.get(course=self.course, payment_method='CASH').amount, Decimal('30'))
+
+    def test_rebuild(self, apply_async):
+        """
+        Тест того, что пересчет сводки дает те же итоги, что и инкрементальное обновление.
+        """
+
+        self.pay_pending()
+        update_rollups()
+        before = list(PaymentRollup.objects.order_by('course', 'payment_method')
+                      .values_list('course', 'payment_method', 'amount', 'payment_count'))
+
+        PaymentRollup.objects.update(amount=0)
+        rebuild_rollups()
+
+        after = list(PaymentRollup.objects.order_by('course', 'payment_method')
+                     .values_list('course', 'payment_method', 'amount', 'payment_count'))
+        self.assertEqual(after, before)
+
+    def get_rollups(self):
+        """
+        Возвращает строки сводки в виде кортежей (курс, способ оплаты, сумма, количество платежей).
+        """
+
+        return list(PaymentRollup.objects.order_by('course', 'payment_method')
+                    .values_list('course', 'payment_method', 'amount', 'payment_count'))
+
+    def test_delete(self, apply_async):
+        """
+        Тест того, что удаление учтенного платежа вычитается из сводки, а опустевшая строка сводки удаляется.
+        """
+
+        self.pay_pending()
+        update_rollups()
+
+        Payment.objects.filter(amount=10).delete()
+        self.pending.delete()
+
+        self.assertEqual(self.get_rollups()[0], (self.course.pk, 'CASH', Decimal('20'), 1))
+        self.assertFalse(PaymentRollup.objects.filter(course=self.course, payment_method='TRANSFER').exists())
+
+        self.course.delete()
+        self.assertEqual(len(self.get_rollups()), 1)
+
+    def test_cascade_delete_queries(self, apply_async):
+        """
+        Тест того, что каскадное удаление платежей вычитает их из сводки без запросов на каждый платеж.
+        """
+
+        query_counts = []
+
+        for email, payment_count in (('few@test.ts', 2), ('many@test.ts', 20)):
+            user = CustomUser.objects.create_user(email=email, password='password')
+            Payment.objects.bulk_create([
+                Payment(user=user, paid_course=self.course, amount=1, payment_method='CASH',
+                        settled_at=timezone.now())
+                for _ in range(payment_count)
+            ])
+            update_rollups()
+
+            with CaptureQueriesContext(connection) as context:
+                user.delete()
+
+            query_counts.append(len(context.captured_queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertEqual(self.get_rollups()[0], (self.course.pk, 'CASH', Decimal('30'), 2))
+
+    def test_update(self, apply_async):
+        """
+        Тест того, что изменение учтенного платежа переносит его вклад в сводке, а сохранение без изменений и
+        отмена оплаты учитываются верно.
+        """
+
+        self.pay_pending()
+        update_rollups()
+        other_course = Course.objects.get(title='Other')
+
+        payment = Payment.objects.get(amount=10)
+        payment.amount = 15
+        payment.paid_course = other_course
+        payment.save()
+
+        stale = Payment.objects.get(amount=20)
+        stale.rolled_up = False
+        stale.save()
+
+        self.pending.refresh_from_db()
+        self.pending.stripe_status = 'unpaid'
+        self.pending.save()
+
+        self.assertEqual(update_rollups()['payments'], 1)
+
+        expected = sorted([(self.course.pk, 'CASH', Decimal('20'), 1), (other_course.pk, 'CASH', Decimal('20'), 2)])
+        self.assertEqual(self.get_rollups(), expected)
+        self.pending.refresh_from_db()
+        self.assertEqual((self.pending.settled_at, self.pending.rolled_up), (None, False))
+
+        rebuild_rollups()
+        self.assertEqual(self.get_rollups(), expected)
+
+    def test_analytics(self, apply_async):
+        """
+        Тест аналитики по сводке и ограничения ее курсами пользователя.
+        """
+
+        self.pay_pending()
+        update_rollups()
+        self.client.force_authenticate(user=self.owner)
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/users/payments/analytics/', {'group_by': 'payment_method',
+                                                                          'interval': 'month'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totals'], {'amount': Decimal('60'), 'count': 3})
+        self.assertEqual(len(response.data['series']), 1)
+        self.assertEqual([(group['key'], group['amount']) for group in response.data['groups']],
+                         [('CASH', Decimal('30')), ('TRANSFER', Decimal('30'))])
+
+        response = self.client.get('/api/users/payments/analytics/', {'course': self.course.pk,
+                                                                      'payment_method': 'CASH'})
+        self.assertEqual(response.data['totals']['count'], 2)
+        self.assertEqual(self.client.get('/api/users/payments/analytics/', {'interval': 'year'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentViewSetTest(APITestCase):
+    """
+    Набор тестов списка платежей: ограничение видимости, фильтры, пагинация и количество запросов.
+    """
+
+    def setUp(self):
+        """
+        Очистка кэша, создание пользователей, модератора, курса и платежей.
+        """
+
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='user@test.ts', password='password')
+        self.other = CustomUser.objects.create_user(email='other@test.ts', password='password')
+        self.moderator = CustomUser.objects.create_user(email='moderator@test.ts', password='password')
+        self.moderator.groups.add(Group.objects.create(name='Модераторы'))
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.other, price=1000)
+
+        self.create_payments(self.user, 3)
+        self.create_payments(self.other, 2)
+
+    def create_payments(self, user, count):
+        """
+        Создает count платежей пользователя с датами в прошлые дни.
+        """
+
+        for number in range(count):
+            payment = Payment.objects.create(user=user, paid_course=self.course, amount=10, payment_method='CASH')
+            Payment.objects.filter(pk=payment.pk).update(payment_date=timezone.now() - timedelta(days=number))
+
+    def get_payments(self, user, **params):
+        self.client.force_authenticate(user=user)
+
+        return self.client.get('/api/users/payments/', params)
+
+    def test_scoping(self):
+        """
+        Тест того, что пользователь видит только свои платежи, а модератор - все.
+        """
+
+        results = self.get_payments(self.user).data['results']
+
+        self.assertEqual({payment['user_email'] for payment in results}, {'user@test.ts'})
+        self.assertEqual(len(self.get_payments(self.moderator).data['results']), 5)
+
+        other_payment = Payment.objects.filter(user=self.other).first()
+        response = self.client.get(f'/api/users/payments/{other_payment.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(f'/api/users/payments/{other_payment.pk}/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_write_access(self):
+        """
+        Тест того, что платежи не создаются через API, изменяют их только модераторы, а плательщик, сумма и статус
+        транзакции не изменяются.
+        """
+
+        payment = Payment.objects.filter(user=self.user).first()
+        data = {'user': self.other.pk, 'amount': 1, 'stripe_status': 'paid', 'payment_method': 'TRANSFER',
+                'stripe_payment_id': 'cs_fake'}
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.post('/api/users/payments/', data).status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.patch(f'/api/users/payments/{payment.pk}/', data).status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.delete(f'/api/users/payments/{payment.pk}/').status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.moderator)
+        response = self.client.patch(f'/api/users/payments/{payment.pk}/', {**data, 'payment_method': 'CASH'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.user, payment.amount, payment.stripe_payment_id, payment.stripe_status),
+                         (self.user, Decimal('10'), None, None))
+
+    def test_date_range_and_pages(self):
+        """
+        Тест фильтра по диапазону дат и курсорной пагинации по дате.
+        """
+
+        since = (timezone.now() - timedelta(days=1, hours=1)).isoformat()
+        response = self.get_payments(self.user, payment_date__gte=since)
+        self.assertEqual(len(response.data['results']), 2)
+
+        first_page = self.get_payments(self.user, page_size=2, ordering='payment_date')
+        dates = [payment['payment_date'] for payment in first_page.data['results']]
+        self.assertEqual(dates, sorted(dates))
+
+        second_page = self.client.get(first_page.data['next'])
+        self.assertEqual(len(second_page.data['results']), 1)
+        self.assertGreater(second_page.data['results'][0]['payment_date'], dates[-1])
+
+    def test_constant_queries(self):
+        """
+        Тест того, что количество запросов не зависит от количества платежей на странице.
+        """
+
+        self.get_payments(self.moderator)
+
+        with CaptureQueriesContext(connection) as small:
+            self.get_payments(self.moderator)
+
+        self.create_payments(self.user, 10)
+
+        with CaptureQueriesContext(connection) as large:
+            response = self.get_payments(self.moderator)
+
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(large), 1)
+
+    def test_export_csv(self):
+        """
+        Тест потоковой выгрузки платежей в CSV с ограничением видимости и фильтрами.
+        """
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/users/payments/export/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['user_email'] for row in rows}, {'user@test.ts'})
+        self.assertEqual([int(row['id']) for row in rows], sorted(int(row['id']) for row in rows))
+
+        self.client.force_authenticate(user=self.moderator)
+        since = (timezone.now() - timedelta(days=1, hours=1)).isoformat()
+        response = self.client.get('/api/users/payments/export/', {'payment_date__gte': since,
+                                                                   'paid_course': self.course.pk})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 4)
+
+    def test_export_ndjson_gzip(self):
+        """
+        Тест выгрузки в NDJSON со сжатием gzip и выгрузки командой export_payments.
+        """
+
+        self.client.force_authenticate(user=self.moderator)
+        response = self.client.get('/api/users/payments/export/', {'export_format': 'ndjson', 'gzip': 'true'})
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson.gz"'))
+
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        payments = [json.loads(line) for line in lines]
+        self.assertEqual(len(payments), 5)
+        self.assertEqual(payments[0]['amount'], '10.00')
+
+        with tempfile.NamedTemporaryFile(suffix='.csv.gz') as output:
+            call_command('export_payments', gzip=True, method='CASH', output=output.name, stderr=io.StringIO())
+            rows = list(csv.DictReader(io.StringIO(gzip.decompress(output.read()).decode())))
+
+        self.assertEqual(len(rows), 5)
+
+
+class UserListTest(APITestCase):
+    """
+    Набор тестов списка пользователей и истории платежей: сводка платежей, пагинация и количество запросов.
+    """
+
+    def setUp(self):
+        """
+        Очистка кэша, создание пользователей, модератора, курса и платежей.
+        """
+
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='user@test.ts', password='password')
+        self.other = CustomUser.objects.create_user(email='other@test.ts', password='password')
+        self.moderator = CustomUser.objects.create_user(email='moderator@test.ts', password='password')
+        self.moderator.groups.add(Group.objects.create(name='Модераторы'))
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.other, price=1000)
+
+        for amount in (10, 25):
+            Payment.objects.create(user=self.user, paid_course=self.course, amount=amount, payment_method='CASH')
+
+        Payment.objects.create(user=self.user, paid_course=self.course, amount=100, payment_method='TRANSFER',
+                               stripe_payment_id='cs_test', stripe_status='open')
+
+    def test_summary(self):
+        """
+        Тест сводки зачисленных платежей в списке пользователей и в профиле после обновления.
+        """
+
+        self.client.force_authenticate(user=self.moderator)
+        response = self.client.get('/api/users/users/')
+        users = {user['email']: user for user in response.data['results']}
+
+        self.assertEqual(users['user@test.ts']['payment_count'], 2)
+        self.assertEqual(users['user@test.ts']['total_spent'], '35.00')
+        self.assertIsNotNone(users['user@test.ts']['last_payment_date'])
+        self.assertEqual(users['other@test.ts']['payment_count'], 0)
+        self.assertEqual(users['other@test.ts']['total_spent'], '0.00')
+        self.assertIsNone(users['other@test.ts']['last_payment_date'])
+        self.assertNotIn('payment_history', users['user@test.ts'])
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch(f'/api/users/profile/{self.user.pk}/', {'city': 'Москва'})
+        self.assertEqual(response.data['payment_count'], 2)
+
+    def test_constant_queries(self):
+        """
+        Тест того, что количество запросов списка пользователей не зависит от количества пользователей и платежей.
+        """
+
+        self.client.force_authenticate(user=self.moderator)
+        self.client.get('/api/users/users/')
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/users/users/')
+
+        for number in range(5):
+            user = CustomUser.objects.create_user(email=f'user{number}@test.ts', password='password')
+            Payment.objects.create(user=user, paid_course=self.course, amount=10, payment_method='CASH')
+
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/users/users/', {'page_size': 5})
+
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(large), len(small))
+
+    def test_payment_history(self):
+        """
+        Тест постраничной истории платежей: доступна пользователю и модератору, но не другим пользователям.
+        """
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/users/profile/{self.user.pk}/payments/', {'page_size': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(len(self.client.get(response.data['next']).data['results']), 1)
+
+        self.client.force_authenticate(user=self.moderator)
+        response = self.client.get(f'/api/users/profile/{self.user.pk}/payments/')
+        self.assertEqual(len(response.data['results']), 3)
+
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(f'/api/users/profile/{self.user.pk}/payments/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_search(self):
+        """
+        Тест поиска пользователей по части почты, телефону и городу в списке пользователей и в админке.
+        """
+
+        self.user.phone, self.user.city = '+79001234567', 'Moscow'
+        self.user.save()
+        self.other.city = 'Murmansk'
+        self.other.save()
+        self.client.force_authenticate(user=self.moderator)
+
+        def search(term):
+            response = self.client.get('/api/users/users/', {'search': term})
+
+            return {user['email'] for user in response.data['results']}
+
+        self.assertEqual(search('OTHER@'), {'other@test.ts'})
+        self.assertEqual(search('moder'), {'moderator@test.ts'})
+        self.assertEqual(search('+7 (900) 123'), {'user@test.ts'})
+        self.assertEqual(search('mosc'), {'user@test.ts'})
+        self.assertEqual(search('m'), {'user@test.ts', 'other@test.ts', 'moderator@test.ts'})
+        self.assertEqual(search('er'), set())
+        self.assertEqual(search(''), {'user@test.ts', 'other@test.ts', 'moderator@test.ts'})
+        self.assertEqual(self.client.get('/api/users/users/', {'search': 'x' * 101}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+        admin = CustomUser.objects.create_superuser(email='admin@test.ts', password='password')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/users/customuser/', {'q': 'MURM'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.other])
+
+    def test_list_limited_for_regular_users(self):
+        """
+        Тест того, что обычный пользователь видит в списке и поиске только себя, а персонал - всех пользователей.
+        """
+
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get('/api/users/users/')
+        self.assertEqual([user['email'] for user in response.data['results']], ['user@test.ts'])
+        self.assertEqual(self.client.get('/api/users/users/', {'search': 'other'}).data['results'], [])
+
+        self.other.is_staff = True
+        self.other.save()
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(len(self.client.get('/api/users/users/').data['results']), 3)
+
+
+@mock.patch('lms.tasks.update_revenue_rollups.apply_async')
+class LoadPaymentsTest(APITestCase):
+    """
+    Набор тестов пакетной загрузки платежей командой load_payments.
+    """
+
+    def setUp(self):
+        """
+        Создание пользователя, курса и файла платежей.
+        """
+
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='user@test.ts', password='password')
+        self.course = Course.objects.create(title='Course', description='Description', owner=self.user, price=1000)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.source = f'{self.directory.name}/payments.csv'
+
+        with open(self.source, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['user_email', 'course_id', 'payment_date', 'amount', 'payment_method',
+                             'stripe_payment_id', 'stripe_status'])
+            writer.writerow(['user@test.ts', self.course.pk, '2020-01-01T10:00:00+00:00', '10.5', 'CASH', '', ''])
+            writer.writerow(['new@test.ts', self.course.pk, '2020-01-02T10:00:00+00:00', '20', 'TRANSFER',
+                             'cs_1', 'paid'])
+            writer.writerow(['user@test.ts', 999, '2020-01-03T10:00:00+00:00', '30', 'CASH', '', ''])
+            writer.writerow(['user@test.ts', '', 'not a date', '40', 'CASH', '', ''])
+            writer.writerow(['user@test.ts', '', '2020-01-05T10:00:00+00:00', '50', 'TRANSFER', '', ''])
+
+    def load(self, *args, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('load_payments', self.source, *args, batch_size=2, stdout=stdout, stderr=stderr, **options)
+
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_load(self, apply_async):
+        """
+        Тест загрузки с созданием пользователей, сохранением дат и отчетом об ошибочных строках.
+        """
+
+        stdout, stderr = self.load(create_users=True)
+
+        self.assertIn('Загружено платежей: 2', stdout)
+        self.assertEqual([line.split(':')[0] for line in stderr.splitlines()],
+                         ['Строка 3', 'Строка 4', 'Строка 5'])
+
+        payments = Payment.objects.order_by('payment_date')
+        self.assertEqual([payment.user.email for payment in payments], ['user@test.ts', 'new@test.ts'])
+        self.assertEqual(payments[0].payment_date.year, 2020)
+        self.assertEqual(payments[0].amount, Decimal('10.50'))
+        self.assertEqual(payments[1].settled_at, payments[1].payment_date)
+        self.assertFalse(CustomUser.objects.get(email='new@test.ts').has_usable_password())
+
+    def test_resume(self, apply_async):
+        """
+        Тест возобновления загрузки с контрольной точки и прерывания при превышении числа ошибок.
+        """
+
+        with self.assertRaises(CommandError):
+            self.load(create_users=True, max_errors=0)
+
+        self.assertEqual(Payment.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get(name=self.source).row, 2)
+
+        stdout, stderr = self.load('--resume')
+
+        self.assertIn('Продолжение загрузки после строки 2', stdout)
+        self.assertEqual(len(stderr.splitlines()), 3)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_checkpoint_in_batch_transaction(self, apply_async):
+        """
+        Тест того, что пачка и контрольная точка фиксируются вместе: при сбое записи контрольной точки пачка не
+        загружается, а возобновленная загрузка не дублирует платежи.
+        """
+
+        with mock.patch('users.services.import_service.write_checkpoint', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.load(create_users=True)
+
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+        self.load('--resume', create_users=True)
+        self.load('--resume')
+
+        self.assertEqual(Payment.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get(name=self.source).loaded, 2)
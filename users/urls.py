@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from users.views import PaymentViewSet, UserProfileRetrieveUpdateAPIView, UserCreate, UserList
+from users.views import (PaymentViewSet, UserProfileRetrieveUpdateAPIView, UserCreate, UserList,
+                         UserPaymentList)
 
 router = DefaultRouter()
 router.register(r'payments', PaymentViewSet, basename='payment')
@@ -10,6 +11,7 @@ router.register(r'payments', PaymentViewSet, basename='payment')
 urlpatterns = [
     path('', include(router.urls)),
     path('profile/<int:pk>/', UserProfileRetrieveUpdateAPIView.as_view(), name='user-profile'),
+    path('profile/<int:pk>/payments/', UserPaymentList.as_view(), name='user-payments'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('register/', UserCreate.as_view(), name='create_user'),
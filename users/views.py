@@ -1,44 +1,170 @@
 from django.contrib.auth import get_user_model
-from rest_framework.filters import OrderingFilter
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, generics
+from rest_framework import generics, mixins, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.response import Response
 
+from lms.mixins import ServerTimingMixin
+from lms.paginators import KeysetPaginationMixin
+from users.permissions import IsModerator, IsProfileOwnerOrModerator
 from users.models.payment_model import Payment
+from users.models.payment_rollup_model import PaymentRollup
 from users.models.user_model import CustomUser
-from users.serializers import PaymentSerializer, UserProfileSerializer, PublicUserProfileSerializer
+from users.serializers import (PaymentSerializer, UserProfileSerializer, PublicUserProfileSerializer,
+                               PaymentAnalyticsQuerySerializer, PaymentExportQuerySerializer,
+                               UserSearchQuerySerializer)
+from users.services.export_service import EXPORT_FORMATS, export_payments
+from users.services.profile_service import annotate_payment_summary
+from users.services.revenue_service import get_revenue_analytics
+from users.services.role_service import is_moderator
+from users.services.search_service import search_users
 
 User = get_user_model()
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(ServerTimingMixin, KeysetPaginationMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin,
+                     viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для управления объектами модели Payment.
 
-    Этот ViewSet предоставляет стандартные действия CRUD для модели Payment, а также возможности фильтрации
-    и сортировки данных.
+    Этот ViewSet предоставляет просмотр, изменение и удаление объектов модели Payment, а также возможности
+    фильтрации и сортировки данных. Платежи создаются только оплатой через Stripe; изменять и удалять их могут
+    только модераторы, а пользователь, сумма и данные транзакции Stripe не изменяются через API.
+
+    Модераторы видят все платежи, остальные пользователи - только свои. Список всегда выдается с курсорной
+    пагинацией по индексу (payment_date, id), поэтому стоимость страницы не зависит от размера таблицы, а
+    пользователь, курс и урок загружаются тем же запросом (select_related).
 
     Атрибуты:
         queryset (QuerySet): База данных, содержащая все объекты модели Payment.
         serializer_class (Serializer): Класс сериализатора, который будет использоваться
                                        для преобразования объектов модели Payment.
-        filter_backends (list): Список бекэндов фильтрации, используемых для фильтрации и сор-
-                                тировки данных.
-        filterset_fields (list): Список полей, по которым возможна фильтрация. В данном случае,
-                                 возможна фильтрация по полям 'paid_course', 'paid_lesson' и
-                                 'payment_method'.
-        ordering_fields (list): Список полей, по которым возможна сортировка. В данном случае,
-                                сортировка возможна по полю 'payment_date'.
+        filter_backends (list): Список бекэндов фильтрации, используемых для фильтрации данных.
+        filterset_fields (dict): Поля и операторы фильтрации: 'paid_course', 'paid_lesson', 'payment_method' и
+                                 диапазон дат payment_date__gte / payment_date__lt.
+        cursor_ordering (tuple): Сортировка по умолчанию. Параметр ordering=payment_date меняет направление.
     """
 
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ['paid_course', 'paid_lesson', 'payment_method']
-    ordering_fields = ['payment_date']
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {
+        'paid_course': ['exact'],
+        'paid_lesson': ['exact'],
+        'payment_method': ['exact'],
+        'payment_date': ['gte', 'lt'],
+    }
+    cursor_ordering = ('-payment_date', '-id')
+    cursor_pagination_only = True
+    list_fields = ('id', 'user', 'payment_date', 'paid_course', 'paid_lesson', 'amount', 'payment_method',
+                   'stripe_payment_id', 'stripe_status', 'user__email', 'paid_course__title', 'paid_lesson__title')
+
+    def get_queryset(self):
+        """
+        Возвращает платежи, доступные пользователю, вместе со связанными пользователем, курсом и уроком.
+        """
+
+        if self.action == 'export':
+            queryset = Payment.objects.all()
+        else:
+            queryset = Payment.objects.select_related('user', 'paid_course', 'paid_lesson')
+
+        if not is_moderator(self.request.user):
+            queryset = queryset.filter(user_id=self.request.user.pk)
+
+        if self.action == 'list':
+            queryset = queryset.only(*self.list_fields)
+
+        return queryset
+
+    def get_permissions(self):
+        """
+        Определяет и возвращает разрешения для текущего действия.
+
+        Возвращаемое значение:
+            list: Список экземпляров классов разрешений.
+        """
+
+        if self.action in ['update', 'partial_update', 'destroy']:
+            self.permission_classes = [IsAuthenticated, IsModerator]
+
+        return [permission() for permission in self.permission_classes]
+
+    def get_cursor_ordering(self):
+        if self.request.query_params.get('ordering') == 'payment_date':
+            return 'payment_date', 'id'
+
+        return self.cursor_ordering
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Возвращает выручку: итоги, временной ряд и разбивку по курсам, владельцам или способам оплаты.
+
+        Данные берутся из сводной таблицы PaymentRollup, а не из таблицы платежей. Модераторы видят выручку всех
+        курсов, остальные пользователи - только своих курсов.
+
+        Параметры запроса: date_from, date_to, course, owner, payment_method, interval (day, week, month),
+        group_by (course, owner, payment_method).
+        """
+
+        query = PaymentAnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        rollups = PaymentRollup.objects.all()
+
+        if not is_moderator(request.user):
+            rollups = rollups.filter(course__owner=request.user)
+
+        filters = {
+            'day__gte': params.get('date_from'),
+            'day__lte': params.get('date_to'),
+            'course_id': params.get('course'),
+            'course__owner_id': params.get('owner'),
+            'payment_method': params.get('payment_method'),
+        }
+        rollups = rollups.filter(**{lookup: value for lookup, value in filters.items() if value is not None})
+
+        return Response(get_revenue_analytics(rollups, params['interval'], params.get('group_by')))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Выгружает доступные пользователю платежи потоком в CSV или NDJSON.
 
+        Фильтры те же, что у списка (paid_course, payment_method, payment_date__gte, payment_date__lt). Строки
+        читаются серверным курсором пачками и сразу отдаются клиенту (StreamingHttpResponse), поэтому память не
+        растет с размером выгрузки, а первые байты приходят сразу.
 
-class UserProfileRetrieveUpdateAPIView(generics.RetrieveUpdateAPIView):
+        Параметры запроса: export_format (csv, ndjson), gzip (сжимать выгрузку на лету).
+        """
+
+        query = PaymentExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        export_format = query.validated_data['export_format']
+        compress = query.validated_data['gzip']
+
+        queryset = self.filter_queryset(self.get_queryset())
+        filename = f'payments-{timezone.now():%Y%m%d-%H%M%S}.{export_format}'
+
+        if compress:
+            filename += '.gz'
+
+        response = StreamingHttpResponse(
+            export_payments(queryset, export_format, compress),
+            content_type='application/gzip' if compress else EXPORT_FORMATS[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'no-store'
+
+        return response
+
+
+class UserProfileRetrieveUpdateAPIView(ServerTimingMixin, generics.RetrieveUpdateAPIView):
     """
     UPDATE
     Предоставляет действия `получение` и `обновление` для пользовательского профиля.
@@ -76,7 +202,7 @@ class UserProfileRetrieveUpdateAPIView(generics.RetrieveUpdateAPIView):
             return self.request.user
         return super().get_object()
 
-class UserCreate(generics.CreateAPIView):
+class UserCreate(ServerTimingMixin, generics.CreateAPIView):
     """
     Класс представления для создания нового пользователя.
 
@@ -91,17 +217,68 @@ class UserCreate(generics.CreateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [AllowAny]
 
-class UserList(generics.ListAPIView):
+class UserList(ServerTimingMixin, KeysetPaginationMixin, generics.ListAPIView):
     """
     Класс представления для получения списка пользователей.
 
+    Список всегда выдается с курсорной пагинацией по id, а сводка платежей каждого пользователя вычисляется
+    подзапросами в том же запросе (annotate_payment_summary), поэтому страница загружается одним запросом
+    независимо от количества пользователей и платежей.
+
+    Параметр search ищет пользователей по части почты, телефона или города по триграммным индексам
+    (users.services.search_service), размер страницы ограничен max_page_size пагинации.
+
+    Всех пользователей видят только модераторы и персонал (is_staff), остальные пользователи получают в списке
+    только себя (как в IsProfileOwnerOrModerator).
+
     Атрибуты:
         queryset (QuerySet): Набор запросов для модели CustomUser.
         serializer_class (Serializer): Класс сериализатора, используемый для сериализации данных.
         permission_classes (list): Список классов разрешений, применяемых к этому представлению. В данном случае доступ
                                    разрешен только для аутентифицированных пользователей.
+        cursor_ordering (tuple): Сортировка при курсорной пагинации.
     """
 
     queryset = CustomUser.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('id',)
+    cursor_pagination_only = True
+
+    def get_queryset(self):
+        query = UserSearchQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        queryset = super().get_queryset()
+
+        if not (self.request.user.is_staff or is_moderator(self.request.user)):
+            queryset = queryset.filter(pk=self.request.user.pk)
+
+        queryset = search_users(queryset, query.validated_data.get('search'))
+
+        return annotate_payment_summary(queryset)
+
+
+class UserPaymentList(ServerTimingMixin, KeysetPaginationMixin, generics.ListAPIView):
+    """
+    Класс представления для получения истории платежей пользователя.
+
+    История доступна самому пользователю и модераторам и выдается с курсорной пагинацией по индексу
+    (user, payment_date, id), от новых платежей к старым.
+
+    Атрибуты:
+        serializer_class (Serializer): Класс сериализатора платежей.
+        permission_classes (list): Аутентифицированный пользователь профиля или модератор.
+        cursor_ordering (tuple): Сортировка при курсорной пагинации.
+    """
+
+    serializer_class = PaymentSerializer
+    permission_classes = [IsAuthenticated, IsProfileOwnerOrModerator]
+    cursor_ordering = ('-payment_date', '-id')
+    cursor_pagination_only = True
+
+    def get_queryset(self):
+        """
+        Возвращает платежи пользователя из адреса вместе со связанными пользователем, курсом и уроком.
+        """
+
+        return Payment.objects.filter(user_id=self.kwargs['pk']).select_related('user', 'paid_course', 'paid_lesson')